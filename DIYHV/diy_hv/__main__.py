@@ -1,14 +1,36 @@
-"""Module allowing for `python -m control_high_voltage.gui`."""
+"""Module allowing for `python -m diy_hv`.
+
+Without arguments the GUI starts. With a command of :mod:`diy_hv._cli`, it runs headless without importing Qt.
+"""
+import logging
 import sys
+import time
 
-from diy_hv._mainwindow import MainWindow
-from qtpy.QtCore import Qt
-from qtpy.QtWidgets import QApplication
+from diy_hv._cli import COMMANDS, main
+
+
+def _main_gui() -> None:
+    start = time.perf_counter()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+    from diy_hv._mainwindow import MainWindow
+    from qtpy.QtCore import Qt
+    from qtpy.QtWidgets import QApplication
 
-if __name__ == "__main__":
     app = QApplication(sys.argv)
+    app.setApplicationName("DIYHV")
     if hasattr(Qt.ApplicationAttribute, "AA_UseHighDpiPixmaps"):  # Enable High DPI display with Qt5
         app.setAttribute(Qt.ApplicationAttribute.AA_UseHighDpiPixmaps)  # type: ignore
     win = MainWindow()
     win.show()
+    # A warm start reads the theme from the disk cache instead of generating it.
+    start_kind = "warm" if win.theme_source == "disk" else "cold"
+    logging.getLogger("diy_hv").info(
+        "%s start took %.1f ms.", start_kind.capitalize(), (time.perf_counter() - start) * 1e3
+    )
     app.exec()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS + ("-h", "--help"):
+        sys.exit(main())
+    _main_gui()
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import io
+import os
+import time
+from functools import partial
+
+from diy_hv._capture import RECEIVED, SENT, SerialCapture
+from diy_hv._device import FrameError, _ArduinoSerial, decode_frame
+from diy_hv._metrics import SerialMetrics
+from serial import SerialException
+
+
+class _ReceiveBuffer:
+    def __init__(self) -> None:
+        self._data = bytearray()
+        self._waiter: asyncio.Future | None = None
+        self._exception: Exception | None = None
+
+    def feed(self, data: bytes) -> None:
+        self._data += data
+        self._wake_up()
+
+    def set_exception(self, exception: Exception) -> None:
+        self._exception = exception
+        self._wake_up()
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def read_until(self, delimiter: bytes) -> bytes:
+        while True:
+            end = self._data.find(delimiter)
+            if end != -1:
+                line = bytes(self._data[:end])
+                del self._data[: end + len(delimiter)]
+                return line
+            if self._exception is not None:
+                raise self._exception
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def _wake_up(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+def _is_frame(line: bytes) -> bool:
+    if not line.startswith(b"$"):
+        return False
+    try:
+        decode_frame(line)
+    except FrameError:
+        return False
+    return True
+
+
+class AsyncHighVoltageController:
+    """Asyncio controller class for high voltage circuit.
+
+    On POSIX, the serial port is driven by the event loop in non-blocking mode, so one loop can drive many
+    controllers and other instruments without a thread per port. Where the port has no file descriptor (Windows),
+    blocking calls fall back to the default executor of the loop.
+    """
+
+    def __init__(self, port: str = "", baudrate: int = 9600) -> None:
+        """Initialize device class."""
+        self._ser = _ArduinoSerial()
+        self.port = port
+        self.baudrate = baudrate
+        self._fd: int | None = None
+        self._received: _ReceiveBuffer | None = None
+        self._write_lock: asyncio.Lock | None = None
+        self._query_lock: asyncio.Lock | None = None
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the device is open."""
+        return self._ser.is_open
+
+    async def __aenter__(self) -> AsyncHighVoltageController:
+        """Open device."""
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Close device."""
+        await self.close()
+
+    async def open(self, timeout: float | None = None) -> None:
+        """Open device.
+
+        Args:
+            timeout: Seconds to wait for the port to open.
+        """
+        loop = asyncio.get_running_loop()
+        self._ser.port = self.port
+        self._ser.baudrate = self.baudrate
+        self._ser.timeout = 0
+        self._ser.write_timeout = None
+        # Opening a port is a one-off blocking system call, so it runs in the executor on every platform.
+        await asyncio.wait_for(loop.run_in_executor(None, self._ser.open), timeout)
+        self._write_lock = asyncio.Lock()
+        self._query_lock = asyncio.Lock()
+        try:
+            self._fd = self._ser.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            self._fd = None
+            return
+        self._received = _ReceiveBuffer()
+        loop.add_reader(self._fd, self._on_readable)
+
+    async def close(self) -> None:
+        """Close device."""
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            self._fd = None
+        self._received = None
+        self._ser.close()
+
+    async def send(self, message: str, timeout: float | None = None) -> None:
+        """Send message to device.
+
+        Args:
+            message: Message to send.
+            timeout: Seconds to wait for the message to be written.
+        """
+        await asyncio.wait_for(self._write(message), timeout)
+
+    @property
+    def metrics(self) -> SerialMetrics | None:
+        """Latency and traffic metrics of the port, or None if instrumentation is disabled."""
+        return self._ser.metrics
+
+    def enable_metrics(self) -> SerialMetrics:
+        """Enable instrumentation of sends, receives and queries. See :meth:`HighVoltageController.enable_metrics`."""
+        if self._ser.metrics is None:
+            self._ser.metrics = SerialMetrics()
+        return self._ser.metrics
+
+    def disable_metrics(self) -> None:
+        """Disable instrumentation."""
+        self._ser.metrics = None
+
+    def start_capture(self, path: str) -> SerialCapture:
+        """Record every byte read from and written to the port. See :meth:`HighVoltageController.start_capture`."""
+        if self._ser.capture is not None:
+            raise RuntimeError("Port is already captured.")
+        self._ser.capture = SerialCapture(path)
+        return self._ser.capture
+
+    def stop_capture(self) -> None:
+        """Stop recording and close the capture."""
+        capture, self._ser.capture = self._ser.capture, None
+        if capture is not None:
+            capture.close()
+
+    async def query(self, message: str, timeout: float | None = 1) -> str:
+        """Send query message and return the reply.
+
+        Data received before the query is discarded, and so are the lines which are not frames, such as the banner
+        printed by the idle firmware.
+
+        Args:
+            message: Message to send.
+            timeout: Seconds to wait for the reply.
+        """
+        if self._query_lock is None:
+            raise SerialException("Attempting to use a port that is not open")
+        async with self._query_lock:
+            return await asyncio.wait_for(self._query(message, timeout), timeout)
+
+    async def _query(self, message: str, timeout: float | None) -> str:
+        metrics = self._ser.metrics
+        start = time.perf_counter()
+        try:
+            if self._received is None:
+                await asyncio.get_running_loop().run_in_executor(None, self._ser.reset_input_buffer)
+            else:
+                self._received.clear()
+            await self._write(message)
+            while True:
+                line = await self._receive_line(timeout)
+                if _is_frame(line):
+                    return line.decode("ascii")
+        finally:
+            if metrics is not None:
+                metrics.record_query(time.perf_counter() - start)
+
+    async def _receive_line(self, timeout: float | None) -> bytes:
+        delimiter = bytes(self._ser._delimiter, "utf-8")
+        metrics = self._ser.metrics
+        start = time.perf_counter()
+        size = 0
+        complete = False
+        try:
+            if self._received is None:
+                # Bound the blocking read as well, so that a cancelled query does not hold an executor thread forever.
+                self._ser.timeout = timeout
+                line = await asyncio.get_running_loop().run_in_executor(None, partial(self._ser.read_until, delimiter))
+                size = len(line)
+                complete = line.endswith(delimiter)
+                if not complete:
+                    raise asyncio.TimeoutError
+                return line[: -len(delimiter)]
+            line = await self._received.read_until(delimiter)
+            size = len(line) + len(delimiter)
+            complete = True
+            return line
+        finally:
+            if metrics is not None:
+                metrics.record_receive(time.perf_counter() - start, size, complete)
+
+    async def _write(self, message: str) -> None:
+        if self._write_lock is None:
+            raise SerialException("Attempting to use a port that is not open")
+        data = self._ser.encode_message(message)
+        async with self._write_lock:
+            metrics = self._ser.metrics
+            start = time.perf_counter()
+            if self._fd is None:
+                await asyncio.get_running_loop().run_in_executor(None, self._ser.write, data)
+            else:
+                # The port is written without pyserial, so the capture is fed here as in CaptureSerial.write.
+                capture = self._ser.capture
+                if capture is not None:
+                    capture.record(SENT, data)
+                view = memoryview(data)
+                while len(view) > 0:
+                    with contextlib.suppress(BlockingIOError):
+                        view = view[os.write(self._fd, view) :]
+                    if len(view) > 0:
+                        await self._wait_writable(self._fd)
+            if metrics is not None:
+                metrics.record_send(time.perf_counter() - start, len(data))
+
+    @staticmethod
+    async def _wait_writable(fd: int) -> None:
+        loop = asyncio.get_running_loop()
+        writable = loop.create_future()
+        loop.add_writer(fd, lambda: writable.done() or writable.set_result(None))
+        try:
+            await writable
+        finally:
+            loop.remove_writer(fd)
+
+    def _on_readable(self) -> None:
+        received: _ReceiveBuffer = self._received  # type: ignore
+        try:
+            data = os.read(self._fd, 4096)  # type: ignore
+        except BlockingIOError:
+            return
+        except OSError as e:
+            received.set_exception(SerialException(str(e)))
+            asyncio.get_running_loop().remove_reader(self._fd)  # type: ignore
+            return
+        if not data:
+            received.set_exception(SerialException("Device disconnected."))
+            asyncio.get_running_loop().remove_reader(self._fd)  # type: ignore
+            return
+        capture = self._ser.capture
+        if capture is not None:
+            capture.record(RECEIVED, data)
+        received.feed(data)
@@ -0,0 +1,94 @@
+"""Headless command line interface.
+
+This module must not import Qt, so that automation starts quickly.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+COMMANDS = ("send", "stop", "list-ports")
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="diy_hv", description="Control DIYHV without the GUI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    device_parser = argparse.ArgumentParser(add_help=False)
+    device_parser.add_argument("-p", "--port", required=True, help="Serial port of the device.")
+    device_parser.add_argument("-b", "--baudrate", type=int, default=9600, help="Baudrate. (default: %(default)s)")
+    device_parser.add_argument("-c", "--commands", type=Path, help="User command file.")
+    device_parser.add_argument(
+        "--ready-timeout",
+        type=float,
+        default=5,
+        help="Seconds to wait for the firmware to become ready after opening the port. (default: %(default)s)",
+    )
+
+    send_parser = subparsers.add_parser("send", parents=[device_parser], help="Apply static or dynamic voltage.")
+    send_parser.add_argument("-v", "--voltage", type=float, required=True, help="Voltage in kV.")
+    send_parser.add_argument("-f", "--frequency", type=float, help="Frequency in Hz. Static voltage if omitted.")
+    subparsers.add_parser("stop", parents=[device_parser], help="Stop applying voltage.")
+    subparsers.add_parser("list-ports", help="List serial ports.")
+    return parser.parse_args(argv)
+
+
+def _list_ports() -> int:
+    from serial.tools import list_ports
+
+    for port in list_ports.comports():
+        sys.stdout.write(f"{port.device}\t{port.description}\n")
+    return 0
+
+
+def _send(args: argparse.Namespace) -> int:
+    from diy_hv._command import load_command_table
+    from diy_hv._device import HighVoltageController
+    from serial import SerialException
+
+    try:
+        command_table = load_command_table(args.commands)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"error: failed to load commands: {e}\n")
+        return 1
+    if args.command == "stop":
+        command = command_table.stop
+    elif args.frequency is None:
+        command = command_table.static_command(args.voltage)
+    else:
+        command = command_table.dynamic_command(args.voltage, args.frequency)
+    if command is None:
+        sys.stderr.write("error: command not found.\n")
+        return 1
+
+    device = HighVoltageController()
+    device.port = args.port
+    device.baudrate = args.baudrate
+    try:
+        device.open()
+        if not device.wait_ready(args.ready_timeout):
+            sys.stderr.write("warning: the device did not report ready, sending anyway.\n")
+        device.send(command)
+        device.flush()
+    except SerialException as e:
+        sys.stderr.write(f"error: {e}\n")
+        return 1
+    finally:
+        device.close()
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the command line interface.
+
+    Args:
+        argv: Arguments without the program name. ``sys.argv`` is used if None.
+
+    Returns:
+        Exit status.
+    """
+    args = _parse_args(argv)
+    if args.command == "list-ports":
+        return _list_ports()
+    return _send(args)
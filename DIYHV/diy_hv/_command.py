@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import math
+from functools import lru_cache
+from importlib import resources
+from pathlib import Path
+
+
+class CommandConfigError(ValueError):
+    """Raised when a command configuration is invalid."""
+
+
+def _as_number(value: object, name: str, where: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise CommandConfigError(f"{where}: {name} must be a finite number, got {value!r}.")
+    return float(value)
+
+
+def _as_command(value: object, where: str) -> str:
+    if not isinstance(value, str) or value == "":
+        raise CommandConfigError(f"{where}: command must be a non-empty string, got {value!r}.")
+    return value
+
+
+def _entries(config: dict, key: str) -> list[dict]:
+    entries = config[key]
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise CommandConfigError(f"'{key}' must be a list of objects.")
+    return entries
+
+
+class CommandTable:
+    """Command table compiled from a command configuration.
+
+    Commands are looked up by numeric values in O(1).
+    """
+
+    def __init__(self, config: dict) -> None:
+        """Compile and validate the configuration.
+
+        Args:
+            config: Command configuration with ``stop``, ``static`` and ``dynamic`` keys.
+
+        Raises:
+            CommandConfigError: If the configuration is malformed or has duplicate settings.
+        """
+        for key in ("stop", "static", "dynamic"):
+            if key not in config:
+                raise CommandConfigError(f"Missing '{key}' in command configuration.")
+        self.stop = _as_command(config["stop"], "stop")
+        self.static: dict[float, str] = {}
+        self.dynamic: dict[tuple[float, float], str] = {}
+        static_voltages: dict[float, int | float] = {}
+        dynamic_voltages: dict[float, int | float] = {}
+        dynamic_frequencies: dict[float, int | float] = {}
+
+        for i, entry in enumerate(_entries(config, "static")):
+            where = f"static[{i}]"
+            voltage = _as_number(entry.get("voltage"), "voltage", where)
+            if voltage in self.static:
+                raise CommandConfigError(f"{where}: duplicate static voltage {entry['voltage']}.")
+            self.static[voltage] = _as_command(entry.get("command"), where)
+            static_voltages[voltage] = entry["voltage"]
+
+        for i, entry in enumerate(_entries(config, "dynamic")):
+            where = f"dynamic[{i}]"
+            voltage = _as_number(entry.get("voltage"), "voltage", where)
+            frequency = _as_number(entry.get("frequency"), "frequency", where)
+            if (voltage, frequency) in self.dynamic:
+                raise CommandConfigError(
+                    f"{where}: duplicate dynamic setting {entry['voltage']} kV, {entry['frequency']} Hz."
+                )
+            self.dynamic[(voltage, frequency)] = _as_command(entry.get("command"), where)
+            dynamic_voltages[voltage] = entry["voltage"]
+            dynamic_frequencies[frequency] = entry["frequency"]
+
+        if self.stop in self.static.values() or self.stop in self.dynamic.values():
+            raise CommandConfigError(f"stop command {self.stop!r} is also used to apply voltage.")
+
+        # Values as written in the configuration, for display.
+        self.static_voltages = [static_voltages[key] for key in sorted(static_voltages)]
+        self.dynamic_voltages = [dynamic_voltages[key] for key in sorted(dynamic_voltages)]
+        self.dynamic_frequencies = [dynamic_frequencies[key] for key in sorted(dynamic_frequencies)]
+
+    def static_command(self, voltage: float) -> str | None:
+        """Return the command for a static voltage or None if it is not registered."""
+        return self.static.get(float(voltage))
+
+    def dynamic_command(self, voltage: float, frequency: float) -> str | None:
+        """Return the command for a dynamic setting or None if it is not registered."""
+        return self.dynamic.get((float(voltage), float(frequency)))
+
+
+@lru_cache(maxsize=1)
+def _load_default_config() -> dict:
+    with resources.path("diy_hv", "default.json") as path:
+        return json.loads(path.read_bytes())
+
+
+@lru_cache(maxsize=16)
+def _load_command_table(user_file: str | None, mtime_ns: int, size: int) -> CommandTable:
+    config = dict(_load_default_config())
+    if user_file is not None:
+        user_config = json.loads(Path(user_file).read_bytes())
+        if not isinstance(user_config, dict):
+            raise CommandConfigError("Command configuration must be an object.")
+        config.update(user_config)
+    return CommandTable(config)
+
+
+def load_command_table(user_file: Path | None = None) -> CommandTable:
+    """Load the command table.
+
+    The default configuration is updated with the user file if given. Results are cached by path, modification time
+    and size, so the same table object is returned until the user file changes.
+
+    Args:
+        user_file: Path of the user command file.
+
+    Raises:
+        CommandConfigError: If the configuration is invalid.
+    """
+    if user_file is None:
+        return _load_command_table(None, 0, 0)
+    path = Path(user_file).absolute()
+    stat = path.stat()
+    return _load_command_table(str(path), stat.st_mtime_ns, stat.st_size)
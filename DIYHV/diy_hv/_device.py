@@ -1,22 +1,189 @@
 from __future__ import annotations
 
-from serial import Serial
+import binascii
+import time
+from typing import NamedTuple
 
+from diy_hv._capture import CaptureSerial, SerialCapture
+from diy_hv._metrics import SerialMetrics
+from serial import SerialException
 
-class _ArduinoSerial(Serial):
+# Line printed by the firmware every time it is ready to read a command.
+READY_MESSAGE = "please input your command"
+
+# Replies of the framed protocol.
+ACCEPTED = "A"
+REJECTED = "N"
+ACTUATED = "E"
+FINISHED = "F"
+REJECT_REASONS = {1: "CRC mismatch", 2: "malformed frame", 3: "value out of range", 4: "queue full"}
+_REJECTED_CRC = 1
+_MAX_SEQ = 0xFFFF
+# Kind of the frame which starts a session.
+_SESSION = "H"
+
+
+class FrameError(ValueError):
+    """Raised when a frame is malformed or its CRC does not match."""
+
+
+class CommandRejectedError(SerialException):
+    """Raised when the firmware rejects a framed command."""
+
+    def __init__(self, seq: int, code: int) -> None:
+        """Initialize class.
+
+        Args:
+            seq: Sequence number of the command.
+            code: Reason code sent by the firmware.
+        """
+        super().__init__(f"Command {seq} was rejected: {REJECT_REASONS.get(code, f'code {code}')}.")
+        self.seq = seq
+        self.code = code
+
+
+class Frame(NamedTuple):
+    """Frame of the DIYHV protocol: ``$<seq>,<kind>[,<arg>...]*<crc>``.
+
+    ``crc`` is the CRC-16/CCITT-FALSE of the characters between ``$`` and ``*`` in four upper-case hex digits.
+    """
+
+    seq: int
+    kind: str
+    args: tuple[int, ...] = ()
+
+
+def _crc(body: bytes) -> int:
+    return binascii.crc_hqx(body, 0xFFFF)
+
+
+def encode_frame(frame: Frame) -> bytes:
+    """Encode a frame, without the line delimiter."""
+    body = ",".join([str(frame.seq), frame.kind, *(str(int(arg)) for arg in frame.args)]).encode("ascii")
+    return b"$%s*%04X" % (body, _crc(body))
+
+
+def decode_frame(line: bytes) -> Frame:
+    """Decode a frame. Surrounding whitespace, such as the line delimiter, is ignored.
+
+    Raises:
+        FrameError: If the line is not a frame or its CRC does not match.
+    """
+    line = line.strip()
+    if not line.startswith(b"$") or line[-5:-4] != b"*":
+        raise FrameError(f"Not a frame: {line!r}.")
+    body = line[1:-5]
+    try:
+        crc = int(line[-4:], 16)
+    except ValueError:
+        raise FrameError(f"Invalid CRC: {line!r}.") from None
+    if crc != _crc(body):
+        raise FrameError(f"CRC mismatch: {line!r}.")
+    fields = body.split(b",")
+    try:
+        seq = int(fields[0])
+        args = tuple(int(arg) for arg in fields[2:])
+        kind = fields[1].decode("ascii")
+    except (IndexError, ValueError):
+        raise FrameError(f"Malformed frame: {line!r}.") from None
+    return Frame(seq, kind, args)
+
+
+class Setpoint(NamedTuple):
+    """Actuation carried by a framed command.
+
+    Use :meth:`static`, :meth:`dynamic` and :meth:`stop` to create one.
+    """
+
+    kind: str
+    args: tuple[int, ...] = ()
+
+    @classmethod
+    def static(cls, voltage: float) -> Setpoint:
+        """Apply a constant voltage in kV."""
+        return cls("S", (round(voltage * 1000),))
+
+    @classmethod
+    def dynamic(cls, voltage: float, frequency: float, cycles: int) -> Setpoint:
+        """Switch a voltage in kV on and off at a frequency in Hz for a number of cycles."""
+        return cls("D", (round(voltage * 1000), round(frequency * 1000), cycles))
+
+    @classmethod
+    def stop(cls) -> Setpoint:
+        """Stop at once, dropping the queued commands."""
+        return cls("X")
+
+
+class CommandTiming(NamedTuple):
+    """Timestamps of a framed command from :func:`time.perf_counter`.
+
+    ``actuated`` is None unless the actuation was waited for.
+    """
+
+    seq: int
+    sent: float
+    accepted: float
+    actuated: float | None = None
+
+    @property
+    def ack_latency(self) -> float:
+        """Seconds from sending the command to receiving its acknowledgement."""
+        return self.accepted - self.sent
+
+    @property
+    def actuation_latency(self) -> float | None:
+        """Seconds from sending the command to the report that its actuation started."""
+        return None if self.actuated is None else self.actuated - self.sent
+
+
+class _ArduinoSerial(CaptureSerial):
     def __init__(self) -> None:
         super().__init__()
         self._delimiter = "\r\n"
+        # Instrumentation is off unless metrics are set, and then costs a single attribute check per call.
+        self.metrics: SerialMetrics | None = None
+
+    def encode_message(self, message: str) -> bytes:
+        return bytes(message + self._delimiter, "utf-8")
 
     def send_message(self, message: str) -> None:
-        self.write(bytes(message + self._delimiter, "utf-8"))
+        data = self.encode_message(message)
+        metrics = self.metrics
+        if metrics is None:
+            self.write(data)
+            return
+        start = time.perf_counter()
+        self.write(data)
+        metrics.record_send(time.perf_counter() - start, len(data))
 
     def receive_message(self) -> str:
-        return (self.readline()[: -1 * len(self._delimiter)]).decode("utf-8")
+        metrics = self.metrics
+        if metrics is None:
+            return (self.readline()[: -1 * len(self._delimiter)]).decode("utf-8")
+        start = time.perf_counter()
+        line = self.readline()
+        metrics.record_receive(time.perf_counter() - start, len(line), line.endswith(bytes(self._delimiter, "utf-8")))
+        return (line[: -1 * len(self._delimiter)]).decode("utf-8")
+
+    def send_query_message(self, message: str) -> str:
+        metrics = self.metrics
+        if metrics is None:
+            self.send_message(message)
+            return self.receive_message()
+        start = time.perf_counter()
+        self.send_message(message)
+        try:
+            return self.receive_message()
+        finally:
+            metrics.record_query(time.perf_counter() - start)
 
 
 class HighVoltageController:
-    """Controller class for high voltage circuit."""
+    """Controller class for high voltage circuit.
+
+    Setting :attr:`port` to :func:`diy_hv._capture.replay_url` replays a capture made by :meth:`start_capture` instead
+    of talking to a device.
+    """
 
     PORT_FILTER = ""
 
@@ -26,6 +193,10 @@ class HighVoltageController:
         self._ser = _ArduinoSerial()
         self.port = ""
         self.baudrate = 0
+        self._seq = 0
+        self._session = False
+        self._sent: dict[int, tuple[bytes, float]] = {}
+        self._replies: dict[int, dict[str, tuple[float, tuple[int, ...]]]] = {}
 
     def open(self) -> None:
         """Open device."""
@@ -33,18 +204,240 @@ class HighVoltageController:
         self._ser.baudrate = self.baudrate
         self._ser.timeout = 0.1
         self._ser.open()
+        self._session = False
 
     def close(self) -> None:
         """Close device."""
         if self._ser.is_open:
             pass
         self._ser.close()
+        self.stop_capture()
 
     def send(self, message: str) -> None:
         """Send message to device."""
         self._ser.send_message(message)
 
+    def encode(self, message: str) -> bytes:
+        """Encode message into the bytes sent to device."""
+        return self._ser.encode_message(message)
+
+    def write(self, data: bytes) -> None:
+        """Write encoded message to device."""
+        self._ser.write(data)
+
+    def flush(self) -> None:
+        """Wait until all written data is transmitted."""
+        self._ser.flush()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Wait until the firmware prints that it is ready to read a command.
+
+        Opening the port resets the Arduino, and bytes sent before its setup finishes are lost.
+
+        Args:
+            timeout: Seconds to wait.
+
+        Returns:
+            True if the firmware became ready in time.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._ser.receive_message().strip() == READY_MESSAGE:
+                return True
+        return False
+
+    @staticmethod
+    def identify(port: str, baudrate: int = 9600, timeout: float = 3) -> bool:
+        """Return whether the DIYHV firmware is connected to the port.
+
+        The port is opened exclusively, which resets the Arduino, and the firmware is identified by its ready banner.
+        Nothing is written to the port.
+
+        Args:
+            port: Serial port to probe.
+            baudrate: Baudrate of the firmware.
+            timeout: Seconds to wait for the banner.
+        """
+        ser = _ArduinoSerial()
+        ser.port = port
+        ser.baudrate = baudrate
+        ser.timeout = 0.1
+        ser.exclusive = True
+        try:
+            ser.open()
+        except (SerialException, OSError, ValueError):
+            return False
+        try:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if READY_MESSAGE in ser.readline().decode("utf-8", errors="replace"):
+                    return True
+            return False
+        except (SerialException, OSError):
+            return False
+        finally:
+            ser.close()
+
     def send_query_message(self, message: str) -> str:
         """Send query message."""
-        self._ser.send_message(message)
-        return self._ser.receive_message()
+        return self._ser.send_query_message(message)
+
+    def start_session(self, timeout: float = 1, retries: int = 2) -> None:
+        """Make the firmware forget the sequence numbers of the commands it accepted.
+
+        The firmware keeps them until it is reset, to acknowledge retransmissions without executing them twice, so
+        the commands of a new host process would be ignored when the port does not reset the board.
+        :meth:`submit` starts a session before the first command after :meth:`open`.
+
+        Args:
+            timeout: Seconds to wait for the acknowledgement.
+            retries: Number of times the session frame is sent again.
+
+        Raises:
+            CommandRejectedError: If the firmware rejected the session.
+            TimeoutError: If the firmware did not acknowledge the session in time.
+        """
+        self._wait_accepted(self._submit(_SESSION, ()), timeout, retries)
+        self._session = True
+
+    def submit(self, setpoint: Setpoint) -> int:
+        """Send a framed command without waiting for the reply, so several commands can be pipelined.
+
+        Returns:
+            Sequence number of the command, to wait for with :meth:`wait_reply`.
+        """
+        if not self._session:
+            self.start_session()
+        return self._submit(setpoint.kind, setpoint.args)
+
+    def _submit(self, kind: str, args: tuple[int, ...]) -> int:
+        self._seq = self._seq % _MAX_SEQ + 1
+        data = encode_frame(Frame(self._seq, kind, args)) + bytes(self._ser._delimiter, "ascii")
+        # Replies to an earlier command with the same number, after wrapping around, must not be taken for these.
+        self._replies.pop(self._seq, None)
+        self._sent.pop(self._seq, None)
+        self._sent[self._seq] = (data, time.perf_counter())
+        if len(self._sent) > 256:
+            del self._sent[next(iter(self._sent))]
+        self._ser.write(data)
+        return self._seq
+
+    def wait_reply(self, seq: int, kind: str = ACCEPTED, timeout: float = 1) -> float:
+        """Wait for a reply to a framed command.
+
+        Args:
+            seq: Sequence number returned by :meth:`submit`.
+            kind: Reply to wait for: ``ACCEPTED``, ``ACTUATED`` or ``FINISHED``.
+            timeout: Seconds to wait.
+
+        Returns:
+            Time of the reply from :func:`time.perf_counter`.
+
+        Raises:
+            CommandRejectedError: If the firmware rejected the command.
+            TimeoutError: If the reply did not arrive in time.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            replies = self._replies.get(seq, {})
+            if REJECTED in replies:
+                raise CommandRejectedError(seq, replies[REJECTED][1][0] if replies[REJECTED][1] else 0)
+            if kind in replies:
+                return replies[kind][0]
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"No reply {kind!r} to command {seq}.")
+            self._read_reply()
+
+    def execute(
+        self, setpoint: Setpoint, timeout: float = 1, retries: int = 2, wait_actuation: bool = True
+    ) -> CommandTiming:
+        """Send a framed command and wait until it is accepted and, optionally, actuated.
+
+        The command is sent again with the same sequence number when it is not acknowledged in time. The firmware
+        acknowledges a repeated command without executing it twice.
+
+        Args:
+            setpoint: Actuation to apply.
+            timeout: Seconds to wait for each reply.
+            retries: Number of times the command is sent again.
+            wait_actuation: If True, also wait until the actuation starts, which follows a running dynamic one.
+
+        Raises:
+            CommandRejectedError: If the firmware rejected the command.
+            TimeoutError: If a reply did not arrive in time.
+        """
+        seq = self.submit(setpoint)
+        accepted = self._wait_accepted(seq, timeout, retries)
+        actuated = self.wait_reply(seq, ACTUATED, timeout) if wait_actuation else None
+        return CommandTiming(seq, self._sent[seq][1], accepted, actuated)
+
+    def _wait_accepted(self, seq: int, timeout: float, retries: int) -> float:
+        attempt = 0
+        while True:
+            try:
+                return self.wait_reply(seq, ACCEPTED, timeout)
+            except CommandRejectedError as e:
+                # A command corrupted on the line is sent again, any other rejection is final.
+                if e.code != _REJECTED_CRC or attempt >= retries:
+                    raise
+            except TimeoutError:
+                if attempt >= retries:
+                    raise
+            attempt += 1
+            self._replies.pop(seq, None)
+            self._ser.write(self._sent[seq][0])
+
+    def _read_reply(self) -> None:
+        line = self._ser.readline()
+        received = time.perf_counter()
+        if not line.startswith(b"$"):
+            # Banner or an incomplete line.
+            return
+        try:
+            frame = decode_frame(line)
+        except FrameError:
+            return
+        if frame.seq not in self._sent:
+            return
+        self._replies.setdefault(frame.seq, {})[frame.kind] = (received, frame.args)
+        if len(self._replies) > 256:
+            del self._replies[next(iter(self._replies))]
+
+    @property
+    def metrics(self) -> SerialMetrics | None:
+        """Latency and traffic metrics of the port, or None if instrumentation is disabled."""
+        return self._ser.metrics
+
+    def enable_metrics(self) -> SerialMetrics:
+        """Enable instrumentation of sends, receives and queries.
+
+        Returns:
+            Metrics updated by every following call. Existing metrics are kept if already enabled.
+        """
+        if self._ser.metrics is None:
+            self._ser.metrics = SerialMetrics()
+        return self._ser.metrics
+
+    def disable_metrics(self) -> None:
+        """Disable instrumentation."""
+        self._ser.metrics = None
+
+    def start_capture(self, path: str) -> SerialCapture:
+        """Record every byte read from and written to the port, with timestamps.
+
+        Args:
+            path: Path of the capture. An existing capture is appended to.
+
+        Returns:
+            The capture. Use :class:`diy_hv._capture.CaptureFile` to read it back.
+        """
+        if self._ser.capture is not None:
+            raise RuntimeError("Port is already captured.")
+        self._ser.capture = SerialCapture(path)
+        return self._ser.capture
+
+    def stop_capture(self) -> None:
+        """Stop recording and close the capture."""
+        capture, self._ser.capture = self._ser.capture, None
+        if capture is not None:
+            capture.close()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from diy_hv._command import load_command_table
+from diy_hv._device import HighVoltageController
+from serial import SerialException
+
+
+class SendRecord(NamedTuple):
+    """Result of a broadcast for one device."""
+
+    port: str
+    started: float
+    finished: float
+    error: Exception | None = None
+
+
+class BroadcastResult(NamedTuple):
+    """Result of a broadcast.
+
+    Timestamps come from :func:`time.perf_counter`.
+    """
+
+    message: str
+    records: list[SendRecord]
+
+    @property
+    def skew(self) -> float:
+        """Seconds between the first and the last completed write."""
+        finished = [record.finished for record in self.records if record.error is None]
+        return max(finished) - min(finished) if finished else 0.0
+
+    @property
+    def failed(self) -> list[SendRecord]:
+        """Records of the devices which could not be written to."""
+        return [record for record in self.records if record.error is not None]
+
+
+class ControllerFleet:
+    """Group of high voltage controllers driven together.
+
+    Ports are opened in parallel. Broadcasts encode the message once and write it to every port back to back from
+    the calling thread, which keeps the skew between devices at the cost of a system call each.
+    """
+
+    def __init__(self, ports: list[str], baudrate: int = 9600) -> None:
+        """Initialize fleet.
+
+        Args:
+            ports: Serial ports of the controllers.
+            baudrate: Baudrate shared by the controllers.
+        """
+        self.controllers: list[HighVoltageController] = []
+        for port in ports:
+            controller = HighVoltageController()
+            controller.port = port
+            controller.baudrate = baudrate
+            self.controllers.append(controller)
+
+    def __enter__(self) -> ControllerFleet:
+        """Open every controller."""
+        self.open()
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Close every controller."""
+        self.close()
+
+    def open(self) -> None:
+        """Open every controller in parallel.
+
+        Raises:
+            SerialException: If any port fails to open. The ports which were opened are closed again.
+        """
+        with ThreadPoolExecutor(max_workers=max(len(self.controllers), 1)) as executor:
+            futures = [executor.submit(controller.open) for controller in self.controllers]
+        errors = [
+            f"{controller.port}: {future.exception()}"
+            for controller, future in zip(self.controllers, futures)
+            if future.exception() is not None
+        ]
+        if errors:
+            self.close()
+            raise SerialException("Failed to open ports.\n" + "\n".join(errors))
+
+    def close(self) -> None:
+        """Close every controller."""
+        for controller in self.controllers:
+            controller.close()
+
+    def broadcast(self, message: str, drain: bool = False) -> BroadcastResult:
+        """Send a message to every controller.
+
+        A failing device does not prevent the message from reaching the others.
+
+        Args:
+            message: Message to send.
+            drain: If True, wait until the message has been transmitted by every port.
+
+        Returns:
+            Send timestamps of every device.
+        """
+        data = [controller.encode(message) for controller in self.controllers]
+        records = []
+        for controller, encoded in zip(self.controllers, data):
+            started = time.perf_counter()
+            try:
+                controller.write(encoded)
+            except (SerialException, OSError) as e:
+                records.append(SendRecord(controller.port, started, time.perf_counter(), e))
+                continue
+            records.append(SendRecord(controller.port, started, time.perf_counter()))
+        if drain:
+            for controller, record in zip(self.controllers, records):
+                if record.error is None:
+                    controller.flush()
+        return BroadcastResult(message, records)
+
+    def stop(self, stop_command: str | None = None) -> BroadcastResult:
+        """Broadcast the stop command and wait until it has been transmitted by every port.
+
+        The firmware applies the legacy stop at once, interrupting a dynamic run and dropping the queued commands, so
+        the fleet stops without waiting for replies. It needs no session, unlike a framed stop.
+
+        Args:
+            stop_command: Stop command. The one of the default command table is used if None.
+        """
+        if stop_command is None:
+            stop_command = load_command_table().stop
+        return self.broadcast(stop_command, drain=True)
@@ -1,12 +1,21 @@
-import json
-from importlib import resources
+from __future__ import annotations
+
+import logging
+import threading
+import time
 from pathlib import Path
 
 import qtawesome as qta
+from diy_hv._command import CommandTable, load_command_table
 from diy_hv._device import HighVoltageController
+from diy_hv._ports import PortRegistry
+from diy_hv._probe import DEFAULT_IDENTIFIERS, probe_ports
+from diy_hv._sequence import SequenceRunner, load_profile, save_records
+from diy_hv._theme import ThemeCache, detect_theme
 from diy_hv._widgets import FlexiblePopupCombobox, PortCombobox
-from qtpy.QtCore import Slot  # type: ignore
-from qtpy.QtGui import QAction
+from diy_hv._worker import DeviceWorker
+from qtpy.QtCore import Qt, Signal, Slot  # type: ignore
+from qtpy.QtGui import QAction, QIcon
 from qtpy.QtWidgets import (
     QApplication,
     QButtonGroup,
@@ -25,7 +34,8 @@ from qtpy.QtWidgets import (
     QVBoxLayout,
     QWidget,
 )
-from serial import SerialException
+
+_logger = logging.getLogger(__name__)
 
 
 def _add_unit(widget: QWidget, text: str) -> QWidget:
@@ -48,6 +58,8 @@ class MainWindowUI:
         self.action_disconnect = QAction("Disconnect")
         self.action_update_command = QAction("Update command")
         self.action_register_user_file = QAction("Register user file")
+        self.action_run_profile = QAction("Run profile")
+        self.action_abort_profile = QAction("Abort profile")
 
         # Widgets
         self.tool_btn_connection = QToolButton()
@@ -79,7 +91,9 @@ class MainWindowUI:
         menu_connection = menubar.addMenu("&Connection")
         menu_connection.addActions((self.action_connect, self.action_disconnect))
         menu_setting = menubar.addMenu("&Setting")
-        menu_setting.addAction(self.action_register_user_file)
+        menu_setting.addActions((self.action_register_user_file, self.action_update_command))
+        menu_profile = menubar.addMenu("&Profile")
+        menu_profile.addActions((self.action_run_profile, self.action_abort_profile))
 
         # Layout
         static_page = QWidget()
@@ -120,12 +134,16 @@ class MainWindowUI:
 class DeviceDialog(QDialog):
     """Device dialog."""
 
-    def __init__(self, device: HighVoltageController) -> None:
+    _probe_finished = Signal(str)
+
+    def __init__(self, worker: DeviceWorker) -> None:
         """Initialize dialog."""
         super().__init__()
-        self._device = device
+        self._worker = worker
+        self._is_opening = False
         self._baudrate_combo = FlexiblePopupCombobox()
         self._port_combo = PortCombobox()
+        self._identify_btn = QPushButton("Identify")
         self._btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Cancel | QDialogButtonBox.StandardButton.Ok)
         self._setup_ui()
 
@@ -139,34 +157,92 @@ class DeviceDialog(QDialog):
         # Layout
         main_layout = QVBoxLayout(self)
         main_layout.addWidget(self._baudrate_combo)
-        main_layout.addWidget(self._port_combo)
+        port_layout = QHBoxLayout()
+        port_layout.addWidget(self._port_combo)
+        port_layout.addWidget(self._identify_btn)
+        main_layout.addLayout(port_layout)
         main_layout.addWidget(self._btn_box)
+        # Signal
+        self._identify_btn.pressed.connect(self._start_probe)
+        self._worker.opened.connect(self.accept)
+        self._worker.open_failed.connect(self._handle_open_failed)
+        self._probe_finished.connect(self._select_probed_port)
+
+    @Slot()
+    def _start_probe(self) -> None:
+        # Probing opens and resets every idle port, so it only runs when asked, and in the background. The port of
+        # the connected device and the ports of other programs are skipped.
+        baudrate = int(self._baudrate_combo.currentText())
+        identifiers = {
+            **DEFAULT_IDENTIFIERS,
+            "DIYHV": lambda port, timeout: HighVoltageController.identify(port, baudrate, timeout),
+        }
+        ports = [port.device for port in PortRegistry.shared().ports(timeout=0) if port.device != self._worker.port]
+        self._identify_btn.setEnabled(False)
+        self._port_combo.setPlaceholderText("Detecting device...")
+
+        def probe() -> None:
+            results = probe_ports(ports, identifiers)
+            found = sorted(result.port for result in results.values() if result.device == "DIYHV")
+            self._probe_finished.emit(found[0] if found else "")
+
+        threading.Thread(target=probe, name="DIYHVProbe", daemon=True).start()
+
+    @Slot(str)
+    def _select_probed_port(self, port: str) -> None:
+        self._identify_btn.setEnabled(True)
+        self._port_combo.setPlaceholderText("Select Port")
+        # Do not override a port which the user has already selected.
+        if port != "" and self._port_combo.get_select_port_info() is None:
+            self._port_combo.select_port(port)
 
     @Slot()
     def _connect(self) -> None:
-        self._device.baudrate = int(self._baudrate_combo.currentText())
         port_info = self._port_combo.get_select_port_info()
         if port_info is None:
             QMessageBox.warning(self, "Warning", "Port is not selected.")
             return
-        self._device.port = port_info.device
-        try:
-            self._device.open()
-        except SerialException:
-            self.reject()
-        self.accept()
+        # The port is opened on the worker thread, so a slow port does not freeze the window.
+        self._btn_box.setEnabled(False)
+        self._is_opening = True
+        self._worker.open(port_info.device, int(self._baudrate_combo.currentText()))
+
+    @Slot(str)
+    def _handle_open_failed(self, message: str) -> None:
+        self._is_opening = False
+        QMessageBox.warning(self, "Warning", f"Failed to open port.\n{message}")
+        self.reject()
+
+    def done(self, result: int) -> None:
+        """Override method."""
+        self._worker.opened.disconnect(self.accept)
+        self._worker.open_failed.disconnect(self._handle_open_failed)
+        if self._is_opening and result == QDialog.DialogCode.Rejected:
+            # Closed while the port was opening, so undo the open.
+            self._worker.close()
+        super().done(result)
 
 
 class MainWindow(QDialog):
     """Main window for app."""
 
+    _profile_finished = Signal(str)
+
     def __init__(self) -> None:
         """Initialize the main window."""
         super().__init__()
         self._ui = MainWindowUI()
         self._ui.setup_ui(self)
-        self._device = HighVoltageController()
-        self._command_conf: dict[str, list[dict[str, str | int]]] = {}
+        self._worker = DeviceWorker(HighVoltageController(), self)
+        # Start enumerating the ports now, so the device dialog opens from the cache.
+        self._port_registry = PortRegistry.shared()
+        self._command_table: CommandTable | None = None
+        self._user_command_file: Path | None = None
+        self._sequence_runner: SequenceRunner | None = None
+        self._theme_cache = ThemeCache()
+        self._theme = ""
+        self._is_applying_theme = False
+        self._icons: dict[str, tuple[QIcon, ...]] = {}
 
         # Signal
         QApplication.instance().paletteChanged.connect(self._sync_theme_with_system)  # type: ignore
@@ -175,7 +251,16 @@ class MainWindow(QDialog):
         for action in (self._ui.action_connect, self._ui.action_disconnect):
             action.triggered.connect(self._toggle_connection)
         self._ui.push_btn_send.pressed.connect(self._send_command)
+        self._ui.push_btn_stop.pressed.connect(self._send_stop_command)
         self._ui.action_register_user_file.triggered.connect(self._register_user_command)
+        self._ui.action_update_command.triggered.connect(self._reload_command)
+        self._worker.error.connect(self._show_device_error)
+        self._ui.action_run_profile.triggered.connect(self._run_profile)
+        self._ui.action_abort_profile.triggered.connect(self._abort_profile)
+        self._profile_finished.connect(self._handle_profile_finished)
+        QApplication.instance().aboutToQuit.connect(self._abort_profile)  # type: ignore
+        QApplication.instance().aboutToQuit.connect(lambda: self._worker.shutdown(timeout=1))  # type: ignore
+        QApplication.instance().aboutToQuit.connect(lambda: self._port_registry.stop(timeout=1))  # type: ignore
 
         # Setup window
         self._sync_theme_with_system()
@@ -183,31 +268,51 @@ class MainWindow(QDialog):
         self._update_command()
         self.setWindowTitle("DIYHV")
 
+    @property
+    def theme_source(self) -> str:
+        """Where the current theme came from: ``memory``, ``disk`` or ``generated``."""
+        return self._theme_cache.last_source
+
     @Slot()
     def _sync_theme_with_system(self) -> None:
-        import darkdetect
-        import qdarktheme
-
-        try:
-            theme = darkdetect.theme()
-            if theme is None:
-                theme = "dark"
-        except FileNotFoundError:
-            theme = "dark"
-        theme = theme.lower()
+        # Setting the palette emits paletteChanged again, which must not re-apply the theme.
+        if self._is_applying_theme:
+            return
+        theme = detect_theme()
+        if theme == self._theme:
+            return
+        start = time.perf_counter()
+        palette, stylesheet = self._theme_cache.load(theme)
 
         app: QApplication = QApplication.instance()  # type: ignore
-        app.setPalette(qdarktheme.load_palette(theme))
-        app.setStyleSheet(qdarktheme.load_stylesheet(theme))
-        icon_color = app.palette().text().color()
-        window_color = app.palette().window().color()
+        self._is_applying_theme = True
+        try:
+            app.setPalette(palette)
+            app.setStyleSheet(stylesheet)
+        finally:
+            self._is_applying_theme = False
+        self._theme = theme
 
         # Update icon
-        self._ui.action_connect.setIcon(qta.icon("mdi6.power-plug", color=icon_color))
-        self._ui.action_disconnect.setIcon(qta.icon("mdi6.power-plug-off", color=icon_color))
-        self._ui.action_update_command.setIcon(qta.icon("mdi6.file-cog-outline", color=icon_color))
-        self._ui.push_btn_send.setIcon(qta.icon("mdi6.send", color=window_color))
-        self._ui.action_register_user_file.setIcon(qta.icon("mdi.content-save-cog", color=icon_color))
+        if theme not in self._icons:
+            icon_color = app.palette().text().color()
+            window_color = app.palette().window().color()
+            self._icons[theme] = (
+                qta.icon("mdi6.power-plug", color=icon_color),
+                qta.icon("mdi6.power-plug-off", color=icon_color),
+                qta.icon("mdi6.file-cog-outline", color=icon_color),
+                qta.icon("mdi6.send", color=window_color),
+                qta.icon("mdi.content-save-cog", color=icon_color),
+            )
+        icons = self._icons[theme]
+        self._ui.action_connect.setIcon(icons[0])
+        self._ui.action_disconnect.setIcon(icons[1])
+        self._ui.action_update_command.setIcon(icons[2])
+        self._ui.push_btn_send.setIcon(icons[3])
+        self._ui.action_register_user_file.setIcon(icons[4])
+        _logger.info(
+            "Applied %s theme in %.1f ms (%s).", theme, (time.perf_counter() - start) * 1e3, self.theme_source
+        )
 
     @Slot()
     def _switch_mode(self) -> None:
@@ -219,81 +324,130 @@ class MainWindow(QDialog):
         connection: str = self.sender().text()  # type: ignore
         is_connect = connection == "Connect"
         if is_connect:
-            result = DeviceDialog(self._device).exec()
+            result = DeviceDialog(self._worker).exec()
             if result == 0:
                 return
             self._ui.tool_btn_connection.setDefaultAction(self._ui.action_disconnect)
             self._ui.tool_btn_connection.removeAction(self._ui.action_connect)
         else:
-            self._device.close()
+            # The runner queues the stop command before it returns, so it is written before the port is closed.
+            self._abort_profile()
+            self._worker.close()
             self._ui.tool_btn_connection.setDefaultAction(self._ui.action_connect)
             self._ui.tool_btn_connection.removeAction(self._ui.action_disconnect)
         self._ui.push_btn_send.setEnabled(is_connect)
         self._ui.action_connect.setDisabled(is_connect)
         self._ui.action_disconnect.setEnabled(is_connect)
         self._ui.push_btn_stop.setEnabled(is_connect)
+        self._ui.action_run_profile.setEnabled(is_connect and self._sequence_runner is None)
+        self._ui.action_abort_profile.setEnabled(self._sequence_runner is not None)
 
-    @Slot()
-    def _update_command(self, user_command_conf: dict = None) -> None:
-        with resources.path("diy_hv", "default.json") as path:
-            json_text = path.read_bytes()
-        command_conf: dict = json.loads(json_text)
-        if user_command_conf is not None:
-            command_conf.update(user_command_conf)
-        stop_command: str = command_conf.pop("stop")
-        self._command_conf = command_conf
-        static_commands: list[dict[str, str | int]] = command_conf["static"]
-        dynamic_commands: list[dict[str, str | int]] = command_conf["dynamic"]
+    def _update_command(self, user_command_file: Path | None = None) -> None:
+        try:
+            command_table = load_command_table(user_command_file)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Warning", f"Failed to load commands.\n{e}")
+            return
+        self._user_command_file = user_command_file
+        if command_table is self._command_table:
+            return
+        self._command_table = command_table
 
         # Static
         self._ui.combo_static_voltage.clear()
-        static_voltages = sorted({command["voltage"] for command in static_commands})
-        static_voltages.sort()
-        self._ui.combo_static_voltage.addItems([str(voltage) for voltage in static_voltages])
+        self._ui.combo_static_voltage.addItems([str(voltage) for voltage in command_table.static_voltages])
 
         # Dynamic
         self._ui.combo_dynamic_voltage.clear()
         self._ui.combo_dynamic_frequency.clear()
-        dynamic_voltages = sorted({command["voltage"] for command in dynamic_commands})
-        dynamic_frequency = sorted({command["frequency"] for command in dynamic_commands})
-        dynamic_voltages.sort()
-        dynamic_frequency.sort()
-        self._ui.combo_dynamic_voltage.addItems([str(voltage) for voltage in dynamic_voltages])
-        self._ui.combo_dynamic_frequency.addItems([str(frequency) for frequency in dynamic_frequency])
+        self._ui.combo_dynamic_voltage.addItems([str(voltage) for voltage in command_table.dynamic_voltages])
+        self._ui.combo_dynamic_frequency.addItems([str(frequency) for frequency in command_table.dynamic_frequencies])
 
-        self._ui.push_btn_stop.disconnect()
-        self._ui.push_btn_stop.pressed.connect(lambda: self._device.send(stop_command))
+    @Slot()
+    def _reload_command(self) -> None:
+        self._update_command(self._user_command_file)
 
     @Slot()
     def _register_user_command(self) -> None:
         file_name = QFileDialog.getOpenFileName(self, "Open File", filter="Settings (*.json)")[0]
+        if file_name == "":
+            return
+        self._update_command(Path(file_name).absolute())
+
+    @Slot()
+    def _run_profile(self) -> None:
+        if self._command_table is None or self._sequence_runner is not None:
+            return
+        file_name = QFileDialog.getOpenFileName(self, "Open Profile", filter="Profile (*.json)")[0]
         if file_name == "":
             return
         path = Path(file_name).absolute()
-        json_text = path.read_bytes()
-        user_conf = json.loads(json_text)
-        self._update_command(user_conf)
+        try:
+            steps = load_profile(path, self._command_table)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Warning", f"Failed to load profile.\n{e}")
+            return
+        runner = SequenceRunner(
+            steps, lambda command: self._worker.send(command, coalesce=False), self._command_table.stop
+        )
+        # The worker reports every write on its thread, which gives the actual dispatch time of the steps.
+        self._worker.sent.connect(runner.mark_written, Qt.ConnectionType.DirectConnection)
+        self._sequence_runner = runner
+        self._ui.action_run_profile.setEnabled(False)
+        self._ui.action_abort_profile.setEnabled(True)
+
+        def run() -> None:
+            runner.run()
+            runner.wait_written(timeout=1)
+            self._worker.sent.disconnect(runner.mark_written)
+            # Keep the intended and actual dispatch times to measure scheduling jitter.
+            log_path = path.with_suffix(".log.csv")
+            try:
+                save_records(runner.records, log_path)
+            except OSError:
+                log_path = None
+            self._profile_finished.emit("" if log_path is None else str(log_path))
+
+        threading.Thread(target=run, name="DIYHVSequence", daemon=True).start()
+
+    @Slot()
+    def _abort_profile(self) -> None:
+        if self._sequence_runner is not None:
+            self._sequence_runner.abort()
+
+    @Slot(str)
+    def _handle_profile_finished(self, log_path: str) -> None:
+        self._sequence_runner = None
+        self._ui.action_run_profile.setEnabled(self._ui.push_btn_send.isEnabled())
+        self._ui.action_abort_profile.setEnabled(False)
+        if log_path == "":
+            QMessageBox.warning(self, "Warning", "Failed to save the dispatch log.")
+
+    @Slot()
+    def _send_stop_command(self) -> None:
+        self._abort_profile()
+        if self._command_table is not None:
+            self._worker.stop(self._command_table.stop)
 
     @Slot()
     def _send_command(self) -> None:
-        is_static = self._ui.push_btn_static.isChecked()
-        if is_static:
-            for command in self._command_conf["static"]:
-                voltage = self._ui.combo_static_voltage.currentText()
-                if str(command["voltage"]) == voltage:
-                    command = command["command"]
-                    break
-            else:
-                QMessageBox.warning(self, "Warning", "Command not found.")
-                return
-        else:
-            for command in self._command_conf["dynamic"]:
-                voltage = self._ui.combo_dynamic_voltage.currentText()
-                frequency = self._ui.combo_dynamic_frequency.currentText()
-                if str(command["voltage"]) == voltage and str(command["frequency"]) == frequency:
-                    command = command["command"]
-                    break
+        if self._command_table is None:
+            return
+        try:
+            if self._ui.push_btn_static.isChecked():
+                command = self._command_table.static_command(float(self._ui.combo_static_voltage.currentText()))
             else:
-                QMessageBox.warning(self, "Warning", "Command not found.")
-                return
-        self._device.send(command)  # type: ignore
+                command = self._command_table.dynamic_command(
+                    float(self._ui.combo_dynamic_voltage.currentText()),
+                    float(self._ui.combo_dynamic_frequency.currentText()),
+                )
+        except ValueError:
+            command = None
+        if command is None:
+            QMessageBox.warning(self, "Warning", "Command not found.")
+            return
+        self._worker.send(command)
+
+    @Slot(str)
+    def _show_device_error(self, message: str) -> None:
+        QMessageBox.warning(self, "Warning", f"Failed to communicate with the device.\n{message}")
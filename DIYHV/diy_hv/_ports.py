@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+
+from qtpy.QtCore import QObject, Signal  # type: ignore
+from serial.tools import list_ports
+from serial.tools.list_ports_common import ListPortInfo
+
+_SYSFS_TTY = "/sys/class/tty"
+
+
+def _sysfs_snapshot() -> frozenset[str] | None:
+    # Listing sysfs is much cheaper than a full enumeration, which reads several attributes of every device.
+    try:
+        return frozenset(os.listdir(_SYSFS_TTY))
+    except OSError:
+        return None
+
+
+class PortRegistry(QObject):
+    """Registry of the serial ports, enumerated on a background thread.
+
+    Widgets read the cached ports with :meth:`ports` and follow the changes through ``ports_added`` and
+    ``ports_removed``, which are delivered on the thread of the receiver. On Linux, ``/sys/class/tty`` is polled
+    and the ports are only enumerated again when it changes.
+    """
+
+    ports_added = Signal(list)
+    ports_removed = Signal(list)
+
+    _instance: PortRegistry | None = None
+
+    def __init__(self, interval: float = 1, parent: QObject = None) -> None:
+        """Initialize registry and start its thread.
+
+        Args:
+            interval: Seconds between polls.
+            parent: Parent object.
+        """
+        super().__init__(parent)
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._ports: dict[str, ListPortInfo] = {}
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="DIYHVPortRegistry", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def shared(cls) -> PortRegistry:
+        """Return the registry shared by the application, starting it on first use."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def ports(self, timeout: float | None = None) -> list[ListPortInfo]:
+        """Return the cached ports sorted by device name.
+
+        Args:
+            timeout: Seconds to wait for the first enumeration. None waits until it completes.
+        """
+        self._ready.wait(timeout)
+        with self._lock:
+            return sorted(self._ports.values(), key=lambda port: port.device)
+
+    def refresh(self) -> None:
+        """Enumerate the ports now and emit the changes."""
+        ports = {port.device: port for port in list_ports.comports()}
+        with self._lock:
+            added = [port for device, port in ports.items() if device not in self._ports]
+            removed = [port for device, port in self._ports.items() if device not in ports]
+            self._ports = ports
+        self._ready.set()
+        if added:
+            self.ports_added.emit(sorted(added, key=lambda port: port.device))
+        if removed:
+            self.ports_removed.emit(removed)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop the thread."""
+        self._stop_event.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        snapshot = _sysfs_snapshot() if sys.platform.startswith("linux") else None
+        self.refresh()
+        while not self._stop_event.wait(self._interval):
+            if snapshot is not None:
+                new_snapshot = _sysfs_snapshot()
+                if new_snapshot == snapshot:
+                    continue
+                snapshot = new_snapshot
+            self.refresh()
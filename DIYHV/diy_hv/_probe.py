@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, NamedTuple
+
+from diy_hv._device import HighVoltageController
+
+# Device name and a callable returning whether the device is connected to a port within a timeout.
+Identifiers = Dict[str, Callable[[str, float], bool]]
+
+
+def _identify_loadcell(port: str, timeout: float) -> bool:
+    # The load cell plugin is optional, and its driver needs pyautolab.
+    try:
+        from pyautolab_Loadcell.driver import Loadcell
+    except ImportError:
+        return False
+    return Loadcell.identify(port, 9600, timeout)
+
+
+# The load cell is queried with "a", which is also a command of the DIYHV firmware, so it is only tried on ports where
+# the banner of the firmware was not seen.
+DEFAULT_IDENTIFIERS: Identifiers = {
+    "DIYHV": lambda port, timeout: HighVoltageController.identify(port, 9600, timeout),
+    "Loadcell": _identify_loadcell,
+}
+
+
+class ProbeResult(NamedTuple):
+    """Result of probing a port."""
+
+    port: str
+    device: str | None
+    elapsed: float
+    busy: bool = False
+
+
+def busy_ports(ports: list[str]) -> set[str]:
+    """Return the ports which another process has open.
+
+    Opening a port resets the Arduino, so probing it would interrupt a program using the device. Open files are read
+    from ``/proc``, so nothing is found on other systems, where the exclusive open of the identifiers is the only
+    guard. Ports opened by this process are not reported.
+
+    Args:
+        ports: Serial ports to check.
+    """
+    targets = {os.path.realpath(port): port for port in ports}
+    busy: set[str] = set()
+    try:
+        pids = [entry for entry in os.listdir("/proc") if entry.isdigit() and int(entry) != os.getpid()]
+    except OSError:
+        return busy
+    for pid in pids:
+        try:
+            fds = os.listdir(f"/proc/{pid}/fd")
+        except OSError:
+            # The process exited, or belongs to another user.
+            continue
+        for fd in fds:
+            try:
+                path = os.readlink(f"/proc/{pid}/fd/{fd}")
+            except OSError:
+                continue
+            if path in targets:
+                busy.add(targets[path])
+    return busy
+
+
+def _probe_port(port: str, identifiers: Identifiers, timeout: float) -> ProbeResult:
+    start = time.perf_counter()
+    for device, identify in identifiers.items():
+        if identify(port, timeout):
+            return ProbeResult(port, device, time.perf_counter() - start)
+    return ProbeResult(port, None, time.perf_counter() - start)
+
+
+def probe_ports(
+    ports: list[str], identifiers: Identifiers | None = None, timeout: float = 3, skip_busy: bool = True
+) -> dict[str, ProbeResult]:
+    """Identify the devices connected to the ports.
+
+    Every port is probed on its own thread, so the total time is that of the slowest port rather than the sum over
+    the ports. Each identifier of a port is given ``timeout`` seconds, and they are tried in order until one matches.
+
+    Args:
+        ports: Serial ports to probe.
+        identifiers: Identifiers of the devices. Only the high voltage controller is identified if None.
+        timeout: Seconds given to each identifier.
+        skip_busy: If True, ports found by :func:`busy_ports` are not opened, and their results are marked busy.
+
+    Returns:
+        Results keyed by port.
+    """
+    if identifiers is None:
+        identifiers = DEFAULT_IDENTIFIERS
+    busy = busy_ports(ports) if skip_busy else set()
+    results = {port: ProbeResult(port, None, 0.0, busy=True) for port in ports if port in busy}
+    idle = [port for port in ports if port not in busy]
+    if not idle:
+        return results
+    with ThreadPoolExecutor(max_workers=len(idle), thread_name_prefix="DIYHVProbe") as executor:
+        futures = [executor.submit(_probe_port, port, identifiers, timeout) for port in idle]
+    results.update((future.result().port, future.result()) for future in futures)
+    return results
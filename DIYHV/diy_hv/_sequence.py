@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from diy_hv._command import CommandTable
+
+_logger = logging.getLogger(__name__)
+
+
+class ProfileError(ValueError):
+    """Raised when a profile is invalid or uses a setting missing from the command table."""
+
+
+class Step(NamedTuple):
+    """Step of a profile resolved against a command table."""
+
+    offset: float
+    command: str
+    label: str
+
+
+class DispatchRecord(NamedTuple):
+    """Intended and actual dispatch time of a step.
+
+    Times are seconds from the start of the run on the monotonic clock. The actual time is the time the command was
+    written to the device once :meth:`SequenceRunner.mark_written` confirms it, and the time it was queued before.
+    """
+
+    step: Step
+    intended: float
+    actual: float
+    written: bool = False
+
+    @property
+    def jitter(self) -> float:
+        """Seconds the step was dispatched late."""
+        return self.actual - self.intended
+
+
+def _step_command(step: dict, command_table: CommandTable, where: str) -> tuple[str, str]:
+    # Returns the command of a step and its label.
+    mode = step.get("mode")
+    if mode not in ("static", "dynamic", "stop"):
+        raise ProfileError(f"{where}: unknown mode {mode!r}.")
+    try:
+        if mode == "static":
+            command = command_table.static_command(step["voltage"])
+            label = f"static {step['voltage']} kV"
+        elif mode == "dynamic":
+            command = command_table.dynamic_command(step["voltage"], step["frequency"])
+            label = f"dynamic {step['voltage']} kV {step['frequency']} Hz"
+        else:
+            command = command_table.stop
+            label = "stop"
+    except (KeyError, TypeError, ValueError) as e:
+        raise ProfileError(f"{where}: missing or invalid setting ({e}).") from None
+    if command is None:
+        raise ProfileError(f"{where}: {label} is not in the command table.")
+    return command, label
+
+
+def _step_duration(step: dict, is_last: bool, where: str) -> float | None:
+    duration = step.get("duration")
+    if duration is None:
+        if not is_last:
+            raise ProfileError(f"{where}: duration is required except for the last step.")
+        return None
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration < 0:
+        raise ProfileError(f"{where}: duration must be a non-negative number of seconds.")
+    return duration
+
+
+def resolve_profile(profile: dict, command_table: CommandTable) -> list[Step]:
+    """Resolve a profile into the commands to send and their offsets from the start.
+
+    A profile has a ``steps`` list. Each step has a ``mode`` of ``static``, ``dynamic`` or ``stop``, the ``voltage``
+    and ``frequency`` of its mode and, except for the last one, a ``duration`` in seconds. A last step with a
+    ``duration`` is held for it and followed by a stop.
+
+    Example::
+
+        {
+            "steps": [
+                {"mode": "static", "voltage": 2, "duration": 600},
+                {"mode": "dynamic", "voltage": 3, "frequency": 5, "duration": 120},
+                {"mode": "stop"}
+            ]
+        }
+
+    Raises:
+        ProfileError: If the profile is malformed or uses a setting missing from the command table.
+    """
+    steps = profile.get("steps") if isinstance(profile, dict) else None
+    if not isinstance(steps, list) or not steps:
+        raise ProfileError("Profile must have a non-empty 'steps' list.")
+    resolved = []
+    offset = 0.0
+    for i, step in enumerate(steps):
+        where = f"steps[{i}]"
+        if not isinstance(step, dict):
+            raise ProfileError(f"{where}: step must be an object.")
+        command, label = _step_command(step, command_table, where)
+        resolved.append(Step(offset, command, label))
+        duration = _step_duration(step, i == len(steps) - 1, where)
+        if duration is None:
+            break
+        offset += duration
+    else:
+        if resolved[-1].command != command_table.stop:
+            resolved.append(Step(offset, command_table.stop, "stop"))
+    return resolved
+
+
+def load_profile(path: Path, command_table: CommandTable) -> list[Step]:
+    """Load a profile file and resolve it. See :func:`resolve_profile`."""
+    return resolve_profile(json.loads(Path(path).read_bytes()), command_table)
+
+
+def save_records(records: list[DispatchRecord], path: Path) -> None:
+    """Save dispatch records as CSV."""
+    with Path(path).open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("step", "command", "intended_s", "actual_s", "jitter_ms", "written"))
+        for record in records:
+            writer.writerow(
+                (
+                    record.step.label,
+                    record.step.command,
+                    record.intended,
+                    record.actual,
+                    record.jitter * 1e3,
+                    record.written,
+                )
+            )
+
+
+class SequenceRunner:
+    """Dispatcher of resolved steps on a monotonic-clock schedule.
+
+    Every step is scheduled relative to the start of the run rather than to the previous step, so dispatch delays
+    never accumulate over long runs.
+    """
+
+    def __init__(self, steps: list[Step], send: Callable[[str], None], stop_command: str) -> None:
+        """Initialize runner.
+
+        Args:
+            steps: Resolved steps.
+            send: Callable sending a command to the device.
+            stop_command: Command sent when the run is aborted.
+        """
+        self._steps = steps
+        self._send = send
+        self._stop_command = stop_command
+        self._abort_event = threading.Event()
+        # Held while a step is sent, so no step follows the stop command.
+        self._send_lock = threading.Lock()
+        # Guards the records, which are updated by the thread writing to the device.
+        self._written = threading.Condition()
+        self._start = 0.0
+        self.records: list[DispatchRecord] = []
+
+    def abort(self) -> None:
+        """Abort the run and send the stop command from the calling thread.
+
+        No step is sent once it returns, so the device can be closed right after.
+        """
+        with self._send_lock:
+            if self._abort_event.is_set():
+                return
+            self._abort_event.set()
+            _logger.info("Sequence aborted.")
+            self._send(self._stop_command)
+
+    def mark_written(self, command: str) -> None:
+        """Record that a command was written to the device.
+
+        Connect it to the ``sent`` signal of the worker with a direct connection, so the time is taken on the thread
+        which wrote the command. It updates the oldest step of the command still waiting for its write, and ignores
+        other commands.
+        """
+        now = time.monotonic()
+        with self._written:
+            for i, record in enumerate(self.records):
+                if not record.written and record.step.command == command:
+                    self.records[i] = record._replace(actual=now - self._start, written=True)
+                    self._written.notify_all()
+                    return
+
+    def wait_written(self, timeout: float | None = None) -> bool:
+        """Wait until :meth:`mark_written` confirmed the write of every dispatched step.
+
+        Returns:
+            Whether every write was confirmed within ``timeout`` seconds.
+        """
+        with self._written:
+            return self._written.wait_for(lambda: all(record.written for record in self.records), timeout)
+
+    def run(self) -> list[DispatchRecord]:
+        """Run the sequence on the calling thread.
+
+        Returns:
+            Intended and actual dispatch times of the steps which were dispatched.
+        """
+        self.records = []
+        self._start = start = time.monotonic()
+        try:
+            for step in self._steps:
+                while not self._abort_event.is_set():
+                    remaining = start + step.offset - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._abort_event.wait(remaining)
+                with self._send_lock:
+                    if self._abort_event.is_set():
+                        return self.records
+                    record = DispatchRecord(step, step.offset, time.monotonic() - start)
+                    # Recorded before sending, as the command may be written before send returns.
+                    with self._written:
+                        self.records.append(record)
+                    self._send(step.command)
+                _logger.info(
+                    "Dispatched %s: intended %.3f s, queued %.3f s, jitter %.3f ms",
+                    step.label,
+                    record.intended,
+                    record.actual,
+                    record.jitter * 1e3,
+                )
+        except BaseException:
+            self._send(self._stop_command)
+            raise
+        return self.records
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+from pathlib import Path
+
+from qtpy.QtCore import QByteArray, QDataStream, QIODevice, QStandardPaths
+from qtpy.QtGui import QPalette
+
+
+def detect_theme() -> str:
+    """Return the theme of the system, ``dark`` or ``light``."""
+    import darkdetect
+
+    try:
+        theme = darkdetect.theme()
+    except FileNotFoundError:
+        theme = None
+    return "dark" if theme is None else theme.lower()
+
+
+def _qdarktheme_key() -> str:
+    # Invalidate the disk cache when qdarktheme is updated, without importing it.
+    spec = importlib.util.find_spec("qdarktheme")
+    if spec is None or spec.origin is None:
+        return "unknown"
+    return str(Path(spec.origin).stat().st_mtime_ns)
+
+
+class ThemeCache:
+    """Cache of the palettes and stylesheets generated by qdarktheme.
+
+    Results are kept in memory and on disk, so a warm start does not need to import qdarktheme at all.
+    """
+
+    def __init__(self, cache_dir: Path | None = None) -> None:
+        """Initialize cache.
+
+        Args:
+            cache_dir: Directory of the disk cache. The cache location of the application is used if None.
+        """
+        if cache_dir is None:
+            cache_dir = Path(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)) / "theme"
+        self._cache_dir = cache_dir
+        self._memory: dict[str, tuple[QPalette, str]] = {}
+        self._key: str | None = None
+        self.last_source = ""
+
+    def load(self, theme: str) -> tuple[QPalette, str]:
+        """Return the palette and stylesheet of the theme.
+
+        :attr:`last_source` tells where the result came from: ``memory``, ``disk`` or ``generated``.
+        """
+        if theme in self._memory:
+            self.last_source = "memory"
+            return self._memory[theme]
+        if self._key is None:
+            self._key = _qdarktheme_key()
+        palette_path = self._cache_dir / f"{theme}-{self._key}.palette"
+        stylesheet_path = self._cache_dir / f"{theme}-{self._key}.qss"
+        try:
+            palette = _load_palette(palette_path.read_bytes())
+            stylesheet = stylesheet_path.read_text(encoding="utf-8")
+            self.last_source = "disk"
+        except OSError:
+            import qdarktheme
+
+            palette = qdarktheme.load_palette(theme)
+            stylesheet = qdarktheme.load_stylesheet(theme)
+            self.last_source = "generated"
+            try:
+                self._cache_dir.mkdir(parents=True, exist_ok=True)
+                _write_atomic(palette_path, _dump_palette(palette))
+                _write_atomic(stylesheet_path, stylesheet.encode("utf-8"))
+            except OSError:
+                pass
+        self._memory[theme] = (palette, stylesheet)
+        return palette, stylesheet
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_bytes(data)
+    os.replace(temp_path, path)
+
+
+def _dump_palette(palette: QPalette) -> bytes:
+    data = QByteArray()
+    stream = QDataStream(data, QIODevice.OpenModeFlag.WriteOnly)
+    stream << palette  # type: ignore
+    return bytes(data.data())
+
+
+def _load_palette(data: bytes) -> QPalette:
+    palette = QPalette()
+    # The stream does not own the byte array, so it must stay referenced while reading.
+    buffer = QByteArray(data)
+    stream = QDataStream(buffer, QIODevice.OpenModeFlag.ReadOnly)
+    stream >> palette  # type: ignore
+    if stream.status() != QDataStream.Status.Ok:
+        raise OSError("Broken palette cache.")
+    return palette
@@ -1,9 +1,12 @@
+from __future__ import annotations
+
+import bisect
 import platform
 
+from diy_hv._ports import PortRegistry
 from qtpy.QtCore import QEvent, QModelIndex, QObject, Qt
 from qtpy.QtGui import QKeyEvent
 from qtpy.QtWidgets import QComboBox, QStyledItemDelegate, QWidget
-from serial.tools import list_ports
 from serial.tools.list_ports_common import ListPortInfo
 
 
@@ -39,10 +42,6 @@ class FlexiblePopupCombobox(QComboBox):
         super().showPopup()
 
 
-def _search_ports(filter: str) -> list[ListPortInfo]:
-    return [port for port in list_ports.comports() if filter in str(port.description)]
-
-
 class PortCombobox(FlexiblePopupCombobox):
     """Port combobox."""
 
@@ -60,45 +59,81 @@ class PortCombobox(FlexiblePopupCombobox):
                 return False
             return super().eventFilter(watched, event)
 
-    def __init__(self, filter: str = None, parent: QWidget = None):
-        """Initialize class."""
+    def __init__(self, filter: str = None, parent: QWidget = None, registry: PortRegistry | None = None):
+        """Initialize class.
+
+        Args:
+            filter: Text which the description of a port must contain to be listed.
+            parent: Parent widget.
+            registry: Registry of the ports. The shared registry is used if None.
+        """
         super().__init__(parent=parent)
-        self._port_infos = []
-        self.filter = "" if filter is None else filter
-        self._port_selected = None
+        self._port_infos: list[ListPortInfo] = []
+        self._filter = "" if filter is None else filter
+        self._port_selected: ListPortInfo | None = None
+        self._registry = PortRegistry.shared() if registry is None else registry
 
         self.setPlaceholderText("Select Port")
         self.view().pressed.connect(self._handle_item_pressed)
         self.view().installEventFilter(self._KeyEventGuard(self))
+        # Items are updated incrementally from the registry, so the popup opens from the cache without enumerating.
+        self._registry.ports_added.connect(self._add_ports)
+        self._registry.ports_removed.connect(self._remove_ports)
+        self._add_ports(self._registry.ports(timeout=0))
+
+    @property
+    def filter(self) -> str:
+        """Text which the description of a port must contain to be listed."""
+        return self._filter
+
+    @filter.setter
+    def filter(self, filter: str) -> None:
+        self._filter = filter
+        self._remove_ports(list(self._port_infos))
+        self._add_ports(self._registry.ports(timeout=0))
 
     def get_select_port_info(self) -> ListPortInfo | None:
         """Get select port info."""
         return self._port_selected
 
-    def showPopup(self) -> None:  # noqa: N802
-        """Override method."""
-        self._port_infos.clear()
-        current_text = self.currentText()
-        self.clear()
-        self._port_infos = _search_ports(self.filter)
-        for port in self._port_infos:
+    def select_port(self, device: str) -> bool:
+        """Select the port of the device name if it is listed.
+
+        Returns:
+            True if the port was selected.
+        """
+        for row, port in enumerate(self._port_infos):
+            if port.device == device:
+                self._port_selected = port
+                self.setCurrentIndex(row)
+                return True
+        return False
+
+    def _add_ports(self, ports: list[ListPortInfo]) -> None:
+        devices = [port.device for port in self._port_infos]
+        for port in ports:
+            if self._filter not in str(port.description) or port.device in devices:
+                continue
             description = port.device
             if port.manufacturer is not None:
                 description += f"  |  {port.manufacturer}"
-            self.addItem(description)
-            if current_text != "" and current_text in description:
-                self.setCurrentText(description)
-
-        if len(self._port_infos) == 0:
+            row = bisect.bisect(devices, port.device)
+            devices.insert(row, port.device)
+            self._port_infos.insert(row, port)
+            self.insertItem(row, description)
+        if self._port_selected is None:
+            # Inserting into an empty combobox selects the first item, but nothing is selected until it is pressed.
+            self.setCurrentIndex(-1)
+
+    def _remove_ports(self, ports: list[ListPortInfo]) -> None:
+        removed = {port.device for port in ports}
+        for row in reversed(range(len(self._port_infos))):
+            if self._port_infos[row].device in removed:
+                del self._port_infos[row]
+                self.removeItem(row)
+        if self._port_selected is not None and self._port_selected.device in removed:
             self._port_selected = None
-
-        port_selected = self._port_selected
-        if port_selected is not None:
-            if port_selected.manufacturer is None:
-                self.setCurrentText(f"{port_selected.device}")
-            else:
-                self.setCurrentText(f"{port_selected.device}  |  {port_selected.manufacturer}")
-        super().showPopup()
+            self.setCurrentIndex(-1)
 
     def _handle_item_pressed(self, index: QModelIndex) -> None:
         self._port_selected = self._port_infos[index.row()]
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import NamedTuple
+
+from diy_hv._device import HighVoltageController
+from qtpy.QtCore import QObject, Signal  # type: ignore
+
+
+class _Request(NamedTuple):
+    kind: str
+    args: tuple = ()
+    coalesce: bool = False
+    supersede: bool = False
+
+
+class _RequestQueue:
+    def __init__(self) -> None:
+        self._requests: deque[_Request] = deque()
+        self._condition = threading.Condition()
+
+    def put(self, request: _Request) -> None:
+        with self._condition:
+            if request.coalesce or request.supersede:
+                # A newer set-point or a stop supersedes every pending set-point.
+                self._requests = deque(r for r in self._requests if not r.coalesce)
+            self._requests.append(request)
+            self._condition.notify()
+
+    def get(self) -> _Request:
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._requests) > 0)
+            return self._requests.popleft()
+
+
+class DeviceWorker(QObject):
+    """Worker running the serial I/O of a controller on a dedicated thread.
+
+    The worker owns the controller. Requests are queued and executed in order, and results are reported through
+    signals which are delivered on the thread of the receiver.
+    """
+
+    opened = Signal()
+    open_failed = Signal(str)
+    closed = Signal()
+    sent = Signal(str)
+    error = Signal(str)
+
+    def __init__(self, device: HighVoltageController, parent: QObject = None) -> None:
+        """Initialize worker and start its thread."""
+        super().__init__(parent)
+        self._device = device
+        self._port = ""
+        self._queue = _RequestQueue()
+        self._thread = threading.Thread(target=self._run, name="DIYHVWorker", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> str:
+        """Port of the open device, or an empty string if it is closed."""
+        return self._port
+
+    def open(self, port: str, baudrate: int) -> None:
+        """Request to open the device. Emits ``opened`` or ``open_failed``."""
+        self._queue.put(_Request("open", (port, baudrate)))
+
+    def close(self) -> None:
+        """Request to close the device. Emits ``closed``."""
+        self._queue.put(_Request("close"))
+
+    def send(self, message: str, coalesce: bool = True) -> None:
+        """Request to send a message. Emits ``sent`` or ``error``.
+
+        Args:
+            message: Message to send.
+            coalesce: If True, pending messages queued with ``coalesce`` are dropped, so only the latest is sent.
+        """
+        self._queue.put(_Request("send", (message,), coalesce))
+
+    def stop(self, message: str) -> None:
+        """Request to send a stop command. Emits ``sent`` or ``error``.
+
+        Pending messages queued with ``coalesce`` are dropped, so no set-point chosen before the stop runs after it,
+        and the stop itself is never dropped by a later set-point.
+        """
+        self._queue.put(_Request("send", (message,), supersede=True))
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        """Close the device and stop the thread."""
+        self._queue.put(_Request("close"))
+        self._queue.put(_Request("quit"))
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request.kind == "quit":
+                return
+            try:
+                getattr(self, f"_handle_{request.kind}")(*request.args)
+            except Exception as e:
+                # The thread serves every later request, so no error may end it.
+                if request.kind == "open":
+                    self.open_failed.emit(str(e))
+                else:
+                    self.error.emit(str(e))
+
+    def _handle_open(self, port: str, baudrate: int) -> None:
+        self._port = ""
+        self._device.close()
+        self._device.port = port
+        self._device.baudrate = baudrate
+        self._device.open()
+        self._port = port
+        self.opened.emit()
+
+    def _handle_close(self) -> None:
+        self._port = ""
+        self._device.close()
+        self.closed.emit()
+
+    def _handle_send(self, message: str) -> None:
+        self._device.send(message)
+        self.sent.emit(message)
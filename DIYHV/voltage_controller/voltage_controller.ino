@@ -11,6 +11,63 @@ const int CYCLE5 = 6000;
 const int CYCLE6 = 12000;
 // change this: this is test for 2 minutes end
 
+/////protocol/////
+// Framed commands: $<seq>,<kind>[,<arg>...]*<crc>\r\n
+// crc is the CRC-16/CCITT-FALSE of the characters between '$' and '*', in 4 upper-case hex digits.
+//   $<seq>,S,<voltage V>                      static actuation
+//   $<seq>,D,<voltage V>,<frequency mHz>,<cycles> dynamic actuation
+//   $<seq>,X                                  stop, applied at once and clearing the queue
+//   $<seq>,H                                  start of a session, forgetting the sequence numbers of the last host
+// Replies use the same framing:
+//   $<seq>,A          command accepted
+//   $<seq>,N,<code>   command rejected (1: CRC, 2: malformed, 3: out of range, 4: queue full)
+//   $<seq>,E          actuation started
+//   $<seq>,F          dynamic actuation finished
+// Single letter lines of the legacy protocol are still executed, without replies. The legacy stop 'v' is applied at
+// once and clears the queue like X.
+const unsigned long BANNER_INTERVAL = 1000;
+const int QUEUE_SIZE = 8;
+const int LINE_SIZE = 48;
+const long MAX_VOLTAGE = 3000;
+// Calibration of the PWM value for each voltage, linearly interpolated.
+const long CALIBRATION_VOLTAGE[] = {0, 1000, 2000, 3000};
+const int CALIBRATION_PWM[] = {0, 44, 100, 255};
+const int CALIBRATION_SIZE = 4;
+
+const int NAK_CRC = 1;
+const int NAK_MALFORMED = 2;
+const int NAK_RANGE = 3;
+const int NAK_QUEUE_FULL = 4;
+
+struct Command
+{
+    bool framed;
+    unsigned int seq;
+    int pwm;
+    unsigned long cycles; // 0 for static actuation
+    unsigned long half_period;
+};
+
+Command queue[QUEUE_SIZE];
+int queue_head = 0;
+int queue_count = 0;
+
+Command current;
+bool is_running = false;
+bool is_high = false;
+unsigned long cycles_done = 0;
+unsigned long phase_started = 0;
+
+// Sequence numbers of the latest accepted commands, to acknowledge retransmissions without executing them twice.
+// They are forgotten when a host starts a session.
+unsigned int recent_seqs[QUEUE_SIZE];
+int recent_seq_index = 0;
+
+char line[LINE_SIZE + 1];
+int line_length = 0;
+bool is_line_overflow = false;
+unsigned long last_banner = 0;
+
 void setup()
 {
     Serial.begin(9600);
@@ -19,105 +76,386 @@ void setup()
     pinMode(R, OUTPUT);
     pinMode(D, OUTPUT);
     delay(3000);
+    print_banner();
 }
 void loop()
+{
+    while (Serial.available() > 0)
+    {
+        read_char(Serial.read());
+    }
+    update_actuation();
+    if (!is_running && queue_count == 0 && millis() - last_banner >= BANNER_INTERVAL)
+    {
+        print_banner();
+    }
+}
+void print_banner()
 {
     Serial.println("please input your command");
-    delay(1000);
-    switch (Serial.read())
+    last_banner = millis();
+}
+/////static actuation/////
+void run_static(int analog_value)
+{
+    analogWrite(PWM_PIN, analog_value);
+    // fixed point
+    digitalWrite(L, LOW);  // do not change
+    digitalWrite(R, HIGH); // do not change
+    // fixed point
+    digitalWrite(D, HIGH); // DEAN Switch for HF
+}
+/////dynamic actuation/////
+// Each cycle is a high and a low phase of half_period ms, timed with millis() so commands are read meanwhile.
+void start_high_phase()
+{
+    digitalWrite(D, HIGH);             // DEAN Switch for HF
+    analogWrite(PWM_PIN, current.pwm); // electric source for LF
+    // fixed point
+    digitalWrite(L, LOW);  // do not change
+    digitalWrite(R, HIGH); // do not change
+    // fixed point
+    is_high = true;
+    phase_started = millis();
+}
+void start_low_phase()
+{
+    digitalWrite(D, HIGH);      // DEAN Switch for HF
+    digitalWrite(PWM_PIN, LOW); // electric source for LF
+    is_high = false;
+    phase_started = millis();
+}
+void update_actuation()
+{
+    if (is_running)
+    {
+        if (millis() - phase_started < current.half_period)
+        {
+            return;
+        }
+        if (is_high)
+        {
+            start_low_phase();
+            return;
+        }
+        cycles_done++;
+        if (cycles_done < current.cycles)
+        {
+            start_high_phase();
+            return;
+        }
+        is_running = false;
+        if (current.framed)
+        {
+            send_reply(current.seq, 'F', -1);
+        }
+    }
+    if (queue_count == 0)
+    {
+        return;
+    }
+    current = queue[queue_head];
+    queue_head = (queue_head + 1) % QUEUE_SIZE;
+    queue_count--;
+    if (current.cycles == 0)
+    {
+        run_static(current.pwm);
+    }
+    else
+    {
+        cycles_done = 0;
+        is_running = true;
+        start_high_phase();
+    }
+    if (current.framed)
+    {
+        send_reply(current.seq, 'E', -1);
+    }
+}
+void stop_actuation()
+{
+    queue_count = 0;
+    is_running = false;
+    run_static(0);
+}
+bool enqueue(const Command &command)
+{
+    if (queue_count == QUEUE_SIZE)
+    {
+        return false;
+    }
+    queue[(queue_head + queue_count) % QUEUE_SIZE] = command;
+    queue_count++;
+    return true;
+}
+/////serial/////
+void read_char(int c)
+{
+    if (c == '\n' || c == '\r')
+    {
+        if (line_length > 0 && !is_line_overflow)
+        {
+            line[line_length] = '\0';
+            handle_line();
+        }
+        line_length = 0;
+        is_line_overflow = false;
+        return;
+    }
+    if (line_length == LINE_SIZE)
+    {
+        is_line_overflow = true;
+        return;
+    }
+    line[line_length++] = (char)c;
+}
+void handle_line()
+{
+    if (line[0] == '$')
+    {
+        handle_frame();
+    }
+    else if (line_length == 1)
+    {
+        handle_legacy(line[0]);
+    }
+}
+void handle_legacy(char letter)
+{
+    Command command = {false, 0, 0, 0, 0};
+    switch (letter)
     {
     case 'a':
-        run_static(44);
+        command.pwm = 44;
         break;
     case 'b':
-        run_static(100);
+        command.pwm = 100;
         break;
     case 'c':
-        run_static(255);
+        command.pwm = 255;
         break;
     case 'v':
-        run_static(0);
-        break;
+        stop_actuation();
+        return;
     case 'd':
-        run_dynamic(44, CYCLE1, 2000);
+        set_legacy_dynamic(command, 44, CYCLE1, 2000);
         break;
     case 'e':
-        run_dynamic(44, CYCLE2, 500);
+        set_legacy_dynamic(command, 44, CYCLE2, 500);
         break;
     case 'f':
-        run_dynamic(44, CYCLE3, 100);
+        set_legacy_dynamic(command, 44, CYCLE3, 100);
         break;
     case 'g':
-        run_dynamic(100, CYCLE1, 2000);
+        set_legacy_dynamic(command, 100, CYCLE1, 2000);
         break;
     case 'h':
-        run_dynamic(100, CYCLE2, 500);
+        set_legacy_dynamic(command, 100, CYCLE2, 500);
         break;
     case 'i':
-        run_dynamic(100, CYCLE3, 100);
+        set_legacy_dynamic(command, 100, CYCLE3, 100);
         break;
     case 'j':
-        run_dynamic(HIGH, CYCLE1, 2000);
+        set_legacy_dynamic(command, HIGH, CYCLE1, 2000);
         break;
     case 'k':
-        run_dynamic(HIGH, CYCLE2, 500);
+        set_legacy_dynamic(command, HIGH, CYCLE2, 500);
         break;
     case 'l':
-        run_dynamic(HIGH, CYCLE3, 100);
+        set_legacy_dynamic(command, HIGH, CYCLE3, 100);
         break;
     case 'm':
-        run_dynamic(44, CYCLE4, 20);
+        set_legacy_dynamic(command, 44, CYCLE4, 20);
         break;
     case 'n':
-        run_dynamic(44, CYCLE5, 10);
+        set_legacy_dynamic(command, 44, CYCLE5, 10);
         break;
     case 'o':
-        run_dynamic(44, CYCLE6, 5);
+        set_legacy_dynamic(command, 44, CYCLE6, 5);
         break;
     case 'p':
-        run_dynamic(100, CYCLE4, 20);
+        set_legacy_dynamic(command, 100, CYCLE4, 20);
         break;
     case 'q':
-        run_dynamic(100, CYCLE5, 10);
+        set_legacy_dynamic(command, 100, CYCLE5, 10);
         break;
     case 'r':
-        run_dynamic(100, CYCLE6, 5);
+        set_legacy_dynamic(command, 100, CYCLE6, 5);
         break;
     case 's':
-        run_dynamic(HIGH, CYCLE4, 20);
+        set_legacy_dynamic(command, HIGH, CYCLE4, 20);
         break;
     case 't':
-        run_dynamic(HIGH, CYCLE5, 10);
+        set_legacy_dynamic(command, HIGH, CYCLE5, 10);
         break;
     case 'u':
-        run_dynamic(HIGH, CYCLE6, 5);
+        set_legacy_dynamic(command, HIGH, CYCLE6, 5);
         break;
+    default:
+        return;
     }
+    enqueue(command);
 }
-/////static actuation/////
-void run_static(int analog_value)
+void set_legacy_dynamic(Command &command, int analog_value, int cycle_num, int delay_time)
 {
-    analogWrite(PWM_PIN, analog_value);
-    // fixed point
-    digitalWrite(L, LOW);  // do not change
-    digitalWrite(R, HIGH); // do not change
-    // fixed point
-    digitalWrite(D, HIGH); // DEAN Switch for HF
+    command.pwm = analog_value;
+    command.cycles = (unsigned long)cycle_num + 1; // the legacy loop ran from 0 to cycle_num inclusive
+    command.half_period = delay_time;
 }
-/////dynamic actuation/////
-void run_dynamic(int analog_value, int cycle_num, int delay_time)
+void handle_frame()
+{
+    char *end = strchr(line, '*');
+    if (end == NULL || line + line_length - end != 5)
+    {
+        send_reply(0, 'N', NAK_MALFORMED);
+        return;
+    }
+    char *crc_end;
+    unsigned long crc = strtoul(end + 1, &crc_end, 16);
+    *end = '\0';
+    char *field = line + 1;
+    unsigned long seq = strtoul(field, &field, 10);
+    if (crc_end != line + line_length || crc != crc16(line + 1, end - line - 1))
+    {
+        send_reply(seq, 'N', NAK_CRC);
+        return;
+    }
+    if (*field != ',' || seq == 0 || seq > 65535 || field[1] == '\0' || (field[2] != ',' && field[2] != '\0'))
+    {
+        send_reply(seq, 'N', NAK_MALFORMED);
+        return;
+    }
+    char kind = field[1];
+    long args[3];
+    int arg_count = 0;
+    field += 2;
+    while (*field == ',' && arg_count < 3)
+    {
+        args[arg_count++] = strtol(field + 1, &field, 10);
+    }
+    if (*field != '\0')
+    {
+        send_reply(seq, 'N', NAK_MALFORMED);
+        return;
+    }
+    if (kind == 'H' && arg_count == 0)
+    {
+        // A new host numbers its commands from scratch, and they must not be taken for retransmissions.
+        forget_seqs();
+        send_reply(seq, 'A', -1);
+        return;
+    }
+    if (is_recent_seq(seq))
+    {
+        // Retransmission of a command which was already accepted.
+        send_reply(seq, 'A', -1);
+        return;
+    }
+    Command command = {true, (unsigned int)seq, 0, 0, 0};
+    if (kind == 'X' && arg_count == 0)
+    {
+        stop_actuation();
+        remember_seq(seq);
+        send_reply(seq, 'A', -1);
+        send_reply(seq, 'E', -1);
+        return;
+    }
+    if (kind == 'S' && arg_count == 1)
+    {
+        if (args[0] < 0 || args[0] > MAX_VOLTAGE)
+        {
+            send_reply(seq, 'N', NAK_RANGE);
+            return;
+        }
+        command.pwm = voltage_to_pwm(args[0]);
+    }
+    else if (kind == 'D' && arg_count == 3)
+    {
+        if (args[0] < 0 || args[0] > MAX_VOLTAGE || args[1] <= 0 || args[1] > 500000L || args[2] <= 0)
+        {
+            send_reply(seq, 'N', NAK_RANGE);
+            return;
+        }
+        command.pwm = voltage_to_pwm(args[0]);
+        command.half_period = 500000L / args[1];
+        command.cycles = args[2];
+    }
+    else
+    {
+        send_reply(seq, 'N', NAK_MALFORMED);
+        return;
+    }
+    if (!enqueue(command))
+    {
+        send_reply(seq, 'N', NAK_QUEUE_FULL);
+        return;
+    }
+    remember_seq(seq);
+    send_reply(seq, 'A', -1);
+}
+void remember_seq(unsigned long seq)
+{
+    recent_seqs[recent_seq_index] = (unsigned int)seq;
+    recent_seq_index = (recent_seq_index + 1) % QUEUE_SIZE;
+}
+void forget_seqs()
+{
+    for (int i = 0; i < QUEUE_SIZE; i++)
+    {
+        recent_seqs[i] = 0;
+    }
+    recent_seq_index = 0;
+}
+bool is_recent_seq(unsigned long seq)
+{
+    for (int i = 0; i < QUEUE_SIZE; i++)
+    {
+        // Sequence numbers start at 1, so the zeroed entries never match.
+        if (recent_seqs[i] == seq)
+        {
+            return true;
+        }
+    }
+    return false;
+}
+int voltage_to_pwm(long voltage)
+{
+    for (int i = 1; i < CALIBRATION_SIZE; i++)
+    {
+        if (voltage <= CALIBRATION_VOLTAGE[i])
+        {
+            long dv = CALIBRATION_VOLTAGE[i] - CALIBRATION_VOLTAGE[i - 1];
+            long dp = CALIBRATION_PWM[i] - CALIBRATION_PWM[i - 1];
+            return CALIBRATION_PWM[i - 1] + (voltage - CALIBRATION_VOLTAGE[i - 1]) * dp / dv;
+        }
+    }
+    return CALIBRATION_PWM[CALIBRATION_SIZE - 1];
+}
+void send_reply(unsigned long seq, char kind, int code)
+{
+    char body[24];
+    if (code < 0)
+    {
+        snprintf(body, sizeof(body), "%lu,%c", seq, kind);
+    }
+    else
+    {
+        snprintf(body, sizeof(body), "%lu,%c,%d", seq, kind, code);
+    }
+    char frame[32];
+    snprintf(frame, sizeof(frame), "$%s*%04X", body, crc16(body, strlen(body)));
+    Serial.println(frame);
+}
+uint16_t crc16(const char *data, size_t length)
 {
-    for (int i = 0; i <= cycle_num; i++)
+    uint16_t crc = 0xFFFF;
+    for (size_t i = 0; i < length; i++)
     {
-        digitalWrite(D, HIGH);              // DEAN Switch for HF
-        analogWrite(PWM_PIN, analog_value); // electric source for LF
-        // fixed point
-        digitalWrite(L, LOW);  // do not change
-        digitalWrite(R, HIGH); // do not change
-        // fixed point
-        delay(delay_time);
-        digitalWrite(D, HIGH);      // DEAN Switch for HF
-        digitalWrite(PWM_PIN, LOW); // electric source for LF
-        delay(delay_time);
+        crc ^= (uint16_t)(uint8_t)data[i] << 8;
+        for (int bit = 0; bit < 8; bit++)
+        {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+        }
     }
+    return crc;
 }
@@ -0,0 +1,270 @@
+"""Module for sample buffers."""
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+
+
+class MinMaxEnvelope:
+    """Min/max envelope of a sample stream with bounded memory.
+
+    Samples are grouped into buckets which keep only their minimum and maximum. When all buckets are used, adjacent
+    buckets are merged and the bucket size doubles, so the envelope always covers the whole stream with at most
+    ``buckets`` buckets.
+    """
+
+    def __init__(self, buckets: int = 4096) -> None:
+        """Initialize class.
+
+        Args:
+            buckets: Maximum number of buckets. It must be a positive even number.
+        """
+        if buckets <= 0 or buckets % 2 != 0:
+            raise ValueError("buckets must be a positive even number.")
+        # Columns are (timestamp of min, min, timestamp of max, max).
+        self._buckets = np.empty((buckets, 4), dtype=np.float64)
+        self._count = 0
+        self._bucket_size = 1
+        self._partial = np.empty(4, dtype=np.float64)
+        self._partial_size = 0
+
+    @property
+    def bucket_size(self) -> int:
+        """Number of samples summarized by a bucket."""
+        return self._bucket_size
+
+    def clear(self) -> None:
+        """Remove all samples."""
+        self._count = 0
+        self._bucket_size = 1
+        self._partial_size = 0
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """Add samples to the envelope."""
+        while len(values) > 0:
+            if self._partial_size > 0:
+                n = min(self._bucket_size - self._partial_size, len(values))
+                self._merge_partial(timestamps[:n], values[:n])
+                timestamps, values = timestamps[n:], values[n:]
+                if self._partial_size == self._bucket_size:
+                    self._push(self._partial[np.newaxis])
+                    self._partial_size = 0
+                continue
+            n_full = min(len(values) // self._bucket_size, len(self._buckets) - self._count)
+            if n_full > 0:
+                n = n_full * self._bucket_size
+                self._push(_summarize(timestamps[:n], values[:n], self._bucket_size))
+                timestamps, values = timestamps[n:], values[n:]
+            elif len(values) < self._bucket_size:
+                self._merge_partial(timestamps, values)
+                break
+
+    def decimate(self, width: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the envelope with at most ``2 * width`` points.
+
+        Args:
+            width: Number of buckets of the result, typically the width of the plot in pixels.
+
+        Returns:
+            Timestamps and values of the minimum and maximum of every bucket in time order.
+        """
+        buckets = self._buckets[: self._count]
+        if self._partial_size > 0:
+            buckets = np.concatenate((buckets, self._partial[np.newaxis]))
+        group = -(-len(buckets) // max(width, 1))
+        if group > 1:
+            buckets = _merge(buckets, group)
+        return _points(buckets)
+
+    def _push(self, buckets: np.ndarray) -> None:
+        self._buckets[self._count : self._count + len(buckets)] = buckets
+        self._count += len(buckets)
+        if self._count == len(self._buckets):
+            half = self._count // 2
+            self._buckets[:half] = _merge(self._buckets, 2)
+            self._count = half
+            self._bucket_size *= 2
+
+    def _merge_partial(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        bucket = _summarize(timestamps, values, len(values))[0]
+        if self._partial_size > 0:
+            bucket = _merge(np.stack((self._partial, bucket)), 2)[0]
+        self._partial[:] = bucket
+        self._partial_size += len(values)
+
+
+def envelope(timestamps: np.ndarray, values: np.ndarray, width: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the min/max envelope of samples in at most ``width`` buckets.
+
+    Args:
+        timestamps: Timestamps of the samples in time order.
+        values: Values of the samples.
+        width: Number of buckets of the result.
+
+    Returns:
+        Timestamps and values of the minimum and maximum of every bucket in time order.
+    """
+    if len(values) == 0:
+        return np.empty(0), np.empty(0)
+    size = -(-len(values) // max(width, 1))
+    padding = -len(values) % size
+    if padding:
+        timestamps = np.concatenate((timestamps, np.repeat(timestamps[-1:], padding)))
+        values = np.concatenate((values, np.repeat(values[-1:], padding)))
+    return _points(_summarize(timestamps, values, size))
+
+
+def _points(buckets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    swap = buckets[:, 0] > buckets[:, 2]
+    first = np.where(swap[:, np.newaxis], buckets[:, 2:], buckets[:, :2])
+    second = np.where(swap[:, np.newaxis], buckets[:, :2], buckets[:, 2:])
+    points = np.stack((first, second), axis=1).reshape(-1, 2)
+    return points[:, 0], points[:, 1]
+
+
+def _summarize(timestamps: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    values = values.reshape(-1, size)
+    timestamps = timestamps.reshape(-1, size)
+    rows = np.arange(len(values))
+    i_min = values.argmin(axis=1)
+    i_max = values.argmax(axis=1)
+    return np.column_stack(
+        (timestamps[rows, i_min], values[rows, i_min], timestamps[rows, i_max], values[rows, i_max])
+    )
+
+
+def _merge(buckets: np.ndarray, group: int) -> np.ndarray:
+    padding = -len(buckets) % group
+    if padding:
+        buckets = np.concatenate((buckets, np.repeat(buckets[-1:], padding, axis=0)))
+    groups = buckets.reshape(-1, group, 4)
+    rows = np.arange(len(groups))
+    i_min = groups[:, :, 1].argmin(axis=1)
+    i_max = groups[:, :, 3].argmax(axis=1)
+    return np.column_stack((groups[rows, i_min, :2], groups[rows, i_max, 2:]))
+
+
+class RingBuffer:
+    """Fixed-capacity ring buffer of timestamped samples backed by NumPy arrays.
+
+    Timestamps come from :func:`time.monotonic`. Besides the raw samples of the most recent window, the buffer keeps
+    a :class:`MinMaxEnvelope` of the whole stream for plotting.
+    """
+
+    def __init__(self, capacity: int, envelope_buckets: int = 4096) -> None:
+        """Initialize class.
+
+        Args:
+            capacity: Number of raw samples held by the buffer.
+            envelope_buckets: Number of buckets of the envelope.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer.")
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._envelope = MinMaxEnvelope(envelope_buckets)
+        self._condition = threading.Condition()
+        self._total = 0
+        self._cursor = 0
+        self._start = 0
+        self.dropped = 0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of samples held by the buffer."""
+        return len(self._values)
+
+    def __len__(self) -> int:
+        """Return the number of samples currently held."""
+        return self._total - self._start
+
+    def append(self, timestamp: float, value: float) -> None:
+        """Append a sample and wake up waiting readers."""
+        self.extend(timestamp, np.array((value,), dtype=np.float64))
+
+    def extend(self, timestamps: float | np.ndarray, values: np.ndarray) -> None:
+        """Append samples and wake up waiting readers.
+
+        Args:
+            timestamps: Timestamp of every sample, or one timestamp shared by all of them.
+            values: Values of the samples.
+        """
+        if len(values) == 0:
+            return
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), values.shape)
+        with self._condition:
+            self._envelope.extend(timestamps, values)
+            capacity = self.capacity
+            if len(values) > capacity:
+                self._total += len(values) - capacity
+                timestamps, values = timestamps[-capacity:], values[-capacity:]
+            head = self._total % capacity
+            n = min(len(values), capacity - head)
+            self._timestamps[head : head + n] = timestamps[:n]
+            self._values[head : head + n] = values[:n]
+            self._timestamps[: len(values) - n] = timestamps[n:]
+            self._values[: len(values) - n] = values[n:]
+            self._total += len(values)
+            self._start = max(self._start, self._total - capacity)
+            self._condition.notify_all()
+
+    def latest(self, timeout: float | None = None) -> tuple[float, float] | None:
+        """Return the newest sample.
+
+        Args:
+            timeout: Seconds to wait for the first sample when the buffer is empty.
+
+        Returns:
+            The newest sample or None if no sample arrived in time.
+        """
+        with self._condition:
+            if len(self) == 0 and timeout:
+                self._condition.wait_for(lambda: len(self) > 0, timeout)
+            if len(self) == 0:
+                return None
+            i = (self._total - 1) % self.capacity
+            return float(self._timestamps[i]), float(self._values[i])
+
+    def read_available(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the samples appended since the previous call.
+
+        Samples which were overwritten before being read are counted in :attr:`dropped`.
+
+        Returns:
+            Timestamps and values of the unread samples.
+        """
+        with self._condition:
+            start = max(self._cursor, self._start)
+            self.dropped += start - self._cursor
+            self._cursor = self._total
+            return self._copy(start, self._total)
+
+    def snapshot(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return a copy of the samples held by the buffer in time order."""
+        with self._condition:
+            return self._copy(self._start, self._total)
+
+    def decimate(self, width: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the min/max envelope of every sample appended so far.
+
+        The cost depends on ``width`` and the number of envelope buckets, not on the number of samples.
+
+        Args:
+            width: Number of buckets of the result, typically the width of the plot in pixels.
+
+        Returns:
+            At most ``2 * width`` timestamps and values in time order.
+        """
+        with self._condition:
+            return self._envelope.decimate(width)
+
+    def clear(self) -> None:
+        """Remove all samples."""
+        with self._condition:
+            self._start = self._cursor = self._total
+            self._envelope.clear()
+
+    def _copy(self, start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+        indices = np.arange(start, stop) % self.capacity
+        return self._timestamps[indices], self._values[indices]
@@ -0,0 +1,215 @@
+"""Module for host-side calibration of readings."""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from pyautolab_Loadcell.recorder import _INDEX_FILE_NAME, ColumnarRecorder, Recording
+
+# Factors converting grams, the unit of the firmware, to other units.
+UNITS = {"g": 1.0, "kg": 1e-3, "mN": 9.80665, "N": 9.80665e-3}
+_STORE_VERSION = 1
+
+
+class Calibration(NamedTuple):
+    """Calibration of the raw readings of a load cell.
+
+    A raw reading ``x`` taken at time ``t`` is converted to
+    ``(polyval(coefficients, x) - tare - drift * (t - tare_time)) * UNITS[unit]``.
+    Calibrations are immutable, so a recording can be reprocessed with any of them.
+
+    Attributes:
+        coefficients: Polynomial from raw readings to grams, highest degree first.
+        tare: Offset in grams subtracted after the polynomial.
+        tare_time: Monotonic time of the tare.
+        drift: Drift of the offset in grams per second after the tare. Only applied when timestamps are given.
+        unit: Unit of the calibrated values, a key of :data:`UNITS`.
+    """
+
+    coefficients: tuple[float, ...] = (1.0, 0.0)
+    tare: float = 0.0
+    tare_time: float = 0.0
+    drift: float = 0.0
+    unit: str = "g"
+
+    @classmethod
+    def fit(cls, raw: np.ndarray, reference: np.ndarray, degree: int = 1, unit: str = "g") -> Calibration:
+        """Fit the polynomial to readings of reference loads.
+
+        Args:
+            raw: Raw readings.
+            reference: Reference loads in grams of the readings.
+            degree: Degree of the polynomial. At least ``degree + 1`` distinct loads are needed.
+            unit: Unit of the calibrated values.
+        """
+        raw = np.asarray(raw, dtype=np.float64)
+        reference = np.asarray(reference, dtype=np.float64)
+        if len(np.unique(raw)) <= degree:
+            raise ValueError(f"A polynomial of degree {degree} needs at least {degree + 1} distinct readings.")
+        coefficients = np.polyfit(raw, reference, degree)
+        return cls(tuple(float(c) for c in coefficients), unit=_check_unit(unit))
+
+    def apply(self, raw: np.ndarray, timestamps: np.ndarray | None = None) -> np.ndarray:
+        """Calibrate a batch of raw readings.
+
+        Args:
+            raw: Raw readings.
+            timestamps: Monotonic timestamps of the readings, needed to compensate the drift.
+
+        Returns:
+            Calibrated values in :attr:`unit`.
+        """
+        values = np.polyval(self.coefficients, np.asarray(raw, dtype=np.float64))
+        values -= self.tare
+        if self.drift and timestamps is not None:
+            values -= self.drift * (np.asarray(timestamps, dtype=np.float64) - self.tare_time)
+        factor = UNITS[self.unit]
+        if factor != 1.0:
+            values *= factor
+        return values
+
+    def apply_one(self, raw: float, timestamp: float | None = None) -> float:
+        """Calibrate a single raw reading."""
+        return float(self.apply(np.array((raw,)), None if timestamp is None else np.array((timestamp,)))[0])
+
+    def with_tare(self, raw: np.ndarray, timestamps: np.ndarray | None = None) -> Calibration:
+        """Return the calibration zeroed on readings of the unloaded cell.
+
+        Args:
+            raw: Raw readings without load. Their mean becomes zero.
+            timestamps: Monotonic timestamps of the readings. Their mean becomes :attr:`tare_time`.
+        """
+        raw = np.asarray(raw, dtype=np.float64)
+        if len(raw) == 0:
+            raise ValueError("No reading to tare with.")
+        tare = float(np.mean(np.polyval(self.coefficients, raw)))
+        tare_time = self.tare_time if timestamps is None else float(np.mean(timestamps))
+        return self._replace(tare=tare, tare_time=tare_time)
+
+    def with_drift(self, raw: np.ndarray, timestamps: np.ndarray) -> Calibration:
+        """Return the calibration compensating the drift of readings of the unloaded cell.
+
+        The drift is the slope of a straight line fitted to the readings.
+
+        Args:
+            raw: Raw readings without load, spread over time.
+            timestamps: Monotonic timestamps of the readings.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(np.unique(timestamps)) < 2:
+            raise ValueError("Drift needs readings at two different times at least.")
+        slope, _ = np.polyfit(timestamps, np.polyval(self.coefficients, np.asarray(raw, dtype=np.float64)), 1)
+        return self._replace(drift=float(slope))
+
+    def with_unit(self, unit: str) -> Calibration:
+        """Return the calibration converting to another unit."""
+        return self._replace(unit=_check_unit(unit))
+
+    def to_dict(self) -> dict:
+        """Return the calibration as JSON serializable values."""
+        return {**self._asdict(), "coefficients": list(self.coefficients)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Calibration:
+        """Create a calibration from the values of :meth:`to_dict`."""
+        calibration = cls(**{**data, "coefficients": tuple(float(c) for c in data.get("coefficients", (1.0, 0.0)))})
+        _check_unit(calibration.unit)
+        return calibration
+
+
+def _check_unit(unit: str) -> str:
+    if unit not in UNITS:
+        raise ValueError(f"Unknown unit {unit!r}. Choose from {', '.join(UNITS)}.")
+    return unit
+
+
+class CalibrationStore:
+    """JSON file holding the calibration of every device.
+
+    Devices are identified by any stable name, such as the serial number of the USB adapter or the port. The drift
+    and the tare time are not kept, because the monotonic clock of the tare restarts with the computer, so a drift
+    must be measured again after loading.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        """Initialize class.
+
+        Args:
+            path: Path of the file. It is created by :meth:`save` if missing.
+        """
+        self._path = Path(path)
+        self._calibrations: dict[str, Calibration] = {}
+        if self._path.exists():
+            store = json.loads(self._path.read_text(encoding="utf-8"))
+            if store.get("version") != _STORE_VERSION:
+                raise ValueError(f"Unsupported calibration store version: {store.get('version')}")
+            self._calibrations = {
+                name: _without_drift(Calibration.from_dict(data))
+                for name, data in store.get("calibrations", {}).items()
+            }
+
+    def __contains__(self, name: str) -> bool:
+        """Return whether a device has a calibration."""
+        return name in self._calibrations
+
+    def get(self, name: str) -> Calibration:
+        """Return the calibration of a device, or the identity calibration if it has none."""
+        return self._calibrations.get(name, Calibration())
+
+    def set(self, name: str, calibration: Calibration) -> None:
+        """Set the calibration of a device and save the file."""
+        self._calibrations[name] = calibration
+        self.save()
+
+    def save(self) -> None:
+        """Write the file atomically."""
+        store = {
+            "version": _STORE_VERSION,
+            "calibrations": {
+                name: _without_drift(calibration).to_dict() for name, calibration in self._calibrations.items()
+            },
+        }
+        temp_path = self._path.with_name(f"{self._path.name}.tmp")
+        temp_path.write_text(json.dumps(store, indent=4), encoding="utf-8")
+        os.replace(temp_path, self._path)
+
+
+def _without_drift(calibration: Calibration) -> Calibration:
+    return calibration._replace(tare_time=0.0, drift=0.0)
+
+
+def reprocess(
+    source: str | os.PathLike,
+    destination: str | os.PathLike,
+    calibration: Calibration,
+    chunk_size: int = 1 << 16,
+) -> int:
+    """Calibrate a recording of raw readings offline.
+
+    The recording is processed one memory-mapped segment at a time, so its size is not limited by memory.
+
+    Args:
+        source: Directory of a recording of raw readings, such as one made by :meth:`Loadcell.start_recording`.
+        destination: Directory of the calibrated recording. It must not hold a recording yet.
+        calibration: Calibration applied to every reading.
+        chunk_size: Number of samples per segment of the calibrated recording.
+
+    Returns:
+        Number of reprocessed samples.
+    """
+    if Path(source).resolve() == Path(destination).resolve():
+        raise ValueError("A recording cannot be reprocessed in place.")
+    if (Path(destination) / _INDEX_FILE_NAME).exists():
+        raise FileExistsError(f"{destination} already holds a recording.")
+    recorder = ColumnarRecorder(destination, chunk_size, flush_interval=0)
+    count = 0
+    try:
+        for timestamps, raw in Recording(source).segments():
+            recorder.append(timestamps, calibration.apply(raw, timestamps))
+            count += len(raw)
+    finally:
+        recorder.close()
+    return count
@@ -0,0 +1,330 @@
+"""Module for capture and replay of serial traffic.
+
+It is a copy of ``diy_hv._capture``, because this plugin is distributed on its own and does not depend on diy_hv.
+tests/test_capture.py checks that both stay the same.
+"""
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from serial import Serial, SerialException
+
+# A capture is the magic followed by records of a header and the bytes of one read or write.
+MAGIC = b"SERCAP\x00\x01"
+SENT = 0
+RECEIVED = 1
+# Header of a record: monotonic timestamp, then the length of the data shifted left by one bit ORed with the direction.
+_RECORD = struct.Struct("<dI")
+# Longest time in seconds covered by one record, so a continuous stream is still written as it arrives.
+_MAX_RECORD_SPAN = 0.05
+REPLAY_SCHEME = "replay"
+
+
+def _scan(data: bytes | mmap.mmap) -> tuple[list[float], list[int], list[int], int]:
+    # Returns the timestamps, header fields and data offsets of the complete records, and the end of the last one.
+    timestamps, fields, offsets = [], [], []
+    position = len(MAGIC)
+    size = len(data)
+    while position + _RECORD.size <= size:
+        timestamp, field = _RECORD.unpack_from(data, position)
+        if position + _RECORD.size + (field >> 1) > size:
+            break
+        position += _RECORD.size
+        timestamps.append(timestamp)
+        fields.append(field)
+        offsets.append(position)
+        position += field >> 1
+    return timestamps, fields, offsets, position
+
+
+class SerialCapture:
+    """Append-only recorder of the bytes going through a serial port.
+
+    ``readline`` reads one byte at a time, so consecutive chunks in the same direction are merged into one record,
+    stamped with the time of its first byte, while they are less than ``coalesce`` seconds apart. Every record is
+    flushed to the file once complete, so a crash loses at most the record being merged.
+    """
+
+    def __init__(self, path: str | os.PathLike, coalesce: float = 0.001) -> None:
+        """Initialize capture.
+
+        Args:
+            path: Path of the capture. An existing capture is appended to, after dropping a record cut off by a crash.
+            coalesce: Largest gap in seconds between chunks merged into one record.
+        """
+        self.path = Path(path)
+        self.coalesce = coalesce
+        self._lock = threading.Lock()
+        self._pending = bytearray()
+        self._pending_direction = SENT
+        self._pending_start = 0.0
+        self._pending_last = 0.0
+        self._file = self.path.open("a+b")
+        try:
+            self._truncate_to_last_record()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def record(self, direction: int, data: bytes) -> None:
+        """Append the bytes of a read or a write.
+
+        Args:
+            direction: ``SENT`` for bytes written by the host, ``RECEIVED`` for bytes read.
+            data: Bytes of the call.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._pending and (
+                direction != self._pending_direction
+                or now - self._pending_last > self.coalesce
+                or now - self._pending_start > _MAX_RECORD_SPAN
+            ):
+                self._write_pending()
+            if not self._pending:
+                self._pending_direction = direction
+                self._pending_start = now
+            self._pending += data
+            self._pending_last = now
+
+    def flush(self) -> None:
+        """Write the record being merged to the file."""
+        with self._lock:
+            self._write_pending()
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        with self._lock:
+            self._write_pending()
+            self._file.close()
+
+    def _write_pending(self) -> None:
+        if not self._pending:
+            return
+        self._file.write(_RECORD.pack(self._pending_start, len(self._pending) << 1 | self._pending_direction))
+        self._file.write(self._pending)
+        self._file.flush()
+        self._pending.clear()
+
+    def _truncate_to_last_record(self) -> None:
+        self._file.seek(0)
+        magic = self._file.read(len(MAGIC))
+        if not MAGIC.startswith(magic):
+            raise ValueError(f"{self.path} is not a serial capture.")
+        if len(magic) < len(MAGIC):
+            # Empty, or cut off while writing the magic.
+            self._file.truncate(0)
+            self._file.write(MAGIC)
+            self._file.flush()
+            return
+        size = os.fstat(self._file.fileno()).st_size
+        with mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ) as data:
+            end = _scan(data)[3]
+        if end < size:
+            # Appended records would be read as the data of the record cut off by a crash.
+            self._file.truncate(end)
+
+
+class CaptureFile:
+    """Memory-mapped view of a capture.
+
+    A record cut off by a crash at the end of the file is ignored.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        """Initialize capture file.
+
+        Args:
+            path: Path of the capture.
+        """
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a serial capture.")
+        timestamps, fields, offsets, _ = _scan(self._mmap)
+        field_array = np.array(fields, dtype=np.int64)
+        self.timestamps = np.array(timestamps, dtype=np.float64)
+        self.directions = (field_array & 1).astype(np.uint8)
+        self.lengths = field_array >> 1
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+    def __len__(self) -> int:
+        """Return the number of records."""
+        return len(self.timestamps)
+
+    def data(self, index: int) -> bytes:
+        """Return the bytes of a record."""
+        offset = int(self.offsets[index])
+        return self._mmap[offset : offset + int(self.lengths[index])]
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self._mmap.close()
+
+
+def replay_url(path: str | os.PathLike, speed: float = 1) -> str:
+    """Return the port which replays a capture.
+
+    Args:
+        path: Path of the capture.
+        speed: Speed multiplier of the replay. ``math.inf`` replays as fast as the host reads.
+    """
+    return f"{REPLAY_SCHEME}://{Path(path).as_posix()}?speed={speed}"
+
+
+def _parse_replay_url(url: str) -> tuple[str, float]:
+    parts = urlsplit(url)
+    speed = float(parse_qs(parts.query).get("speed", ["1"])[0])
+    if not speed > 0:
+        raise ValueError("speed must be positive.")
+    return parts.netloc + parts.path, speed
+
+
+class CaptureSerial(Serial):
+    """Serial port which records its traffic to a capture, or replays a capture instead of a device.
+
+    Traffic is recorded while :attr:`capture` is set. A port of the form ``replay://<path>?speed=<N>`` (see
+    :func:`replay_url`) replays the bytes received in the capture at N times the recorded pace. A received chunk is
+    also held back until the host has written as many bytes as it had before that chunk in the capture, so replies
+    stay behind their queries at any speed. Written bytes are discarded.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Override Serial class."""
+        self.capture: SerialCapture | None = None
+        self._replay: CaptureFile | None = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def is_replay(self) -> bool:
+        """Whether the port replays a capture."""
+        return self._replay is not None
+
+    def open(self) -> None:
+        """Override Serial class."""
+        if not str(self.port).startswith(f"{REPLAY_SCHEME}://"):
+            super().open()
+            return
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        path, self._speed = _parse_replay_url(self.port)
+        try:
+            replay = CaptureFile(path)
+        except (OSError, ValueError) as e:
+            raise SerialException(f"Could not open capture {path}: {e}") from e
+        received = replay.directions == RECEIVED
+        sent_before = np.cumsum(np.where(received, 0, replay.lengths))
+        self._rx_indices = np.flatnonzero(received)
+        self._rx_sent_before = sent_before[received].tolist()
+        start = replay.timestamps[0] if len(replay) else 0.0
+        self._rx_offsets = ((replay.timestamps[received] - start) / self._speed).tolist()
+        self._rx_cursor = 0
+        self._rx_pending = bytearray()
+        self._tx_count = 0
+        self._replay_condition = threading.Condition()
+        self._replay = replay
+        self._replay_start = time.monotonic()
+        self.is_open = True
+
+    def close(self) -> None:
+        """Override Serial class."""
+        if self._replay is None:
+            super().close()
+            return
+        self._replay.close()
+        self._replay = None
+        self.is_open = False
+
+    def _reconfigure_port(self, *args, **kwargs) -> None:
+        if self._replay is None:
+            super()._reconfigure_port(*args, **kwargs)
+
+    def read(self, size: int = 1) -> bytes:
+        """Override Serial class."""
+        data = super().read(size) if self._replay is None else self._replay_read(size)
+        if self.capture is not None and data:
+            self.capture.record(RECEIVED, data)
+        return data
+
+    def write(self, data: bytes) -> int | None:
+        """Override Serial class."""
+        if self.capture is not None:
+            self.capture.record(SENT, bytes(data))
+        if self._replay is None:
+            return super().write(data)
+        with self._replay_condition:
+            self._tx_count += len(data)
+            self._replay_condition.notify_all()
+        return len(data)
+
+    @property
+    def in_waiting(self) -> int:
+        """Override Serial class."""
+        if self._replay is None:
+            return super().in_waiting
+        with self._replay_condition:
+            self._release()
+            return len(self._rx_pending)
+
+    @property
+    def replay_finished(self) -> bool:
+        """Whether every received byte of the replayed capture has been read."""
+        return self._replay is not None and self._rx_cursor == len(self._rx_offsets) and not self._rx_pending
+
+    def reset_input_buffer(self) -> None:
+        """Override Serial class."""
+        if self._replay is None:
+            super().reset_input_buffer()
+            return
+        with self._replay_condition:
+            self._release()
+            self._rx_pending.clear()
+
+    def reset_output_buffer(self) -> None:
+        """Override Serial class."""
+        if self._replay is None:
+            super().reset_output_buffer()
+
+    def flush(self) -> None:
+        """Override Serial class."""
+        if self._replay is None:
+            super().flush()
+
+    def _release(self) -> float | None:
+        # Moves the chunks which are due to the pending bytes, and returns when the next chunk is due if it only waits
+        # for time to pass.
+        elapsed = time.monotonic() - self._replay_start
+        while self._rx_cursor < len(self._rx_offsets):
+            if self._rx_sent_before[self._rx_cursor] > self._tx_count:
+                return None
+            offset = self._rx_offsets[self._rx_cursor]
+            if offset > elapsed:
+                return offset - elapsed
+            self._rx_pending += self._replay.data(int(self._rx_indices[self._rx_cursor]))  # type: ignore
+            self._rx_cursor += 1
+        return None
+
+    def _replay_read(self, size: int) -> bytes:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._replay_condition:
+            while True:
+                wait = self._release()
+                if len(self._rx_pending) >= size:
+                    break
+                remaining = math.inf if deadline is None else deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = remaining if wait is None else min(wait, remaining)
+                self._replay_condition.wait(None if math.isinf(wait) else wait)
+            data = self._rx_pending[:size]
+            del self._rx_pending[:size]
+        return bytes(data)
@@ -0,0 +1,213 @@
+"""Module for per-cycle summaries of cyclic tests."""
+from __future__ import annotations
+
+import math
+import threading
+
+import numpy as np
+
+CYCLE_DTYPE = np.dtype(
+    [
+        ("start", np.float64),
+        ("end", np.float64),
+        ("count", np.int64),
+        ("min", np.float64),
+        ("max", np.float64),
+        ("mean", np.float64),
+        ("peak_to_peak", np.float64),
+        ("area", np.float64),
+    ]
+)
+
+
+class _Cycle:
+    def __init__(self, start: float, keep_raw: bool) -> None:
+        self.start = start
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.area = 0.0
+        # Last sample as (position, value), which links the area across batches.
+        self.last: tuple[float, float] | None = None
+        self.raw: list[tuple[np.ndarray, np.ndarray]] | None = [] if keep_raw else None
+
+    def add(self, timestamps: np.ndarray, values: np.ndarray, positions: np.ndarray | None) -> None:
+        if len(values) == 0:
+            return
+        if self.raw is not None:
+            self.raw.append((timestamps.copy(), values.copy()))
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if positions is not None:
+            if self.last is not None:
+                positions = np.concatenate(((self.last[0],), positions))
+                values = np.concatenate(((self.last[1],), values))
+            self.area += float(np.sum(np.diff(positions) * (values[1:] + values[:-1]) / 2))
+            self.last = float(positions[-1]), float(values[-1])
+
+
+class CycleSegmenter:
+    """Online segmentation of a cyclic signal into cycles with summary statistics.
+
+    A cycle starts every time the signal rises through ``level``. The crossing needs the signal to go below
+    ``level - hysteresis / 2`` and then reach ``level + hysteresis / 2``, so noise around the level does not split
+    cycles. When ``level`` is None, it is the middle of the range of the previous cycle, or of every sample until the
+    first cycle is complete.
+
+    Only one row of statistics is kept per cycle, so memory grows with the number of cycles, not samples. Raw samples
+    are kept for one cycle out of ``keep_every``. Samples before the first crossing are not part of any cycle.
+    """
+
+    def __init__(self, level: float | None = None, hysteresis: float = 0.0, keep_every: int = 0) -> None:
+        """Initialize class.
+
+        Args:
+            level: Value whose rising crossings separate the cycles. It follows the signal if None.
+            hysteresis: Width of the band around the level which has to be crossed. Set it above the noise.
+            keep_every: Keep the raw samples of cycles 0, ``keep_every``, ``2 * keep_every``... Nothing is kept if 0.
+        """
+        if hysteresis < 0:
+            raise ValueError("hysteresis must not be negative.")
+        if keep_every < 0:
+            raise ValueError("keep_every must not be negative.")
+        self.level = level
+        self.hysteresis = hysteresis
+        self.keep_every = keep_every
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Remove every cycle."""
+        self._table = np.empty(64, dtype=CYCLE_DTYPE)
+        self._count = 0
+        self._cycle: _Cycle | None = None
+        self._armed = False
+        self._range = (math.inf, -math.inf)
+        self.raw_cycles: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        """Return the number of complete cycles."""
+        return self._count
+
+    @property
+    def cycles(self) -> np.ndarray:
+        """Statistics of the complete cycles as a structured array of :data:`CYCLE_DTYPE`.
+
+        ``area`` is the area of the loop of the values against the positions, positive for a clockwise loop, or NaN
+        if no position was given.
+        """
+        with self._lock:
+            return self._table[: self._count].copy()
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray, positions: np.ndarray | None = None) -> int:
+        """Segment a batch of samples.
+
+        Args:
+            timestamps: Monotonic timestamps of the samples.
+            values: Samples following the previous batch.
+            positions: Position of every sample, such as the displacement of the stage, for the hysteresis area.
+
+        Returns:
+            Number of cycles completed by the batch.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), values.shape)
+        if positions is not None:
+            positions = np.asarray(positions, dtype=np.float64)
+        completed = 0
+        with self._lock:
+            position = 0
+            n = len(values)
+            while position < n:
+                boundary = self._find_boundary(values, position)
+                stop = n if boundary is None else boundary
+                if self._cycle is not None:
+                    self._cycle.add(
+                        timestamps[position:stop],
+                        values[position:stop],
+                        None if positions is None else positions[position:stop],
+                    )
+                if self.level is None and self._count == 0 and stop > position:
+                    chunk = values[position:stop]
+                    self._range = (min(self._range[0], float(chunk.min())), max(self._range[1], float(chunk.max())))
+                if boundary is None:
+                    break
+                if self._cycle is not None:
+                    self._close(
+                        float(timestamps[boundary]),
+                        float(values[boundary]),
+                        None if positions is None else float(positions[boundary]),
+                    )
+                    completed += 1
+                keep_raw = self.keep_every > 0 and self._count % self.keep_every == 0
+                self._cycle = _Cycle(float(timestamps[boundary]), keep_raw)
+                self._armed = False
+                position = boundary
+                # The first sample of a cycle is above the level, so searching from it cannot find the same crossing.
+                self._cycle.add(
+                    timestamps[boundary : boundary + 1],
+                    values[boundary : boundary + 1],
+                    None if positions is None else positions[boundary : boundary + 1],
+                )
+                position += 1
+        return completed
+
+    def _levels(self, values: np.ndarray) -> float | np.ndarray:
+        if self.level is not None:
+            return self.level
+        if self._count > 0:
+            last = self._table[self._count - 1]
+            return (last["min"] + last["max"]) / 2
+        # Until the first cycle is complete, the level follows the range of every sample so far.
+        low = np.minimum.accumulate(np.minimum(values, self._range[0]))
+        high = np.maximum.accumulate(np.maximum(values, self._range[1]))
+        return (low + high) / 2
+
+    def _find_boundary(self, values: np.ndarray, start: int) -> int | None:
+        segment = values[start:]
+        levels = self._levels(segment)
+        half_band = self.hysteresis / 2
+        armed_from = 0
+        if not self._armed:
+            below = np.flatnonzero(segment < levels - half_band)
+            if len(below) == 0:
+                return None
+            armed_from = int(below[0])
+            self._armed = True
+        above = segment[armed_from:] >= (levels if np.isscalar(levels) else levels[armed_from:]) + half_band
+        crossings = np.flatnonzero(above)
+        if len(crossings) == 0:
+            return None
+        return start + armed_from + int(crossings[0])
+
+    def _close(self, end: float, value: float, position: float | None) -> None:
+        cycle = self._cycle
+        assert cycle is not None
+        if position is not None and cycle.last is not None:
+            # Close the loop on the first sample of the next cycle.
+            cycle.area += (position - cycle.last[0]) * (value + cycle.last[1]) / 2
+        if self._count == len(self._table):
+            self._table = np.resize(self._table, 2 * len(self._table))
+        self._table[self._count] = (
+            cycle.start,
+            end,
+            cycle.count,
+            cycle.min,
+            cycle.max,
+            cycle.sum / cycle.count,
+            cycle.max - cycle.min,
+            cycle.area if cycle.last is not None else math.nan,
+        )
+        if cycle.raw is not None:
+            self.raw_cycles[self._count] = (
+                np.concatenate([t for t, _ in cycle.raw]),
+                np.concatenate([v for _, v in cycle.raw]),
+            )
+        self._count += 1
+
+    def __call__(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """Segment a chunk of a stream, as a sink of :meth:`pyautolab_Loadcell.driver.Loadcell.add_stream_sink`."""
+        self.process(timestamps, values)
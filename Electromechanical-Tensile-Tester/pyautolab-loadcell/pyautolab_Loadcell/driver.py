@@ -1,30 +1,116 @@
 """Module for device."""
 from __future__ import annotations
 
+import time
+from typing import Callable
+
+import numpy as np
 import pyautolab.api as api
-from serial import Serial
+from pyautolab_Loadcell.buffer import RingBuffer
+from pyautolab_Loadcell.calibration import Calibration
+from pyautolab_Loadcell.capture import CaptureSerial, SerialCapture
+from pyautolab_Loadcell.metrics import SerialMetrics
+from pyautolab_Loadcell.multiplex import Channel, LoadcellMultiplexer
+from pyautolab_Loadcell.parser import FrameParser
+from pyautolab_Loadcell.process import ProcessReader, SharedRingBuffer
+from pyautolab_Loadcell.recorder import ColumnarRecorder
+from pyautolab_Loadcell.stream import StreamReader
+from serial import SerialException
 
 PARAMETER = {"Tension": "g"}
+_PARAMETER_NAME = list(PARAMETER)[0]
+
+
+class LoadcellReplyError(SerialException):
+    """Raised when some replies of a batch query are missing or malformed."""
+
+    def __init__(self, message: str, readings: np.ndarray, expected: int) -> None:
+        """Initialize class.
 
+        Args:
+            message: Error message.
+            readings: Readings parsed from the complete replies, in order of arrival.
+            expected: Number of replies which were requested.
+        """
+        super().__init__(message)
+        self.readings = readings
+        self.expected = expected
 
-class _LoadcellSerial(Serial):
+
+class _LoadcellSerial(CaptureSerial):
     def __init__(self) -> None:
         super().__init__(timeout=0)
         self._delimiter = "\r\n"
+        self.parser = FrameParser(delimiter=bytes(self._delimiter, "utf-8"))
+        # Instrumentation is off unless metrics are set, and then costs a single attribute check per call.
+        self.metrics: SerialMetrics | None = None
+
+    def reset_input_buffer(self) -> None:
+        super().reset_input_buffer()
+        self.parser.clear()
 
     def send_message(self, message: str) -> None:
-        self.write(bytes(message + self._delimiter, "utf-8"))
+        data = bytes(message + self._delimiter, "utf-8")
+        metrics = self.metrics
+        if metrics is None:
+            self.write(data)
+            return
+        start = time.perf_counter()
+        self.write(data)
+        metrics.record_send(time.perf_counter() - start, len(data))
 
     def receive_message(self) -> str:
-        return self.readline().decode("utf-8").strip().rstrip()
+        metrics = self.metrics
+        if metrics is None:
+            return self.readline().decode("utf-8").strip().rstrip()
+        start = time.perf_counter()
+        line = self.readline()
+        metrics.record_receive(time.perf_counter() - start, len(line), line.endswith(bytes(self._delimiter, "utf-8")))
+        return line.decode("utf-8").strip().rstrip()
 
     def send_query_message(self, message: str) -> str:
+        metrics = self.metrics
+        if metrics is None:
+            self.send_message(message)
+            return self.receive_message()
+        start = time.perf_counter()
         self.send_message(message)
-        return self.receive_message()
+        try:
+            return self.receive_message()
+        finally:
+            metrics.record_query(time.perf_counter() - start)
+
+    def send_query_messages(self, message: str, count: int) -> np.ndarray:
+        self.write(bytes(message + self._delimiter, "utf-8") * count)
+        readings = np.empty(count, dtype=np.float64)
+        received = 0
+        errors = self.parser.parse_errors
+        while received + self.parser.parse_errors - errors < count:
+            if self.parser.readinto(self) == 0:
+                break
+            values = self.parser.parse()
+            n = min(len(values), count - received)
+            readings[received : received + n] = values[:n]
+            received += n
+        malformed = self.parser.parse_errors - errors
+        incomplete = self.parser.pending
+        if received != count or malformed != 0:
+            self.parser.clear()
+            raise LoadcellReplyError(
+                f"Received {received} of {count} readings "
+                f"({malformed} malformed, {incomplete} bytes of incomplete reply).",
+                readings[:received],
+                count,
+            )
+        return readings
 
 
 class Loadcell(api.Device):
-    """Loadcell class."""
+    """Loadcell class.
+
+    Setting :attr:`port` to :func:`pyautolab_Loadcell.capture.replay_url` replays a capture made by
+    :meth:`start_capture` instead of talking to a device.
+    """
 
     PORT_FILTER = ""
 
@@ -32,17 +118,63 @@ class Loadcell(api.Device):
         """Initialize class."""
         super().__init__()
         self._ser = _LoadcellSerial()
+        # Seconds to wait for a reading. Readers may change the timeout of the port, such as a multiplexer.
+        self._timeout = 0.1
+        self._stream_buffer: RingBuffer | SharedRingBuffer | None = None
+        self._stream_reader: StreamReader | ProcessReader | Channel | None = None
+        self._recorder: ColumnarRecorder | None = None
+        # Readings are returned raw unless a calibration is set. Sinks and recordings always receive raw readings.
+        self.calibration: Calibration | None = None
+
+    @staticmethod
+    def identify(port: str, baudrate: int = 9600, timeout: float = 3) -> bool:
+        """Return whether a loadcell is connected to the port.
+
+        The port is opened exclusively and queried until it replies with a number. Queries are repeated because
+        opening the port resets the Arduino, which ignores bytes received while it boots.
+
+        Args:
+            port: Serial port to probe.
+            baudrate: Baudrate of the loadcell.
+            timeout: Seconds to wait for a reply.
+        """
+        ser = _LoadcellSerial()
+        ser.port = port
+        ser.baudrate = baudrate
+        ser.timeout = 0.2
+        ser.exclusive = True
+        try:
+            ser.open()
+        except (SerialException, OSError, ValueError):
+            return False
+        try:
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                try:
+                    float(ser.send_query_message("a"))
+                except ValueError:
+                    # Also catches the UnicodeDecodeError of bytes garbled while the Arduino boots.
+                    continue
+                return True
+            return False
+        except (SerialException, OSError):
+            return False
+        finally:
+            ser.close()
 
     def open(self) -> None:
         """Override Device class."""
         self._ser.port = self.port
         self._ser.baudrate = self.baudrate
-        self._ser.timeout = 0.1
+        self._ser.timeout = self._timeout
         self._ser.open()
 
     def close(self) -> None:
         """Override Device class."""
+        if self.is_streaming:
+            self.stop_streaming()
         self._ser.close()
+        self.stop_capture()
 
     def receive(self) -> str:
         """Override Device class."""
@@ -58,10 +190,267 @@ class Loadcell(api.Device):
         self._ser.reset_output_buffer()
 
     def measure(self) -> dict[str, float]:
-        """Override Device class."""
-        result = self._ser.send_query_message("a")
-        return {list(PARAMETER)[0]: float(result)}
+        """Override Device class.
+
+        In streaming mode, the newest buffered reading is returned without any serial round trip.
+        """
+        if self._stream_buffer is not None:
+            sample = self._stream_buffer.latest(timeout=self._timeout)
+            if sample is None:
+                raise TimeoutError("No reading has been streamed from the loadcell.")
+            timestamp, value = sample
+        else:
+            value = float(self._ser.send_query_message("a"))
+            timestamp = time.monotonic()
+        if self.calibration is not None:
+            value = self.calibration.apply_one(value, timestamp)
+        return {_PARAMETER_NAME: value}
+
+    def measure_many(self, count: int) -> dict[str, np.ndarray]:
+        """Measure several times with pipelined queries.
+
+        All queries are written at once and the replies are read back in bulk, so the cost per reading is
+        close to the line rate instead of the round trip time. The firmware has to stay in query mode, and
+        ``count`` must be small enough for the queries to fit in its receive buffer.
+
+        Args:
+            count: Number of readings.
+
+        Raises:
+            LoadcellReplyError: If some replies are missing or cannot be parsed.
+
+        Returns:
+            Readings in order of arrival.
+        """
+        if self.is_streaming:
+            raise RuntimeError("Batch queries are not available in streaming mode.")
+        readings = self._ser.send_query_messages("a", count)
+        if self.calibration is not None:
+            readings = self.calibration.apply(readings, np.full(count, time.monotonic()))
+        return {_PARAMETER_NAME: readings}
+
+    @property
+    def is_streaming(self) -> bool:
+        """Whether the device is in streaming mode."""
+        return self._stream_reader is not None
+
+    def start_streaming(
+        self,
+        start_message: str | None = None,
+        capacity: int = 100_000,
+        in_process: bool = False,
+        multiplexer: LoadcellMultiplexer | None = None,
+    ) -> None:
+        """Start continuous acquisition.
+
+        A background thread parses the readings pushed by the device into a timestamped ring buffer.
+
+        With ``in_process``, a child process owns the port and parses the readings into a ring buffer in shared
+        memory instead, so the GUI of this process cannot delay the acquisition. The child is started again if it
+        dies or hangs. Recording and stream sinks are not available in this mode, and :meth:`decimate` only covers
+        the samples held by the ring. It needs Python 3.8 or later.
+
+        With ``multiplexer``, the port is read by the event loop of a :class:`LoadcellMultiplexer` shared with other
+        devices instead of a thread of its own, and the readings are a channel of the multiplexer.
+
+        Args:
+            start_message: Message which switches the firmware into streaming mode. Nothing is sent if None.
+            capacity: Number of samples kept in the ring buffer.
+            in_process: Whether to acquire in a child process.
+            multiplexer: Multiplexer reading the port, such as :meth:`LoadcellMultiplexer.shared`.
+        """
+        if self.is_streaming:
+            return
+        if in_process:
+            buffer = SharedRingBuffer(capacity)
+            self._ser.close()
+            message = None if start_message is None else bytes(start_message + self._ser._delimiter, "utf-8")
+            self._stream_buffer = buffer
+            self._stream_reader = ProcessReader(self.port, self.baudrate, buffer, message)
+            self._stream_reader.start()
+            return
+        if multiplexer is not None and self._ser.is_replay:
+            raise RuntimeError("A replayed capture cannot be multiplexed.")
+        self._stream_buffer = RingBuffer(capacity)
+        if multiplexer is None:
+            self._stream_reader = StreamReader(self._ser, self._stream_buffer, self._ser.parser)
+        else:
+            self._stream_reader = multiplexer.channel(self.port, self._ser, self._stream_buffer, self._ser.parser)
+        self._ser.reset_input_buffer()
+        if start_message is not None:
+            self._ser.send_message(start_message)
+        self._stream_reader.start()
+
+    def stop_streaming(self, stop_message: str | None = None) -> None:
+        """Stop continuous acquisition.
+
+        Args:
+            stop_message: Message which switches the firmware back to query mode. Nothing is sent if None.
+        """
+        if self._stream_reader is None:
+            return
+        self.stop_recording()
+        if isinstance(self._stream_reader, ProcessReader):
+            self._stream_reader.stop(timeout=1)
+            self._stream_buffer.close()  # type: ignore
+            self._ser.open()
+            if stop_message is not None:
+                self._ser.send_message(stop_message)
+        else:
+            if stop_message is not None:
+                self._ser.send_message(stop_message)
+            self._stream_reader.stop(timeout=1)
+        self._stream_reader = None
+        self._stream_buffer = None
+        self._ser.reset_input_buffer()
+
+    @property
+    def channel(self) -> Channel | None:
+        """Channel of the readings on a multiplexer, or None if the device is not multiplexed."""
+        return self._stream_reader if isinstance(self._stream_reader, Channel) else None
+
+    @property
+    def process_reader(self) -> ProcessReader | None:
+        """Child process of the acquisition with its overrun and restart counters, or None if not in process mode."""
+        return self._stream_reader if isinstance(self._stream_reader, ProcessReader) else None
+
+    def start_recording(self, path: str, chunk_size: int = 1 << 16, flush_interval: float = 1) -> ColumnarRecorder:
+        """Record every streamed reading to disk.
+
+        Args:
+            path: Directory of the recording. An existing recording is appended to.
+            chunk_size: Number of samples per segment file.
+            flush_interval: Seconds between flushes to disk.
+
+        Returns:
+            The recorder. Use :class:`pyautolab_Loadcell.recorder.Recording` to read the data back.
+        """
+        if self._stream_reader is None:
+            raise RuntimeError("Loadcell is not streaming.")
+        if isinstance(self._stream_reader, ProcessReader):
+            raise RuntimeError("Recording is not available when acquiring in a child process.")
+        if self._recorder is not None:
+            raise RuntimeError("Loadcell is already recording.")
+        self._recorder = ColumnarRecorder(path, chunk_size, flush_interval)
+        self._stream_reader.add_sink(self._recorder.append)
+        return self._recorder
+
+    def stop_recording(self) -> None:
+        """Stop recording and flush the remaining readings."""
+        if self._recorder is None:
+            return
+        if isinstance(self._stream_reader, (StreamReader, Channel)):
+            self._stream_reader.remove_sink(self._recorder.append)
+        self._recorder.close()
+        self._recorder = None
+
+    def add_stream_sink(self, sink: Callable[[np.ndarray, np.ndarray], None]) -> None:
+        """Register a callable receiving the monotonic timestamps and tensions of every streamed chunk.
+
+        Sinks are called on the reader thread, such as :meth:`pyautolab_Loadcell.fusion.StreamFusion.sink`.
+        """
+        if self._stream_reader is None:
+            raise RuntimeError("Loadcell is not streaming.")
+        if isinstance(self._stream_reader, ProcessReader):
+            raise RuntimeError("Stream sinks are not available when acquiring in a child process.")
+        self._stream_reader.add_sink(sink)
+
+    def remove_stream_sink(self, sink: Callable[[np.ndarray, np.ndarray], None]) -> None:
+        """Unregister a sink."""
+        if isinstance(self._stream_reader, (StreamReader, Channel)):
+            self._stream_reader.remove_sink(sink)
+
+    def read_available(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the readings streamed since the previous call.
+
+        Returns:
+            Monotonic timestamps and tensions of the new readings.
+        """
+        if self._stream_buffer is None:
+            raise RuntimeError("Loadcell is not streaming.")
+        timestamps, values = self._stream_buffer.read_available()
+        if self.calibration is not None:
+            values = self.calibration.apply(values, timestamps)
+        return timestamps, values
+
+    def decimate(self, width: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the min/max envelope of the readings streamed so far.
+
+        Args:
+            width: Number of buckets, typically the width of the plot in pixels.
+
+        Returns:
+            At most ``2 * width`` monotonic timestamps and tensions in time order.
+        """
+        if self._stream_buffer is None:
+            raise RuntimeError("Loadcell is not streaming.")
+        timestamps, values = self._stream_buffer.decimate(width)
+        if self.calibration is not None:
+            values = self.calibration.apply(values, timestamps)
+        return timestamps, values
 
     def fix_zero(self) -> None:
         """Fix zero."""
         self._ser.send_message("b")
+
+    def tare(self, count: int = 16) -> Calibration:
+        """Zero the calibration on the host with the mean of readings of the unloaded cell.
+
+        Unlike :meth:`fix_zero`, the offset is kept by :attr:`calibration`, so raw readings and recordings are not
+        affected and can be reprocessed with another tare.
+
+        Args:
+            count: Number of readings averaged. In streaming mode, the newest buffered readings are used.
+
+        Returns:
+            The new calibration.
+        """
+        if self._stream_buffer is not None:
+            timestamps, raw = self._stream_buffer.snapshot()
+            timestamps, raw = timestamps[-count:], raw[-count:]
+        else:
+            raw = self._ser.send_query_messages("a", count)
+            timestamps = np.full(count, time.monotonic())
+        self.calibration = (self.calibration or Calibration()).with_tare(raw, timestamps)
+        return self.calibration
+
+    def start_capture(self, path: str) -> SerialCapture:
+        """Record every byte read from and written to the port, with timestamps.
+
+        Args:
+            path: Path of the capture. An existing capture is appended to.
+
+        Returns:
+            The capture. Use :class:`pyautolab_Loadcell.capture.CaptureFile` to read it back.
+        """
+        if self._ser.capture is not None:
+            raise RuntimeError("Port is already captured.")
+        self._ser.capture = SerialCapture(path)
+        return self._ser.capture
+
+    def stop_capture(self) -> None:
+        """Stop recording and close the capture."""
+        capture, self._ser.capture = self._ser.capture, None
+        if capture is not None:
+            capture.close()
+
+    @property
+    def metrics(self) -> SerialMetrics | None:
+        """Latency and traffic metrics of the port, or None if instrumentation is disabled."""
+        return self._ser.metrics
+
+    def enable_metrics(self) -> SerialMetrics:
+        """Enable instrumentation of sends, receives and queries.
+
+        Batch queries and streaming read the port in bulk and are not instrumented.
+
+        Returns:
+            Metrics updated by every following call. Existing metrics are kept if already enabled.
+        """
+        if self._ser.metrics is None:
+            self._ser.metrics = SerialMetrics()
+        return self._ser.metrics
+
+    def disable_metrics(self) -> None:
+        """Disable instrumentation."""
+        self._ser.metrics = None
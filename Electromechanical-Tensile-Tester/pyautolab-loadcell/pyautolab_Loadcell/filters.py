@@ -0,0 +1,303 @@
+"""Module for streaming filters and event detection."""
+from __future__ import annotations
+
+import math
+import threading
+from typing import Callable, NamedTuple, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pyautolab_Loadcell.buffer import RingBuffer
+from pyautolab_Loadcell.calibration import Calibration
+
+# Largest growth of the weights of a block of ExponentialFilter, which bounds the loss of precision of the sums.
+_MAX_BLOCK_GAIN = 1e6
+
+
+class MovingAverage:
+    """Mean of the last ``window`` samples.
+
+    Every batch costs one cumulative sum, so each sample is O(1) whatever the window. The first samples of the stream
+    are averaged with copies of the first sample.
+    """
+
+    def __init__(self, window: int) -> None:
+        """Initialize class.
+
+        Args:
+            window: Number of averaged samples.
+        """
+        if window <= 0:
+            raise ValueError("window must be a positive integer.")
+        self.window = window
+        self._tail: np.ndarray | None = None
+
+    def reset(self) -> None:
+        """Forget the previous samples."""
+        self._tail = None
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        """Filter a batch of samples.
+
+        Args:
+            values: Samples following the previous batch.
+
+        Returns:
+            One filtered value per sample.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+        data = self._extend(values)
+        sums = np.cumsum(data)
+        sums[self.window :] -= sums[: -self.window].copy()
+        return sums[self.window - 1 :] / self.window
+
+    def _extend(self, values: np.ndarray) -> np.ndarray:
+        if self._tail is None:
+            self._tail = np.full(self.window - 1, values[0])
+        data = np.concatenate((self._tail, values))
+        self._tail = data[len(data) - (self.window - 1) :]
+        return data
+
+
+class MovingMedian(MovingAverage):
+    """Median of the last ``window`` samples.
+
+    A median cannot be updated in O(1), so every sample costs a partial sort of the window in compiled code. Keep the
+    window short, such as a few dozen samples, to reject spikes.
+    """
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        """Override MovingAverage class."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+        return np.median(sliding_window_view(self._extend(values), self.window), axis=1)
+
+
+class ExponentialFilter:
+    """First order IIR low-pass filter ``y[n] = y[n - 1] + alpha * (x[n] - y[n - 1])``.
+
+    The recursion is solved in closed form over blocks of samples, so batches are filtered without a Python loop.
+    """
+
+    def __init__(self, alpha: float) -> None:
+        """Initialize class.
+
+        Args:
+            alpha: Weight of the new sample, between 0 excluded and 1 included.
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1].")
+        self.alpha = alpha
+        self._state: float | None = None
+        decay = 1 - alpha
+        self._block = 4096 if decay == 0 else max(1, min(4096, int(math.log(_MAX_BLOCK_GAIN) / -math.log(decay))))
+        k = np.arange(self._block)
+        # Weights decay**-k and decay**(k + 1) of the closed form of a block.
+        self._gains = decay ** -k.astype(np.float64) if decay else np.ones(self._block)
+        self._decays = decay ** (k + 1.0)
+
+    @classmethod
+    def from_cutoff(cls, cutoff: float, sample_rate: float) -> ExponentialFilter:
+        """Create a filter from its -3 dB cutoff frequency.
+
+        Args:
+            cutoff: Cutoff frequency in Hz.
+            sample_rate: Sample rate of the stream in Hz.
+        """
+        return cls(1 - math.exp(-2 * math.pi * cutoff / sample_rate))
+
+    def reset(self) -> None:
+        """Forget the previous samples."""
+        self._state = None
+
+    def process(self, values: np.ndarray) -> np.ndarray:
+        """Filter a batch of samples.
+
+        Args:
+            values: Samples following the previous batch.
+
+        Returns:
+            One filtered value per sample.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        output = np.empty_like(values)
+        if len(values) == 0:
+            return output
+        if self._state is None:
+            self._state = float(values[0])
+        state = self._state
+        for start in range(0, len(values), self._block):
+            block = values[start : start + self._block]
+            n = len(block)
+            # y[j] = decay**(j + 1) * y[-1] + alpha * decay**j * sum(x[k] * decay**-k for k <= j)
+            if self.alpha == 1:
+                filtered = block.copy()
+            else:
+                sums = np.cumsum(block * self._gains[:n])
+                filtered = self._decays[:n] * state + self.alpha * sums * self._decays[:n] / (1 - self.alpha)
+            output[start : start + n] = filtered
+            state = float(filtered[-1])
+        self._state = state
+        return output
+
+
+class FractureEvent(NamedTuple):
+    """Fracture of a specimen found by :class:`FractureDetector`.
+
+    Attributes:
+        timestamp: Monotonic time of the sample which triggered the event.
+        index: Index of that sample in the stream.
+        value: Value of that sample.
+        peak: Highest value before the fracture.
+        peak_timestamp: Monotonic time of the peak.
+    """
+
+    timestamp: float
+    index: int
+    value: float
+    peak: float
+    peak_timestamp: float
+
+
+class FractureDetector:
+    """Detector of the sudden loss of tension when a specimen breaks.
+
+    The detector follows the running peak of the stream. It fires once the value has stayed below
+    ``(1 - drop_ratio) * peak`` for ``confirm`` consecutive samples, after the peak has reached ``min_peak``, so the
+    event comes at most ``confirm - 1`` samples after the first sample of the fracture. It then disarms until
+    :meth:`reset`.
+    """
+
+    def __init__(self, drop_ratio: float = 0.5, min_peak: float = 0.0, confirm: int = 3) -> None:
+        """Initialize class.
+
+        Args:
+            drop_ratio: Fraction of the peak which has to be lost.
+            min_peak: Peak below which nothing is detected, to ignore noise before the specimen is loaded.
+            confirm: Number of consecutive samples below the threshold needed to fire.
+        """
+        if not 0 < drop_ratio <= 1:
+            raise ValueError("drop_ratio must be in (0, 1].")
+        if confirm <= 0:
+            raise ValueError("confirm must be a positive integer.")
+        self.drop_ratio = drop_ratio
+        self.min_peak = min_peak
+        self.confirm = confirm
+        self._callbacks: tuple[Callable[[FractureEvent], None], ...] = ()
+        self.reset()
+
+    def add_callback(self, callback: Callable[[FractureEvent], None]) -> None:
+        """Register a callable run with the event, such as one stopping the stage.
+
+        Callbacks run on the thread which called :meth:`process`.
+        """
+        self._callbacks = (*self._callbacks, callback)
+
+    def remove_callback(self, callback: Callable[[FractureEvent], None]) -> None:
+        """Unregister a callback."""
+        self._callbacks = tuple(c for c in self._callbacks if c != callback)
+
+    def reset(self) -> None:
+        """Forget the peak and arm the detector."""
+        self.event: FractureEvent | None = None
+        self._peak = -math.inf
+        self._peak_timestamp = math.nan
+        self._run = 0
+        self._count = 0
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray) -> FractureEvent | None:
+        """Look for a fracture in a batch of samples.
+
+        Args:
+            timestamps: Monotonic timestamps of the samples.
+            values: Samples following the previous batch, usually filtered.
+
+        Returns:
+            The event if it fired in this batch.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0 or self.event is not None:
+            self._count += n
+            return None
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), values.shape)
+        peaks = np.maximum.accumulate(np.maximum(values, self._peak))
+        below = (peaks >= self.min_peak) & (values < (1 - self.drop_ratio) * peaks)
+        # Length of the run of samples below the threshold ending at every sample.
+        indices = np.arange(n)
+        last_above = np.maximum.accumulate(np.where(below, -1, indices))
+        runs = indices - last_above
+        runs[last_above == -1] += self._run
+        fired = np.flatnonzero(runs >= self.confirm)
+
+        last = n - 1 if len(fired) == 0 else int(fired[0])
+        peak_index = int(np.argmax(values[: last + 1]))
+        if values[peak_index] > self._peak:
+            self._peak, self._peak_timestamp = float(values[peak_index]), float(timestamps[peak_index])
+        self._run = int(runs[-1])
+        self._count += n
+        if len(fired) == 0:
+            return None
+        self.event = FractureEvent(
+            float(timestamps[last]),
+            self._count - n + last,
+            float(values[last]),
+            self._peak,
+            self._peak_timestamp,
+        )
+        for callback in self._callbacks:
+            callback(self.event)
+        return self.event
+
+
+class SignalPipeline:
+    """Chain of filters and detectors run on every chunk of a stream.
+
+    The pipeline is a sink of :meth:`pyautolab_Loadcell.driver.Loadcell.add_stream_sink`. It calibrates the raw
+    readings, runs them through the filters in order, feeds the filtered values to the detectors and stores them in
+    :attr:`output`.
+    """
+
+    def __init__(
+        self,
+        filters: Sequence[MovingAverage | ExponentialFilter] = (),
+        detectors: Sequence[FractureDetector] = (),
+        calibration: Calibration | None = None,
+        capacity: int = 100_000,
+    ) -> None:
+        """Initialize class.
+
+        Args:
+            filters: Filters applied in order.
+            detectors: Detectors fed with the filtered values.
+            calibration: Calibration applied to the raw readings before the filters.
+            capacity: Number of filtered samples kept in :attr:`output`.
+        """
+        self.filters = list(filters)
+        self.detectors = list(detectors)
+        self.calibration = calibration
+        self.output = RingBuffer(capacity)
+        self._lock = threading.Lock()
+
+    def __call__(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """Process a chunk of raw readings."""
+        with self._lock:
+            if self.calibration is not None:
+                values = self.calibration.apply(values, timestamps)
+            for f in self.filters:
+                values = f.process(values)
+            for detector in self.detectors:
+                detector.process(timestamps, values)
+            self.output.extend(timestamps, values)
+
+    def reset(self) -> None:
+        """Reset the filters and the detectors."""
+        with self._lock:
+            for f in self.filters:
+                f.reset()
+            for detector in self.detectors:
+                detector.reset()
+            self.output.clear()
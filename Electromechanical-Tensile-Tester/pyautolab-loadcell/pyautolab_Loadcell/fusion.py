@@ -0,0 +1,239 @@
+"""Module for merging the streams of several devices on a common time base."""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+import numpy as np
+from pyautolab_Loadcell.buffer import RingBuffer
+
+if TYPE_CHECKING:
+    import pyautolab.api as api
+
+_EMPTY = np.empty(0, dtype=np.float64)
+
+
+class MergedSamples(NamedTuple):
+    """Samples of every stream in time order.
+
+    Attributes:
+        timestamps: Monotonic timestamps of the samples.
+        streams: Index of the stream of every sample in :attr:`StreamFusion.names`.
+        values: Values of the samples.
+    """
+
+    timestamps: np.ndarray
+    streams: np.ndarray
+    values: np.ndarray
+
+
+class FusedBatch(NamedTuple):
+    """Samples released by :meth:`StreamFusion.read`.
+
+    Attributes:
+        timestamps: Points of the common time base.
+        columns: Values of every stream interpolated on the time base. NaN outside the samples of the stream.
+        merged: Raw samples of every stream in time order.
+    """
+
+    timestamps: np.ndarray
+    columns: dict[str, np.ndarray]
+    merged: MergedSamples
+
+
+class _Stream:
+    def __init__(self, capacity: int) -> None:
+        self.buffer = RingBuffer(capacity, envelope_buckets=2)
+        self.timestamps = _EMPTY
+        self.values = _EMPTY
+        # Last released sample, which interpolates the start of the next batch.
+        self.carry: tuple[float, float] | None = None
+        self.dropped = 0
+        self.late = 0
+
+    @property
+    def latest(self) -> float | None:
+        if len(self.timestamps):
+            return float(self.timestamps[-1])
+        return None if self.carry is None else self.carry[0]
+
+
+class StreamFusion:
+    """Time alignment of the samples of several devices.
+
+    Every sample is stamped with :func:`time.monotonic`, the clock of :class:`pyautolab_Loadcell.stream.StreamReader`.
+    Samples are pushed from any thread and :meth:`read` releases them once every live stream has reached their
+    timestamp, both as a k-way merge in time order and interpolated on a grid of period ``period``. A stream whose
+    newest sample is older than the newest sample of all streams by more than ``max_lag`` is considered stalled and
+    does not hold the other streams back.
+
+    Memory is bounded by ``capacity`` samples per stream. Samples which do not fit are dropped and counted.
+    """
+
+    def __init__(self, period: float, capacity: int = 100_000, max_lag: float = 1) -> None:
+        """Initialize class.
+
+        Args:
+            period: Seconds between two points of the common time base.
+            capacity: Number of samples held per stream until they are released.
+            max_lag: Seconds after which a silent stream stops holding the other streams back.
+        """
+        if period <= 0:
+            raise ValueError("period must be positive.")
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer.")
+        self.period = period
+        self.capacity = capacity
+        self.max_lag = max_lag
+        self._streams: dict[str, _Stream] = {}
+        self._lock = threading.Lock()
+        self._watermark = -math.inf
+        self._next_tick: int | None = None
+
+    @property
+    def names(self) -> list[str]:
+        """Names of the streams in order of creation."""
+        return list(self._streams)
+
+    @property
+    def dropped(self) -> dict[str, int]:
+        """Number of samples of every stream dropped because the stream was full."""
+        return {name: stream.dropped + stream.buffer.dropped for name, stream in self._streams.items()}
+
+    @property
+    def late(self) -> dict[str, int]:
+        """Number of samples of every stream dropped because they were older than the released samples."""
+        return {name: stream.late for name, stream in self._streams.items()}
+
+    def add_stream(self, name: str) -> None:
+        """Add a stream. Streams are also added by their first sample."""
+        with self._lock:
+            if name not in self._streams:
+                self._streams[name] = _Stream(self.capacity)
+
+    def push(self, name: str, timestamps: float | np.ndarray, values: np.ndarray) -> None:
+        """Add samples to a stream.
+
+        Args:
+            name: Name of the stream.
+            timestamps: Monotonic timestamp of every sample, or one timestamp shared by all of them.
+            values: Values of the samples.
+        """
+        stream = self._streams.get(name)
+        if stream is None:
+            self.add_stream(name)
+            stream = self._streams[name]
+        stream.buffer.extend(timestamps, np.asarray(values, dtype=np.float64))
+
+    def sink(self, name: str) -> Callable[[np.ndarray, np.ndarray], None]:
+        """Return a callable pushing samples to a stream, suitable for :meth:`Loadcell.add_stream_sink`."""
+        self.add_stream(name)
+
+        def push(timestamps: np.ndarray, values: np.ndarray) -> None:
+            self.push(name, timestamps, values)
+
+        return push
+
+    def poll(self, name: str, device: api.Device) -> dict[str, float]:
+        """Measure a device and push every parameter as the stream ``<name>.<parameter>``.
+
+        The sample is stamped with the middle of the call, which is the best estimate of the time of the reading
+        for a query and reply protocol.
+
+        Args:
+            name: Prefix of the streams.
+            device: Device to measure.
+
+        Returns:
+            The result of ``device.measure()``.
+        """
+        start = time.monotonic()
+        result = device.measure()
+        timestamp = (start + time.monotonic()) / 2
+        for parameter, value in result.items():
+            self.push(f"{name}.{parameter}", timestamp, np.array((value,), dtype=np.float64))
+        return result
+
+    def read(self) -> FusedBatch:
+        """Release the samples which every live stream has reached.
+
+        Returns:
+            The released samples. Samples newer than the slowest live stream are kept for the next call.
+        """
+        with self._lock:
+            names, streams = list(self._streams), list(self._streams.values())
+            for stream in streams:
+                self._collect(stream)
+            watermark = self._compute_watermark(streams)
+            if watermark is None or watermark <= self._watermark:
+                return self._empty_batch()
+            if self._next_tick is None:
+                first = min(stream.timestamps[0] for stream in streams if len(stream.timestamps))
+                self._next_tick = math.ceil(first / self.period)
+            last_tick = math.floor(watermark / self.period)
+            grid = np.arange(self._next_tick, last_tick + 1) * self.period
+            self._next_tick = max(self._next_tick, last_tick + 1)
+
+            columns = {}
+            merged_timestamps, merged_streams, merged_values = [], [], []
+            for index, (name, stream) in enumerate(zip(names, streams)):
+                columns[name] = self._interpolate(stream, grid)
+                end = int(np.searchsorted(stream.timestamps, watermark, side="right"))
+                if end == 0:
+                    continue
+                merged_timestamps.append(stream.timestamps[:end])
+                merged_streams.append(np.full(end, index, dtype=np.intp))
+                merged_values.append(stream.values[:end])
+                stream.carry = float(stream.timestamps[end - 1]), float(stream.values[end - 1])
+                stream.timestamps, stream.values = stream.timestamps[end:], stream.values[end:]
+            self._watermark = watermark
+        return FusedBatch(grid, columns, _merge(merged_timestamps, merged_streams, merged_values))
+
+    def _collect(self, stream: _Stream) -> None:
+        timestamps, values = stream.buffer.read_available()
+        if len(timestamps) == 0:
+            return
+        late = int(np.searchsorted(timestamps, self._watermark, side="right"))
+        stream.late += late
+        timestamps = np.concatenate((stream.timestamps, timestamps[late:]))
+        values = np.concatenate((stream.values, values[late:]))
+        if np.any(np.diff(timestamps) < 0):
+            # Samples pushed from several threads may interleave.
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, values = timestamps[order], values[order]
+        overflow = len(timestamps) - self.capacity
+        if overflow > 0:
+            stream.dropped += overflow
+            timestamps, values = timestamps[overflow:], values[overflow:]
+        stream.timestamps, stream.values = timestamps, values
+
+    def _compute_watermark(self, streams: list[_Stream]) -> float | None:
+        latest = [stream.latest for stream in streams if stream.latest is not None]
+        if not latest:
+            return None
+        newest = max(latest)
+        return min(t for t in latest if t >= newest - self.max_lag)
+
+    def _interpolate(self, stream: _Stream, grid: np.ndarray) -> np.ndarray:
+        timestamps, values = stream.timestamps, stream.values
+        if stream.carry is not None:
+            timestamps = np.concatenate(((stream.carry[0],), timestamps))
+            values = np.concatenate(((stream.carry[1],), values))
+        if len(timestamps) == 0:
+            return np.full(len(grid), np.nan)
+        return np.interp(grid, timestamps, values, left=np.nan, right=np.nan)
+
+    def _empty_batch(self) -> FusedBatch:
+        columns = {name: _EMPTY for name in self._streams}
+        return FusedBatch(_EMPTY, columns, MergedSamples(_EMPTY, np.empty(0, dtype=np.intp), _EMPTY))
+
+
+def _merge(timestamps: list[np.ndarray], streams: list[np.ndarray], values: list[np.ndarray]) -> MergedSamples:
+    if not timestamps:
+        return MergedSamples(_EMPTY, np.empty(0, dtype=np.intp), _EMPTY)
+    all_timestamps = np.concatenate(timestamps)
+    # Every run is already sorted, which the stable sort merges in close to linear time.
+    order = np.argsort(all_timestamps, kind="stable")
+    return MergedSamples(all_timestamps[order], np.concatenate(streams)[order], np.concatenate(values)[order])
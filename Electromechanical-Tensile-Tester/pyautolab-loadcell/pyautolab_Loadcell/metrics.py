@@ -0,0 +1,164 @@
+"""Module for serial instrumentation.
+
+It is ``diy_hv._metrics`` with the metric prefix of the plugin, which is distributed without diy_hv.
+tests/test_metrics.py checks that both stay the same.
+"""
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+from pathlib import Path
+
+# Upper bounds in seconds of the latency buckets. At 9600 baud, a byte takes about 1 ms and a reply about 10 ms.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CALLS = ("send", "receive", "query")
+
+
+class Histogram:
+    """Histogram of latencies with fixed buckets."""
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Initialize histogram.
+
+        Args:
+            bounds: Increasing upper bounds of the buckets in seconds. A last bucket without bound is added.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add a latency in seconds."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> list[int]:
+        """Return the number of latencies less than or equal to each bound, ending with the total."""
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+        return counts
+
+
+class SerialMetrics:
+    """Latency and traffic counters of a serial port.
+
+    ``tx``/``rx`` are the directions from the host. A timeout is a read which returned without a complete message,
+    and an empty read is a timeout which returned no byte at all.
+    """
+
+    def __init__(self, prefix: str = "loadcell_serial") -> None:
+        """Initialize metrics.
+
+        Args:
+            prefix: Prefix of the metric names in the Prometheus text format.
+        """
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.latencies = {call: Histogram() for call in CALLS}
+        self.bytes = {"tx": 0, "rx": 0}
+        self.messages = {"tx": 0, "rx": 0}
+        self.timeouts = 0
+        self.empty_reads = 0
+
+    def record_send(self, seconds: float, size: int) -> None:
+        """Record a sent message."""
+        with self._lock:
+            self.latencies["send"].observe(seconds)
+            self.bytes["tx"] += size
+            self.messages["tx"] += 1
+
+    def record_receive(self, seconds: float, size: int, complete: bool) -> None:
+        """Record a read of a message."""
+        with self._lock:
+            self.latencies["receive"].observe(seconds)
+            self.bytes["rx"] += size
+            if complete:
+                self.messages["rx"] += 1
+            else:
+                self.timeouts += 1
+                if size == 0:
+                    self.empty_reads += 1
+
+    def record_query(self, seconds: float) -> None:
+        """Record a query, which also records its send and receive."""
+        with self._lock:
+            self.latencies["query"].observe(seconds)
+
+    def snapshot(self) -> dict:
+        """Return a copy of the metrics as plain values."""
+        with self._lock:
+            return {
+                "latencies": {
+                    call: {
+                        "bounds": list(histogram.bounds),
+                        "counts": list(histogram.counts),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                    }
+                    for call, histogram in self.latencies.items()
+                },
+                "bytes": dict(self.bytes),
+                "messages": dict(self.messages),
+                "timeouts": self.timeouts,
+                "empty_reads": self.empty_reads,
+            }
+
+    def to_prometheus(self, labels: dict[str, str] | None = None) -> str:
+        """Return the metrics in the Prometheus text exposition format.
+
+        Args:
+            labels: Labels added to every sample, such as the port.
+        """
+        base = "".join(f'{key}="{_escape(value)}",' for key, value in (labels or {}).items())
+        name = self.prefix
+        lines = [
+            f"# HELP {name}_call_seconds Latency of serial calls.",
+            f"# TYPE {name}_call_seconds histogram",
+        ]
+        with self._lock:
+            for call, histogram in self.latencies.items():
+                bounds = [repr(bound) for bound in histogram.bounds] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    lines.append(f'{name}_call_seconds_bucket{{{base}call="{call}",le="{bound}"}} {count}')
+                lines.append(f'{name}_call_seconds_sum{{{base}call="{call}"}} {histogram.sum!r}')
+                lines.append(f'{name}_call_seconds_count{{{base}call="{call}"}} {histogram.count}')
+            for metric, values, help_text in (
+                ("bytes", self.bytes, "Bytes transferred."),
+                ("messages", self.messages, "Messages transferred."),
+            ):
+                lines.append(f"# HELP {name}_{metric}_total {help_text}")
+                lines.append(f"# TYPE {name}_{metric}_total counter")
+                for direction, value in values.items():
+                    lines.append(f'{name}_{metric}_total{{{base}direction="{direction}"}} {value}')
+            for metric, value, help_text in (
+                ("timeouts", self.timeouts, "Reads which returned without a complete message."),
+                ("empty_reads", self.empty_reads, "Reads which returned no byte."),
+            ):
+                lines.append(f"# HELP {name}_{metric}_total {help_text}")
+                lines.append(f"# TYPE {name}_{metric}_total counter")
+                lines.append(
+                    f"{name}_{metric}_total{{{base.rstrip(',')}}} {value}"
+                    if base
+                    else f"{name}_{metric}_total {value}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Path, labels: dict[str, str] | None = None) -> None:
+        """Write the metrics to a file in the Prometheus text format.
+
+        The file is replaced atomically, so a collector never reads a partial file.
+        """
+        path = Path(path)
+        temp_path = path.with_name(f"{path.name}.tmp")
+        temp_path.write_text(self.to_prometheus(labels), encoding="utf-8")
+        os.replace(temp_path, path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,216 @@
+"""Module for acquisition of several devices on one thread."""
+from __future__ import annotations
+
+import contextlib
+import os
+import selectors
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+from pyautolab_Loadcell.buffer import RingBuffer
+from pyautolab_Loadcell.parser import FrameParser
+from pyautolab_Loadcell.stream import spread_timestamps
+from serial import Serial, SerialException
+
+
+class Channel:
+    """Device registered to a :class:`LoadcellMultiplexer`.
+
+    It has the interface of :class:`pyautolab_Loadcell.stream.StreamReader`, so a device streams the same way on its
+    own thread or on a multiplexer.
+    """
+
+    def __init__(
+        self, multiplexer: LoadcellMultiplexer, name: str, ser: Serial, buffer: RingBuffer, parser: FrameParser
+    ) -> None:
+        """Initialize class."""
+        self.name = name
+        self.buffer = buffer
+        self._multiplexer = multiplexer
+        self._ser = ser
+        self._parser = parser
+        self._timeout = ser.timeout
+        self._sinks: tuple[Callable[[np.ndarray, np.ndarray], None], ...] = ()
+        self._removed = threading.Event()
+        self._last_read = 0.0
+        self.error: Exception | None = None
+
+    @property
+    def multiplexer(self) -> LoadcellMultiplexer:
+        """Multiplexer reading the channel."""
+        return self._multiplexer
+
+    @property
+    def parse_errors(self) -> int:
+        """Number of frames which could not be parsed."""
+        return self._parser.parse_errors
+
+    def add_sink(self, sink: Callable[[np.ndarray, np.ndarray], None]) -> None:
+        """Register a callable receiving the timestamps and values of every parsed chunk.
+
+        Sinks are called on the thread of the multiplexer, which is shared by every channel, so they must be quick. A
+        sink which raises is removed and its exception is kept in ``error``.
+        """
+        self._sinks = (*self._sinks, sink)
+
+    def remove_sink(self, sink: Callable[[np.ndarray, np.ndarray], None]) -> None:
+        """Unregister a sink."""
+        self._sinks = tuple(s for s in self._sinks if s != sink)
+
+    def decimate(self, width: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the min/max envelope of the readings of the channel."""
+        return self.buffer.decimate(width)
+
+    def start(self) -> None:
+        """Register the channel to the multiplexer."""
+        self._multiplexer._request(self._register)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Unregister the channel and wait until the multiplexer no longer reads its port."""
+        self._multiplexer._request(self._unregister)
+        if threading.current_thread() is not self._multiplexer:
+            self._removed.wait(timeout)
+
+    def _register(self, selector: selectors.BaseSelector) -> None:
+        try:
+            selector.register(self._ser.fileno(), selectors.EVENT_READ, self)
+        except (SerialException, OSError, TypeError, ValueError) as e:
+            self.error = e
+            self._removed.set()
+            return
+        # Reads must not block the other channels.
+        self._ser.timeout = 0
+        self._last_read = time.monotonic()
+        self._multiplexer._channels[self.name] = self
+
+    def _unregister(self, selector: selectors.BaseSelector) -> None:
+        if self._multiplexer._channels.get(self.name) is self:
+            del self._multiplexer._channels[self.name]
+            selector.unregister(self._ser.fileno())
+            # The port of an unplugged device cannot be configured, which must not stop the other channels.
+            with contextlib.suppress(SerialException, OSError):
+                self._ser.timeout = self._timeout
+        self._removed.set()
+
+    def _read(self, selector: selectors.BaseSelector, waited: float) -> None:
+        # The port is read when it has data, so after a pause the bytes arrived once the loop started waiting at
+        # ``waited``, not right after the previous read.
+        try:
+            received = self._parser.readinto(self._ser)
+        except (SerialException, OSError) as e:
+            self.error = e
+            self._unregister(selector)
+            return
+        previous_read, self._last_read = max(self._last_read, waited), time.monotonic()
+        if received == 0:
+            return
+        values = self._parser.parse()
+        if len(values) == 0:
+            return
+        timestamps = spread_timestamps(previous_read, self._last_read, len(values))
+        self.buffer.extend(timestamps, values)
+        for sink in self._sinks:
+            try:
+                sink(timestamps, values)
+            except Exception as e:
+                # A failing sink is removed, so it does not stop the acquisition of the other sinks and devices.
+                self.error = e
+                self.remove_sink(sink)
+
+
+class LoadcellMultiplexer(threading.Thread):
+    """Thread reading the ports of many devices with one ``selectors`` event loop.
+
+    Each port is read only when it has data, so the cost grows with the amount of data instead of the number of
+    devices, and one thread sustains dozens of ports. Ports need a file descriptor, so the multiplexer is only
+    available on POSIX systems.
+    """
+
+    _shared: LoadcellMultiplexer | None = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        """Initialize class."""
+        super().__init__(name="LoadcellMultiplexer", daemon=True)
+        if os.name != "posix":
+            raise RuntimeError("The multiplexer needs serial ports with file descriptors, which only POSIX has.")
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._requests: list[Callable[[selectors.BaseSelector], None]] = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._channels: dict[str, Channel] = {}
+
+    @classmethod
+    def shared(cls) -> LoadcellMultiplexer:
+        """Return the multiplexer shared by the devices of the application, starting it on first use."""
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared.is_alive():
+                cls._shared = cls()
+                cls._shared.start()
+            return cls._shared
+
+    @property
+    def channels(self) -> dict[str, Channel]:
+        """Registered channels by name."""
+        return dict(self._channels)
+
+    def channel(self, name: str, ser: Serial, buffer: RingBuffer, parser: FrameParser) -> Channel:
+        """Create a channel reading a port. It is read once started.
+
+        Args:
+            name: Name of the channel, such as the port.
+            ser: Open serial port of the device.
+            buffer: Ring buffer receiving the readings.
+            parser: Parser of the readings of the device.
+        """
+        return Channel(self, name, ser, buffer, parser)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop the thread and wait for it to finish."""
+        self._stop_event.set()
+        self._wake()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self) -> None:
+        """Override Thread class."""
+        try:
+            while not self._stop_event.is_set():
+                waited = time.monotonic()
+                for key, _ in self._selector.select():
+                    if key.data is None:
+                        self._handle_requests()
+                    elif self._channels.get(key.data.name) is key.data:
+                        # A request earlier in the same batch may have removed the channel and its port been closed.
+                        key.data._read(self._selector, waited)
+        finally:
+            for channel in list(self._channels.values()):
+                channel._unregister(self._selector)
+            self._selector.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            # Later wake-ups must not write to a reused descriptor.
+            self._wake_w = -1
+
+    def _request(self, request: Callable[[selectors.BaseSelector], None]) -> None:
+        with self._lock:
+            self._requests.append(request)
+        self._wake()
+
+    def _wake(self) -> None:
+        with contextlib.suppress(OSError):
+            os.write(self._wake_w, b"\0")
+
+    def _handle_requests(self) -> None:
+        with contextlib.suppress(BlockingIOError):
+            while os.read(self._wake_r, 4096):
+                pass
+        with self._lock:
+            requests, self._requests = self._requests, []
+        for request in requests:
+            request(self._selector)
@@ -0,0 +1,109 @@
+"""Module for parsing readings in bulk."""
+from __future__ import annotations
+
+import numpy as np
+from serial import Serial
+
+
+class FrameParser:
+    """Parser decoding delimited ASCII readings into a float array.
+
+    Received bytes are stored in a reusable buffer, and every complete frame is decoded straight from it into a
+    preallocated array of readings, so parsing allocates no buffer or array.
+    """
+
+    def __init__(self, capacity: int = 1 << 16, delimiter: bytes = b"\r\n") -> None:
+        """Initialize class.
+
+        Args:
+            capacity: Size of the receive buffer in bytes.
+            delimiter: Delimiter terminating every frame. It must consist of whitespaces.
+        """
+        if delimiter.strip():
+            raise ValueError("delimiter must consist of whitespaces.")
+        self._delimiter = delimiter
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        # A reading takes at least one character and the delimiter, which bounds the readings of a full buffer.
+        self._values = np.empty(capacity // (len(delimiter) + 1), dtype=np.float64)
+        self._size = 0
+        self.parse_errors = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered bytes which have not been parsed yet."""
+        return self._size
+
+    def feed(self, data: bytes) -> None:
+        """Append received bytes to the buffer."""
+        view = memoryview(data)
+        while len(view) > 0:
+            free = len(self._buffer) - self._size
+            if free == 0:
+                self._discard_overflow()
+                continue
+            n = min(free, len(view))
+            self._view[self._size : self._size + n] = view[:n]
+            self._size += n
+            view = view[n:]
+
+    def readinto(self, ser: Serial) -> int:
+        """Read the available bytes of the serial port directly into the buffer.
+
+        At least one byte is waited for, so the call blocks for up to the timeout of the port when nothing has
+        arrived.
+
+        Returns:
+            Number of bytes read.
+        """
+        if self._size == len(self._buffer):
+            self._discard_overflow()
+        free = len(self._buffer) - self._size
+        n = ser.readinto(self._view[self._size : self._size + min(max(ser.in_waiting, 1), free)])
+        self._size += n or 0
+        return n or 0
+
+    def parse(self) -> np.ndarray:
+        """Decode every complete frame in the buffer.
+
+        Incomplete trailing bytes are kept for the next call. Frames which cannot be parsed are dropped and counted
+        in :attr:`parse_errors`.
+
+        Returns:
+            Readings in order of arrival. The array is a view of an internal buffer which is overwritten by the next
+            call, so copy it if it has to outlive that call.
+        """
+        end = self._buffer.rfind(self._delimiter, 0, self._size)
+        if end == -1:
+            return self._values[:0]
+        end += len(self._delimiter)
+        count = self._decode(end)
+
+        rest = self._size - end
+        self._view[:rest] = self._view[end : self._size]
+        self._size = rest
+        return self._values[:count]
+
+    def clear(self) -> None:
+        """Discard buffered bytes."""
+        self._size = 0
+
+    def _discard_overflow(self) -> None:
+        # The buffer is full without a single delimiter, so its content cannot be a valid frame.
+        self.parse_errors += 1
+        self._size = 0
+
+    def _decode(self, end: int) -> int:
+        # float() parses the bytes of each frame through the view, without copying them.
+        count = 0
+        start = 0
+        while start < end:
+            stop = self._buffer.find(self._delimiter, start, end)
+            try:
+                self._values[count] = float(self._view[start:stop])
+            except ValueError:
+                self.parse_errors += 1
+            else:
+                count += 1
+            start = stop + len(self._delimiter)
+        return count
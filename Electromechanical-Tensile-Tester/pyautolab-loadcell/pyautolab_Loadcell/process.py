@@ -0,0 +1,293 @@
+"""Module for acquisition in a child process."""
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+from pyautolab_Loadcell.buffer import envelope
+from pyautolab_Loadcell.capture import CaptureSerial
+from pyautolab_Loadcell.parser import FrameParser
+from pyautolab_Loadcell.stream import spread_timestamps
+from serial import SerialException
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None  # type: ignore
+
+# Slots of the int64 header of the shared memory.
+_TOTAL, _PARSE_ERRORS, _HEARTBEAT_NS, _PID = range(4)
+_HEADER_SIZE = 8
+
+
+class SharedRingBuffer:
+    """Ring buffer of timestamped samples in shared memory, with one writing and one reading process.
+
+    The writer copies the samples into the ring before publishing the new total, and writes at most ``guard``
+    samples at once. The reader checks the total again after copying, so samples overwritten while they were read
+    are discarded and counted as dropped instead of being returned torn. Readings never cross a pipe or a pickle.
+    """
+
+    def __init__(self, capacity: int, name: str | None = None) -> None:
+        """Initialize class.
+
+        Args:
+            capacity: Number of samples held by the ring.
+            name: Name of an existing ring to attach to. A new ring is created if None.
+        """
+        if shared_memory is None:
+            raise RuntimeError("Shared memory needs Python 3.8 or later.")
+        if capacity < 16:
+            raise ValueError("capacity must be at least 16.")
+        size = 8 * (_HEADER_SIZE + 2 * capacity)
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size if self._owner else 0)
+        self.capacity = capacity
+        self.guard = capacity // 8
+        self._header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=self._shm.buf)
+        self._timestamps = np.ndarray((capacity,), dtype=np.float64, buffer=self._shm.buf, offset=8 * _HEADER_SIZE)
+        self._values = np.ndarray(
+            (capacity,), dtype=np.float64, buffer=self._shm.buf, offset=8 * (_HEADER_SIZE + capacity)
+        )
+        if self._owner:
+            self._header[:] = 0
+        self._cursor = int(self._header[_TOTAL])
+        self.dropped = 0
+
+    @property
+    def name(self) -> str:
+        """Name of the shared memory, to attach from another process."""
+        return self._shm.name
+
+    @property
+    def total(self) -> int:
+        """Number of samples written since the ring was created."""
+        return int(self._header[_TOTAL])
+
+    @property
+    def parse_errors(self) -> int:
+        """Number of frames the writer could not parse."""
+        return int(self._header[_PARSE_ERRORS])
+
+    @property
+    def heartbeat(self) -> float:
+        """Time of the last loop of the writer on the monotonic clock."""
+        return int(self._header[_HEARTBEAT_NS]) / 1e9
+
+    def __len__(self) -> int:
+        """Return the number of samples which can be read."""
+        return min(self.total, self.capacity - self.guard)
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """Append samples. Only the writing process may call it."""
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), values.shape)
+        total = int(self._header[_TOTAL])
+        for start in range(0, len(values), self.guard):
+            chunk_t, chunk_v = timestamps[start : start + self.guard], values[start : start + self.guard]
+            head = total % self.capacity
+            n = min(len(chunk_v), self.capacity - head)
+            self._timestamps[head : head + n] = chunk_t[:n]
+            self._values[head : head + n] = chunk_v[:n]
+            self._timestamps[: len(chunk_v) - n] = chunk_t[n:]
+            self._values[: len(chunk_v) - n] = chunk_v[n:]
+            total += len(chunk_v)
+            self._header[_TOTAL] = total
+
+    def read_available(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the samples written since the previous call.
+
+        Samples which were overwritten before being read are counted in :attr:`dropped`.
+        """
+        total = self.total
+        start = max(self._cursor, total - (self.capacity - self.guard))
+        self.dropped += start - self._cursor
+        timestamps, values = self._copy(start, total)
+        self._cursor = total
+        return timestamps, values
+
+    def latest(self, timeout: float | None = None) -> tuple[float, float] | None:
+        """Return the newest sample.
+
+        Args:
+            timeout: Seconds to wait for the first sample when the ring is empty.
+        """
+        deadline = time.monotonic() + (timeout or 0)
+        while self.total == 0:
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.001)
+        timestamps, values = self._copy(self.total - 1, self.total)
+        if len(values) == 0:
+            return None
+        return float(timestamps[0]), float(values[0])
+
+    def snapshot(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return a copy of the samples held by the ring in time order."""
+        total = self.total
+        return self._copy(max(total - (self.capacity - self.guard), 0), total)
+
+    def decimate(self, width: int) -> tuple[np.ndarray, np.ndarray]:
+        """Return the min/max envelope of the samples held by the ring.
+
+        Unlike :meth:`pyautolab_Loadcell.buffer.RingBuffer.decimate`, it only covers the samples held by the ring.
+        """
+        return envelope(*self.snapshot(), width)
+
+    def close(self) -> None:
+        """Detach from the shared memory, and free it if this ring created it."""
+        del self._header, self._timestamps, self._values
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def _copy(self, start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+        indices = np.arange(start, stop) % self.capacity
+        timestamps, values = self._timestamps[indices], self._values[indices]
+        # Slots of samples older than this may have been reused by the writer during the copy.
+        oldest = self.total + self.guard - self.capacity
+        if oldest > start:
+            torn = min(oldest - start, stop - start)
+            self.dropped += torn
+            timestamps, values = timestamps[torn:], values[torn:]
+        return timestamps, values
+
+    def _set(self, slot: int, value: int) -> None:
+        self._header[slot] = value
+
+
+def _acquire(
+    name: str,
+    capacity: int,
+    port: str,
+    baudrate: int,
+    start_message: bytes | None,
+    stop_event: multiprocessing.synchronize.Event,
+) -> None:
+    # Entry point of the child process. Only the parser and the serial port are imported, not Qt.
+    ring = SharedRingBuffer(capacity, name)
+    ring._set(_PID, multiprocessing.current_process().pid or 0)
+    ser = CaptureSerial()
+    ser.port = port
+    ser.baudrate = baudrate
+    ser.timeout = 0.1
+    parser = FrameParser()
+    try:
+        ser.open()
+        ser.reset_input_buffer()
+        if start_message is not None:
+            ser.write(start_message)
+        last_read = time.monotonic()
+        while not stop_event.is_set():
+            ring._set(_HEARTBEAT_NS, time.monotonic_ns())
+            received = parser.readinto(ser)
+            previous_read, last_read = last_read, time.monotonic()
+            if received == 0:
+                continue
+            values = parser.parse()
+            ring._set(_PARSE_ERRORS, parser.parse_errors)
+            if len(values):
+                ring.extend(spread_timestamps(previous_read, last_read, len(values)), values)
+    except SerialException:
+        raise SystemExit(1) from None
+    finally:
+        ser.close()
+        ring.close()
+
+
+class ProcessReader:
+    """Child process parsing the readings of the device into a :class:`SharedRingBuffer`.
+
+    The process is started with the ``spawn`` method, which is safe with the threads of a Qt application. A
+    watchdog thread starts it again when it dies, or kills and starts it again when its heartbeat stops, such as
+    when it hangs in a read of the port. The ring keeps the samples written before.
+    """
+
+    def __init__(
+        self,
+        port: str,
+        baudrate: int,
+        buffer: SharedRingBuffer,
+        start_message: bytes | None = None,
+        restart_interval: float = 1,
+        heartbeat_timeout: float = 5,
+    ) -> None:
+        """Initialize class.
+
+        Args:
+            port: Serial port of the device. It must not be open in this process.
+            baudrate: Baudrate of the device.
+            buffer: Ring receiving the readings.
+            start_message: Bytes written when the port is opened, to switch the firmware into streaming mode.
+            restart_interval: Seconds between checks of the child, and so between restarts.
+            heartbeat_timeout: Seconds without a heartbeat, counted from the start of the child, before it is killed.
+        """
+        self._args = (buffer.name, buffer.capacity, port, baudrate, start_message)
+        self._buffer = buffer
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._process: multiprocessing.process.BaseProcess | None = None
+        self._watchdog: threading.Thread | None = None
+        self._watchdog_stop = threading.Event()
+        self._restart_interval = restart_interval
+        self._heartbeat_timeout = heartbeat_timeout
+        self._spawned = 0.0
+        self.restarts = 0
+        self.exitcode: int | None = None
+
+    @property
+    def parse_errors(self) -> int:
+        """Number of frames which could not be parsed."""
+        return self._buffer.parse_errors
+
+    @property
+    def overruns(self) -> int:
+        """Number of samples overwritten before they were read."""
+        return self._buffer.dropped
+
+    def is_alive(self) -> bool:
+        """Return whether the child process is running."""
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> None:
+        """Start the child process and its watchdog."""
+        self._spawn()
+        self._watchdog = threading.Thread(target=self._watch, name="LoadcellProcessWatchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop the child process and wait for it to finish. It is killed if it does not stop in time."""
+        self._watchdog_stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+        self._stop_event.set()
+        if self._process is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+            self.exitcode = self._process.exitcode
+            self._process = None
+
+    def _spawn(self) -> None:
+        self._spawned = time.monotonic()
+        self._process = self._context.Process(
+            target=_acquire, args=(*self._args, self._stop_event), name="LoadcellProcessReader", daemon=True
+        )
+        self._process.start()
+
+    def _watch(self) -> None:
+        while not self._watchdog_stop.wait(self._restart_interval):
+            if self._process is None:
+                continue
+            # A new child has not written a heartbeat yet, so it is given the timeout from its start.
+            beat = max(self._buffer.heartbeat, self._spawned)
+            if self._process.is_alive() and time.monotonic() - beat > self._heartbeat_timeout:
+                self._process.kill()
+                self._process.join()
+            if not self._process.is_alive():
+                self.exitcode = self._process.exitcode
+                self.restarts += 1
+                self._spawn()
@@ -0,0 +1,193 @@
+"""Module for recording samples to disk."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+_INDEX_FILE_NAME = "index.json"
+_INDEX_VERSION = 1
+
+
+def _segment_name(number: int) -> str:
+    return f"{number:06d}.npy"
+
+
+def _load_index(path: Path) -> tuple[int, list[dict]]:
+    index = json.loads((path / _INDEX_FILE_NAME).read_text())
+    if index.get("version") != _INDEX_VERSION:
+        raise ValueError(f"Unsupported recording version: {index.get('version')}")
+    chunk_size: int = index["chunk_size"]
+    segments: list[dict] = []
+    for segment in index["segments"]:
+        try:
+            data = np.load(path / segment["file"], mmap_mode="r")
+        except (OSError, ValueError):
+            break
+        if data.shape != (2, chunk_size) or segment["count"] > chunk_size:
+            break
+        segments.append(segment)
+    return chunk_size, segments
+
+
+class ColumnarRecorder:
+    """Crash-safe recorder of timestamped samples.
+
+    Samples are written into memory-mapped ``.npy`` segments of ``chunk_size`` samples. Every segment holds the
+    timestamps and the values as two contiguous rows. ``index.json`` lists the segments and the number of valid
+    samples of each one. It is replaced atomically after the segments are flushed, so a recording which was cut off
+    by a crash reopens with every sample flushed before the crash.
+    """
+
+    def __init__(self, path: str | os.PathLike, chunk_size: int = 1 << 16, flush_interval: float = 1) -> None:
+        """Initialize class.
+
+        An existing recording at ``path`` is reopened and appended to.
+
+        Args:
+            path: Directory of the recording.
+            chunk_size: Number of samples per segment. Ignored when an existing recording is reopened.
+            flush_interval: Seconds between background flushes. Flushes only happen on :meth:`flush` if it is 0.
+        """
+        self._path = Path(path)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments: list[dict] = []
+        self._segment: np.memmap | None = None
+        self._chunk_size = chunk_size
+        if (self._path / _INDEX_FILE_NAME).exists():
+            self._chunk_size, self._segments = _load_index(self._path)
+        if self._segments and self._segments[-1]["count"] < self._chunk_size:
+            self._segment = np.load(self._path / self._segments[-1]["file"], mmap_mode="r+")
+        self._write_index()
+
+        self._stop_event = threading.Event()
+        self._flush_thread: threading.Thread | None = None
+        if flush_interval > 0:
+            self._flush_thread = threading.Thread(
+                target=self._flush_periodically, args=(flush_interval,), name="LoadcellRecorderFlush", daemon=True
+            )
+            self._flush_thread.start()
+
+    @property
+    def path(self) -> Path:
+        """Directory of the recording."""
+        return self._path
+
+    def __len__(self) -> int:
+        """Return the number of recorded samples."""
+        return sum(segment["count"] for segment in self._segments)
+
+    def append(self, timestamps: float | np.ndarray, values: np.ndarray) -> None:
+        """Append samples.
+
+        The samples are copied into the memory-mapped segments and become durable on the next flush.
+
+        Args:
+            timestamps: Timestamp of every sample, or one timestamp shared by all of them.
+            values: Values of the samples.
+        """
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), values.shape)
+        with self._lock:
+            while len(values) > 0:
+                if self._segment is None:
+                    self._new_segment()
+                segment = self._segments[-1]
+                start = segment["count"]
+                n = min(self._chunk_size - start, len(values))
+                self._segment[0, start : start + n] = timestamps[:n]  # type: ignore
+                self._segment[1, start : start + n] = values[:n]  # type: ignore
+                segment["count"] += n
+                timestamps, values = timestamps[n:], values[n:]
+                if segment["count"] == self._chunk_size:
+                    self._segment.flush()  # type: ignore
+                    self._segment = None
+
+    def flush(self) -> None:
+        """Write the samples to disk and update the index."""
+        with self._lock:
+            if self._segment is not None:
+                self._segment.flush()
+            self._write_index()
+
+    def close(self) -> None:
+        """Stop background flushes and flush the remaining samples."""
+        self._stop_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+        self.flush()
+        self._segment = None
+
+    def _new_segment(self) -> None:
+        name = _segment_name(len(self._segments))
+        self._segment = np.lib.format.open_memmap(
+            self._path / name, mode="w+", dtype=np.float64, shape=(2, self._chunk_size)
+        )
+        # Publish the segment before writing to it, so that the index never refers to a missing file.
+        self._segments.append({"file": name, "count": 0})
+        self._write_index()
+
+    def _write_index(self) -> None:
+        index = {"version": _INDEX_VERSION, "chunk_size": self._chunk_size, "segments": self._segments}
+        temp_path = self._path / f"{_INDEX_FILE_NAME}.tmp"
+        with temp_path.open("w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path / _INDEX_FILE_NAME)
+
+    def _flush_periodically(self, interval: float) -> None:
+        while not self._stop_event.wait(interval):
+            self.flush()
+
+
+class Recording:
+    """Read-only view of a recording written by :class:`ColumnarRecorder`."""
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        """Initialize class.
+
+        Args:
+            path: Directory of the recording.
+        """
+        self._path = Path(path)
+        chunk_size, segments = _load_index(self._path)
+        self._chunk_size = chunk_size
+        self._segments = [
+            np.load(self._path / segment["file"], mmap_mode="r")[:, : segment["count"]] for segment in segments
+        ]
+
+    def __len__(self) -> int:
+        """Return the number of recorded samples."""
+        return sum(segment.shape[1] for segment in self._segments)
+
+    def segments(self) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Return memory-mapped timestamps and values of every segment without copying."""
+        return [(segment[0], segment[1]) for segment in self._segments]
+
+    def read(self, start: int = 0, stop: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Return the timestamps and values of a range of samples.
+
+        A range inside one segment is returned as memory-mapped views without copying. A range spanning several
+        segments is copied into new arrays.
+
+        Args:
+            start: Index of the first sample.
+            stop: Index after the last sample. All samples up to the end are returned if None.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        parts = []
+        offset = 0
+        for segment in self._segments:
+            count = segment.shape[1]
+            if offset + count > start and offset < stop:
+                parts.append(segment[:, max(start - offset, 0) : min(stop - offset, count)])
+            offset += count
+        if not parts:
+            return np.empty(0), np.empty(0)
+        data = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=1)
+        return data[0], data[1]
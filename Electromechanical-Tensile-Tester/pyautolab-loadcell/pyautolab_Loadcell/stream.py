@@ -0,0 +1,88 @@
+"""Module for continuous acquisition."""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+from pyautolab_Loadcell.buffer import RingBuffer
+from pyautolab_Loadcell.parser import FrameParser
+from serial import Serial, SerialException
+
+
+def spread_timestamps(start: float, stop: float, count: int) -> np.ndarray:
+    """Return the timestamps of the samples of a chunk, evenly spaced between two reads.
+
+    The samples were received after the previous read returned at ``start`` and by the current one at ``stop``, so
+    the last sample is stamped ``stop`` and the timestamps stay increasing across chunks.
+
+    Args:
+        start: Time the previous read returned on the monotonic clock.
+        stop: Time the current read returned on the monotonic clock.
+        count: Number of samples of the chunk.
+    """
+    return start + (stop - start) * np.arange(1, count + 1) / count
+
+
+class StreamReader(threading.Thread):
+    """Background thread parsing readings pushed by the device into a :class:`RingBuffer`."""
+
+    def __init__(self, ser: Serial, buffer: RingBuffer, parser: FrameParser) -> None:
+        """Initialize class."""
+        super().__init__(name="LoadcellStreamReader", daemon=True)
+        self._ser = ser
+        self._buffer = buffer
+        self._parser = parser
+        self._stop_event = threading.Event()
+        self._sinks: tuple[Callable[[np.ndarray, np.ndarray], None], ...] = ()
+        self.error: Exception | None = None
+
+    @property
+    def parse_errors(self) -> int:
+        """Number of frames which could not be parsed."""
+        return self._parser.parse_errors
+
+    def add_sink(self, sink: Callable[[np.ndarray, np.ndarray], None]) -> None:
+        """Register a callable receiving the timestamps and values of every parsed chunk.
+
+        Sinks are called on the reader thread after the ring buffer has been updated. A sink which raises is removed
+        and its exception is kept in ``error``.
+        """
+        self._sinks = (*self._sinks, sink)
+
+    def remove_sink(self, sink: Callable[[np.ndarray, np.ndarray], None]) -> None:
+        """Unregister a sink."""
+        self._sinks = tuple(s for s in self._sinks if s != sink)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop the thread and wait for it to finish."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self) -> None:
+        """Override Thread class."""
+        last_read = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                received = self._parser.readinto(self._ser)
+            except SerialException as e:
+                self.error = e
+                break
+            # Empty reads also count, so the first chunk after a pause is not spread over the pause.
+            previous_read, last_read = last_read, time.monotonic()
+            if received == 0:
+                continue
+            values = self._parser.parse()
+            if len(values) == 0:
+                continue
+            timestamps = spread_timestamps(previous_read, last_read, len(values))
+            self._buffer.extend(timestamps, values)
+            for sink in self._sinks:
+                try:
+                    sink(timestamps, values)
+                except Exception as e:
+                    # A failing sink is removed, so it does not stop the acquisition of the other sinks and devices.
+                    self.error = e
+                    self.remove_sink(sink)
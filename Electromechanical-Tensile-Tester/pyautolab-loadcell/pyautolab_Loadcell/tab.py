@@ -1,9 +1,12 @@
 """Module for pyautolab tab."""
 from __future__ import annotations
 
+import pyqtgraph as pg
 from pyautolab import api
 from pyautolab_Loadcell.driver import PARAMETER, Loadcell
 
+_PLOT_INTERVAL_MS = 100
+
 
 class TabLoadcell(api.DeviceTab):
     """Device tab for loadcell."""
@@ -11,16 +14,72 @@ class TabLoadcell(api.DeviceTab):
     def __init__(self, device: Loadcell) -> None:
         """Initialize class."""
         super().__init__(device)
+        self._device = device
         self._ui = _TabUI()
         self._ui.setup_ui(self)
         self._ui._set_zero_button.clicked.connect(device.fix_zero)  # type: ignore
 
+        self._plot_timer = pg.QtCore.QTimer(self)
+        self._plot_timer.timeout.connect(self._update_plot)  # type: ignore
+        self._plot_timer.start(_PLOT_INTERVAL_MS)
+
     def get_parameters(self) -> dict[str, str]:
         """Override Device class."""
         return PARAMETER
 
+    def _update_plot(self) -> None:
+        # Only the min/max envelope is drawn, so a refresh costs O(plot width) however long the run is.
+        if not self._device.is_streaming or not self._ui._plot.isVisible():
+            return
+        width = self._ui._plot.width()
+        channel = self._device.channel
+        if channel is None:
+            self._ui.remove_channel_curves(set())
+            timestamps, tensions = self._device.decimate(width)
+            if len(timestamps) > 0:
+                self._ui._curve.setData(timestamps - timestamps[0], tensions)
+            return
+        # A multiplexed device shows every channel of its multiplexer on a common time axis.
+        envelopes = {name: other.decimate(width) for name, other in channel.multiplexer.channels.items()}
+        starts = [timestamps[0] for timestamps, _ in envelopes.values() if len(timestamps) > 0]
+        if not starts:
+            return
+        origin = min(starts)
+        for name, (timestamps, tensions) in envelopes.items():
+            curve = self._ui.channel_curve(name, is_own=name == channel.name)
+            curve.setData(timestamps - origin, tensions)
+        self._ui.remove_channel_curves(set(envelopes))
+
 
 class _TabUI:
     def setup_ui(self, parent) -> None:
         self._set_zero_button = api.qt_helpers.create_push_button(text="Fix Zero")
-        api.qt_helpers.create_v_box_layout([self._set_zero_button], parent)
+        self._plot = pg.PlotWidget()
+        self._plot.setLabel("bottom", "Time", units="s")
+        self._plot.setLabel("left", "Tension", units=PARAMETER["Tension"])
+        self._curve = self._plot.plot()
+        self._channel_curves: dict[str, pg.PlotDataItem] = {}
+        api.qt_helpers.create_v_box_layout([self._set_zero_button, self._plot], parent)
+
+    def channel_curve(self, name: str, is_own: bool) -> pg.PlotDataItem:
+        curve = self._channel_curves.get(name)
+        if curve is None:
+            if not self._channel_curves:
+                self._plot.removeItem(self._curve)
+                self._plot.addLegend()
+            pen = pg.mkPen(pg.intColor(len(self._channel_curves)), width=2 if is_own else 1)
+            curve = self._plot.plot(name=name, pen=pen)
+            self._channel_curves[name] = curve
+        return curve
+
+    def remove_channel_curves(self, keep: set[str]) -> None:
+        if not self._channel_curves:
+            return
+        legend = self._plot.getPlotItem().legend
+        for name in set(self._channel_curves) - keep:
+            curve = self._channel_curves.pop(name)
+            self._plot.removeItem(curve)
+            if legend is not None:
+                legend.removeItem(curve)
+        if not self._channel_curves:
+            self._plot.addItem(self._curve)
@@ -0,0 +1,141 @@
+"""Tests of the asyncio controller of diy_hv against the firmware emulator."""
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("termios")
+
+from diy_hv._aio import AsyncHighVoltageController  # noqa: E402
+from diy_hv._capture import RECEIVED, SENT, CaptureFile  # noqa: E402
+from diy_hv._device import Frame, decode_frame, encode_frame  # noqa: E402
+from serial import SerialException  # noqa: E402
+
+from tools.emulator import VoltageControllerEmulator  # noqa: E402
+
+# Runs the firmware 500 times faster than the device: the 3 s setup takes 6 ms and the 1 s banner interval 2 ms.
+_TIME_SCALE = 0.002
+
+
+async def _wait_until(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def test_send_reaches_firmware() -> None:
+    async def run(emulator: VoltageControllerEmulator) -> None:
+        async with AsyncHighVoltageController(emulator.port) as device:
+            assert await _wait_until(lambda: emulator.is_ready)
+            await device.send("c")
+            assert await _wait_until(lambda: emulator.pwm == 255)
+
+    with VoltageControllerEmulator(time_scale=_TIME_SCALE) as emulator:
+        asyncio.run(run(emulator))
+
+
+def test_query_returns_reply() -> None:
+    async def run(emulator: VoltageControllerEmulator) -> str:
+        async with AsyncHighVoltageController(emulator.port) as device:
+            return await device.query(encode_frame(Frame(1, "H", ())).decode("ascii"))
+
+    # The banner is printed after the 3 s setup, so the acknowledgement is the only reply before it.
+    with VoltageControllerEmulator() as emulator:
+        reply = asyncio.run(run(emulator))
+    assert decode_frame(reply.encode("ascii")) == Frame(1, "A", ())
+
+
+def test_query_skips_banner() -> None:
+    async def run(emulator: VoltageControllerEmulator) -> list:
+        async with AsyncHighVoltageController(emulator.port) as device:
+            assert await _wait_until(lambda: emulator.is_ready)
+            replies = []
+            for seq in range(1, 11):
+                # The banner is printed every 2 ms, so it often comes before the reply.
+                await asyncio.sleep(0.003)
+                reply = await device.query(encode_frame(Frame(seq, "H", ())).decode("ascii"))
+                replies.append(decode_frame(reply.encode("ascii")))
+            return replies
+
+    with VoltageControllerEmulator(time_scale=_TIME_SCALE) as emulator:
+        replies = asyncio.run(run(emulator))
+    assert replies == [Frame(seq, "A", ()) for seq in range(1, 11)]
+
+
+def test_traffic_is_captured_and_measured(tmp_path) -> None:
+    query = encode_frame(Frame(1, "H", ())).decode("ascii")
+
+    async def run(emulator: VoltageControllerEmulator) -> None:
+        async with AsyncHighVoltageController(emulator.port) as device:
+            metrics = device.enable_metrics()
+            device.start_capture(str(tmp_path / "run.cap"))
+            assert await _wait_until(lambda: emulator.is_ready)
+            await device.send("c")
+            await device.query(query)
+            device.stop_capture()
+            assert metrics.messages["tx"] == 2
+            assert metrics.messages["rx"] >= 1
+            assert metrics.latencies["query"].count == 1
+
+    with VoltageControllerEmulator(time_scale=_TIME_SCALE) as emulator:
+        asyncio.run(run(emulator))
+    capture = CaptureFile(tmp_path / "run.cap")
+    try:
+        records = [(int(capture.directions[i]), capture.data(i)) for i in range(len(capture))]
+    finally:
+        capture.close()
+    sent = b"".join(data for direction, data in records if direction == SENT)
+    received = b"".join(data for direction, data in records if direction == RECEIVED)
+    assert sent == f"c\r\n{query}\r\n".encode("ascii")
+    assert b"$1,A*" in received
+
+
+def test_one_loop_drives_many_controllers() -> None:
+    emulators = [VoltageControllerEmulator(time_scale=_TIME_SCALE) for _ in range(5)]
+
+    async def drive(emulator: VoltageControllerEmulator) -> None:
+        async with AsyncHighVoltageController(emulator.port) as device:
+            assert await _wait_until(lambda: emulator.is_ready)
+            await device.send("b")
+            assert await _wait_until(lambda: emulator.pwm == 100)
+
+    async def run() -> None:
+        await asyncio.gather(*(drive(emulator) for emulator in emulators))
+
+    for emulator in emulators:
+        emulator.start()
+    try:
+        asyncio.run(run())
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+    assert all(emulator.executed[-1].command == b"b" for emulator in emulators)
+
+
+def test_query_times_out_without_reply() -> None:
+    async def run(emulator: VoltageControllerEmulator) -> None:
+        async with AsyncHighVoltageController(emulator.port) as device:
+            # The setup of the firmware takes 3 s, so nothing is replied yet.
+            with pytest.raises(asyncio.TimeoutError):
+                await device.query("c", timeout=0.1)
+            # The controller stays usable after a timeout.
+            await device.send("v")
+
+    with VoltageControllerEmulator() as emulator:
+        asyncio.run(run(emulator))
+
+
+def test_disconnect_fails_pending_query() -> None:
+    async def run(emulator: VoltageControllerEmulator) -> None:
+        async with AsyncHighVoltageController(emulator.port) as device:
+            query = asyncio.ensure_future(device.query("c", timeout=5))
+            await asyncio.sleep(0.05)
+            emulator.disconnect()
+            with pytest.raises(SerialException):
+                await query
+
+    with VoltageControllerEmulator() as emulator:
+        asyncio.run(run(emulator))
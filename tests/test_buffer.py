@@ -0,0 +1,97 @@
+"""Tests of the sample buffers of the load cell."""
+import math
+import threading
+import time
+
+import numpy as np
+import pytest
+
+buffer = pytest.importorskip("pyautolab_Loadcell.buffer")
+
+
+def test_ring_keeps_latest_samples_in_order() -> None:
+    ring = buffer.RingBuffer(4)
+    ring.extend(np.arange(3.0), np.arange(3.0))
+    ring.extend(np.arange(3.0, 6.0), np.arange(3.0, 6.0))
+    timestamps, values = ring.snapshot()
+    assert values.tolist() == [2, 3, 4, 5]
+    assert timestamps.tolist() == values.tolist()
+    assert ring.latest() == (5.0, 5.0)
+
+
+def test_ring_counts_unread_overwritten_samples() -> None:
+    ring = buffer.RingBuffer(4)
+    ring.extend(0.0, np.arange(6.0))
+    assert ring.read_available()[1].tolist() == [2, 3, 4, 5]
+    assert ring.dropped == 2
+    ring.append(1.0, 6.0)
+    assert ring.read_available()[1].tolist() == [6]
+    assert ring.dropped == 2
+
+
+def test_latest_waits_for_first_sample() -> None:
+    ring = buffer.RingBuffer(4)
+    assert ring.latest(timeout=0) is None
+    threading.Timer(0.05, ring.append, (1.0, 2.0)).start()
+    assert ring.latest(timeout=2) == (1.0, 2.0)
+
+
+def test_envelope_keeps_spikes_of_whole_stream() -> None:
+    envelope = buffer.MinMaxEnvelope(buckets=64)
+    timestamps = np.arange(100_000, dtype=np.float64)
+    values = np.sin(timestamps / 1000)
+    values[12_345] = 10
+    values[87_654] = -10
+    # Chunks of odd sizes leave partial buckets between calls.
+    for start in range(0, len(values), 999):
+        envelope.extend(timestamps[start : start + 999], values[start : start + 999])
+    t, v = envelope.decimate(16)
+    assert len(v) <= 32
+    assert v.max() == 10
+    assert t[v.argmax()] == 12_345
+    assert v.min() == -10
+    assert t[v.argmin()] == 87_654
+    assert np.all(np.diff(t) >= 0)
+
+
+def test_ring_envelope_covers_overwritten_samples() -> None:
+    ring = buffer.RingBuffer(100, envelope_buckets=16)
+    ring.append(0.0, 50.0)
+    ring.extend(np.arange(1.0, 1001.0), np.zeros(1000))
+    _, values = ring.decimate(8)
+    assert values.max() == 50
+    assert ring.snapshot()[1].max() == 0
+
+
+def test_envelope_of_array_matches_buckets() -> None:
+    t, v = buffer.envelope(np.arange(6.0), np.array([1.0, 3, 2, -1, 5, 0]), 2)
+    assert t.tolist() == [0, 1, 3, 4]
+    assert v.tolist() == [1, 3, -1, 5]
+
+
+def test_stream_envelope_follows_emulated_load() -> None:
+    pytest.importorskip("termios")
+    from pyautolab_Loadcell.parser import FrameParser
+    from pyautolab_Loadcell.stream import StreamReader
+    from serial import Serial
+
+    from tools.emulator import LoadcellEmulator
+
+    ring = buffer.RingBuffer(100, envelope_buckets=64)
+    with LoadcellEmulator(load=lambda t: 100 * math.sin(2 * math.pi * 5 * t), stream_interval=0.001) as emulator:
+        ser = Serial(emulator.port, 9600, timeout=0.1)
+        reader = StreamReader(ser, ring, FrameParser())
+        origin = time.monotonic()
+        reader.start()
+        try:
+            deadline = origin + 5
+            while ring.latest() is None or ring.latest()[0] < origin + 0.5:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        finally:
+            reader.stop(timeout=1)
+            ser.close()
+    # The ring only holds 0.1 s, yet the envelope reaches both peaks of the 5 Hz load.
+    _, values = ring.decimate(32)
+    assert values.max() > 95
+    assert values.min() < -95
@@ -0,0 +1,109 @@
+"""Tests of the host-side calibration of the load cell."""
+import json
+import time
+
+import numpy as np
+import pytest
+
+calibration = pytest.importorskip("pyautolab_Loadcell.calibration")
+
+from pyautolab_Loadcell.recorder import ColumnarRecorder, Recording  # noqa: E402
+
+Calibration = calibration.Calibration
+
+
+def test_fit_recovers_polynomial() -> None:
+    raw = np.array([0.0, 100, 200, 300])
+    fitted = Calibration.fit(raw, 0.5 * raw + 3)
+    np.testing.assert_allclose(fitted.coefficients, (0.5, 3), atol=1e-9)
+    quadratic = Calibration.fit(raw, 1e-3 * raw**2, degree=2)
+    assert quadratic.apply_one(150) == pytest.approx(22.5)
+
+
+def test_fit_needs_enough_distinct_readings() -> None:
+    with pytest.raises(ValueError, match="at least 3 distinct"):
+        Calibration.fit(np.array([1.0, 1, 2]), np.array([1.0, 1, 2]), degree=2)
+
+
+def test_tare_drift_and_unit() -> None:
+    timestamps = np.arange(10.0)
+    unloaded = 50 + 0.1 * timestamps
+    cal = Calibration().with_tare(unloaded, timestamps).with_drift(unloaded, timestamps)
+    assert cal.tare_time == pytest.approx(4.5)
+    assert cal.drift == pytest.approx(0.1)
+    np.testing.assert_allclose(cal.apply(unloaded, timestamps), 0, atol=1e-9)
+    # Without timestamps, the drift cannot be compensated.
+    assert cal.apply_one(1050) == pytest.approx(1000 - 0.45)
+    assert cal.with_unit("N").apply_one(1050.45, 4.5) == pytest.approx(9.80665)
+
+
+def test_unknown_unit_is_rejected() -> None:
+    with pytest.raises(ValueError, match="Unknown unit"):
+        Calibration().with_unit("lb")
+
+
+def test_store_round_trip(tmp_path) -> None:
+    path = tmp_path / "calibrations.json"
+    cal = Calibration((2.0, 1.0), tare=3, unit="kg")
+    calibration.CalibrationStore(path).set("A1", cal)
+    store = calibration.CalibrationStore(path)
+    assert "A1" in store
+    assert store.get("A1") == cal
+    assert store.get("B2") == Calibration()
+
+
+def test_store_drops_drift(tmp_path) -> None:
+    path = tmp_path / "calibrations.json"
+    cal = Calibration(tare=3, tare_time=1234.5, drift=0.1)
+    store = calibration.CalibrationStore(path)
+    store.set("A1", cal)
+    # The calibration in use keeps compensating the drift until the application ends.
+    assert store.get("A1") == cal
+    assert calibration.CalibrationStore(path).get("A1") == Calibration(tare=3)
+    # Files written with a drift are loaded without it too.
+    path.write_text(json.dumps({"version": 1, "calibrations": {"A1": cal.to_dict()}}))
+    assert calibration.CalibrationStore(path).get("A1") == Calibration(tare=3)
+
+
+def test_reprocess_recording(tmp_path) -> None:
+    recorder = ColumnarRecorder(tmp_path / "raw", chunk_size=100, flush_interval=0)
+    recorder.append(np.arange(250.0), np.arange(250.0))
+    recorder.close()
+    cal = Calibration((2.0, 0.0), tare=10)
+    assert calibration.reprocess(tmp_path / "raw", tmp_path / "calibrated", cal, chunk_size=64) == 250
+    timestamps, values = Recording(tmp_path / "calibrated").read()
+    assert timestamps.tolist() == list(range(250))
+    np.testing.assert_allclose(values, 2 * np.arange(250) - 10)
+    with pytest.raises(FileExistsError):
+        calibration.reprocess(tmp_path / "raw", tmp_path / "calibrated", cal)
+    with pytest.raises(ValueError, match="in place"):
+        calibration.reprocess(tmp_path / "raw", tmp_path / "raw", cal)
+
+
+def test_drift_of_emulated_cell_is_compensated() -> None:
+    pytest.importorskip("termios")
+    from pyautolab_Loadcell.buffer import RingBuffer
+    from pyautolab_Loadcell.parser import FrameParser
+    from pyautolab_Loadcell.stream import StreamReader
+    from serial import Serial
+
+    from tools.emulator import LoadcellEmulator
+
+    ring = RingBuffer(100_000)
+    # The unloaded cell reads 25 g and drifts by 20 g/s.
+    with LoadcellEmulator(load=lambda t: 25 + 20 * t, stream_interval=0.002) as emulator:
+        ser = Serial(emulator.port, 9600, timeout=0.1)
+        reader = StreamReader(ser, ring, FrameParser())
+        reader.start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(ring) < 300:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        finally:
+            reader.stop(timeout=1)
+            ser.close()
+    timestamps, raw = ring.snapshot()
+    cal = Calibration().with_tare(raw, timestamps).with_drift(raw, timestamps)
+    assert cal.drift == pytest.approx(20, rel=0.05)
+    assert np.abs(cal.apply(raw, timestamps)).max() < 1
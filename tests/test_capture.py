@@ -0,0 +1,78 @@
+"""Tests of the serial capture format."""
+import struct
+import time
+from pathlib import Path
+
+import pytest
+from diy_hv._capture import MAGIC, RECEIVED, SENT, CaptureFile, SerialCapture
+
+_ROOT = Path(__file__).parents[1]
+
+
+def _records(path: Path) -> list:
+    capture = CaptureFile(path)
+    try:
+        return [(int(capture.directions[i]), capture.data(i)) for i in range(len(capture))]
+    finally:
+        capture.close()
+
+
+def test_loadcell_copy_matches_diyhv() -> None:
+    # The plugin keeps a copy of the module, which only differs by its header.
+    diyhv = (_ROOT / "DIYHV" / "diy_hv" / "_capture.py").read_text()
+    loadcell = _ROOT / "Electromechanical-Tensile-Tester" / "pyautolab-loadcell" / "pyautolab_Loadcell" / "capture.py"
+    marker = "from __future__ import annotations\n"
+    assert loadcell.read_text().split(marker, 1)[1] == diyhv.split(marker, 1)[1]
+
+
+def test_records_are_flushed_when_complete(tmp_path) -> None:
+    path = tmp_path / "run.cap"
+    capture = SerialCapture(path)
+    capture.record(SENT, b"a\r\n")
+    capture.record(RECEIVED, b"1.00\r\n")
+    # The first record is complete once the direction changes, and is readable while the capture is open.
+    assert _records(path) == [(SENT, b"a\r\n")]
+    capture.close()
+    assert _records(path) == [(SENT, b"a\r\n"), (RECEIVED, b"1.00\r\n")]
+
+
+def test_continuous_chunks_are_split_into_records(tmp_path) -> None:
+    path = tmp_path / "run.cap"
+    capture = SerialCapture(path, coalesce=1)
+    deadline = time.monotonic() + 0.2
+    while time.monotonic() < deadline:
+        capture.record(RECEIVED, b"1.00\r\n")
+        time.sleep(0.005)
+    assert len(_records(path)) >= 2
+    capture.close()
+
+
+def test_append_drops_record_cut_off_by_crash(tmp_path) -> None:
+    path = tmp_path / "run.cap"
+    capture = SerialCapture(path)
+    capture.record(SENT, b"a\r\n")
+    capture.close()
+    with path.open("ab") as f:
+        # Header of a 100 byte record of which only 3 bytes were written.
+        f.write(struct.pack("<dI", 1.0, 100 << 1 | RECEIVED) + b"1.0")
+    capture = SerialCapture(path)
+    capture.record(RECEIVED, b"2.00\r\n")
+    capture.close()
+    assert _records(path) == [(SENT, b"a\r\n"), (RECEIVED, b"2.00\r\n")]
+
+
+def test_append_after_crash_in_magic(tmp_path) -> None:
+    path = tmp_path / "run.cap"
+    path.write_bytes(MAGIC[:3])
+    capture = SerialCapture(path)
+    capture.record(SENT, b"a\r\n")
+    capture.close()
+    assert _records(path) == [(SENT, b"a\r\n")]
+
+
+def test_other_files_are_not_appended_to(tmp_path) -> None:
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"not a capture")
+    with pytest.raises(ValueError, match="not a serial capture"):
+        SerialCapture(path)
+    assert path.read_bytes() == b"not a capture"
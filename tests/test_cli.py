@@ -0,0 +1,41 @@
+"""Tests for the headless command line interface of diy_hv."""
+import os
+import subprocess  # nosec
+import sys
+import time
+from pathlib import Path
+
+_DIYHV_PATH = Path(__file__).parents[1] / "DIYHV"
+# Extra seconds allowed on top of a bare interpreter start.
+_STARTUP_BUDGET = 0.5
+_QT_MODULES = ("qtpy", "PyQt5", "PyQt6", "PySide2", "PySide6", "qtawesome", "qdarktheme", "darkdetect")
+
+
+def _run_python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join((str(_DIYHV_PATH), os.environ.get("PYTHONPATH", ""))))
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)  # nosec
+
+
+def _best_time(*args: str, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run_python(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_cli_does_not_import_qt() -> None:
+    code = (
+        "import sys\n"
+        "from diy_hv._cli import main\n"
+        "main(['list-ports'])\n"
+        f"print(sorted(m for m in sys.modules if m.split('.')[0] in {_QT_MODULES!r}))\n"
+    )
+    result = _run_python("-c", code)
+    assert result.stdout.splitlines()[-1] == "[]"
+
+
+def test_cli_startup_time() -> None:
+    overhead = _best_time("-m", "diy_hv", "list-ports") - _best_time("-c", "pass")
+    assert overhead < _STARTUP_BUDGET
@@ -0,0 +1,96 @@
+"""Tests of the command table of diy_hv."""
+import json
+import os
+import time
+
+import pytest
+from diy_hv._command import CommandConfigError, CommandTable, load_command_table
+
+from tools.emulator._diyhv import COMMANDS
+
+
+def _config(**overrides) -> dict:
+    config = {
+        "stop": "v",
+        "static": [{"command": "a", "voltage": 1}, {"command": "b", "voltage": 2.5}],
+        "dynamic": [{"command": "d", "voltage": 1, "frequency": 0.25}],
+    }
+    config.update(overrides)
+    return config
+
+
+def test_lookup_ignores_number_type() -> None:
+    table = CommandTable(_config())
+    assert table.static_command(1) == table.static_command(1.0) == "a"
+    assert table.static_command(2.5) == "b"
+    assert table.static_command(3) is None
+    assert table.dynamic_command(1, 0.25) == "d"
+    assert table.dynamic_command(1, 1) is None
+    assert table.static_voltages == [1, 2.5]
+
+
+@pytest.mark.parametrize(
+    ("overrides", "message"),
+    [
+        ({"static": [{"command": "a", "voltage": 1}, {"command": "b", "voltage": 1.0}]}, "duplicate static"),
+        ({"static": [{"command": "a", "voltage": True}]}, "finite number"),
+        ({"static": [{"command": "a", "voltage": float("nan")}]}, "finite number"),
+        ({"static": [{"command": "", "voltage": 1}]}, "non-empty string"),
+        ({"dynamic": {"command": "d"}}, "list of objects"),
+        ({"stop": "a"}, "also used to apply voltage"),
+    ],
+)
+def test_invalid_configuration_is_rejected(overrides, message) -> None:
+    with pytest.raises(CommandConfigError, match=message):
+        CommandTable(_config(**overrides))
+
+
+def test_user_file_is_reloaded_when_changed(tmp_path) -> None:
+    path = tmp_path / "commands.json"
+    path.write_text(json.dumps({"static": [{"command": "a", "voltage": 1}]}))
+    first = load_command_table(path)
+    assert load_command_table(path) is first
+    assert first.dynamic_command(1, 0.25) == "d"
+    path.write_text(json.dumps({"static": [{"command": "c", "voltage": 3}]}))
+    # The size is unchanged, so the modification time tells the files apart.
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = load_command_table(path)
+    assert second is not first
+    assert second.static_command(3) == "c"
+
+
+def test_default_table_matches_firmware() -> None:
+    table = load_command_table()
+    assert COMMANDS[table.stop.encode()].pwm == 0
+    pwms = [COMMANDS[table.static_command(voltage).encode()].pwm for voltage in table.static_voltages]
+    assert pwms == sorted(pwms)
+    assert 0 not in pwms
+    for (_, frequency), command in table.dynamic.items():
+        assert COMMANDS[command.encode()].half_period_ms == pytest.approx(500 / frequency)
+
+
+def test_static_commands_reach_emulated_firmware() -> None:
+    pytest.importorskip("termios")
+    from diy_hv._device import HighVoltageController
+
+    from tools.emulator import VoltageControllerEmulator
+
+    table = load_command_table()
+    pwms = []
+    with VoltageControllerEmulator(time_scale=0.002) as emulator:
+        device = HighVoltageController()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            assert device.wait_ready(5)
+            for voltage in table.static_voltages:
+                device.send(table.static_command(voltage))
+                deadline = time.monotonic() + 5
+                while len(emulator.executed) < len(pwms) + 1 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                pwms.append(emulator.pwm)
+        finally:
+            device.close()
+    assert pwms == [COMMANDS[table.static_command(voltage).encode()].pwm for voltage in table.static_voltages]
@@ -0,0 +1,99 @@
+"""Tests of the per-cycle summaries of cyclic tests."""
+import math
+import time
+
+import numpy as np
+import pytest
+
+cycles = pytest.importorskip("pyautolab_Loadcell.cycles")
+
+# Ten cycles of a sine with noise, sampled 1000 times per cycle, starting at the bottom.
+_TIMESTAMPS = np.arange(10_000) / 1000
+_PHASE = 2 * np.pi * _TIMESTAMPS - np.pi / 2
+_VALUES = 100 * np.sin(_PHASE) + np.random.default_rng(0).normal(scale=2, size=len(_TIMESTAMPS))
+
+
+def _process_in_chunks(segmenter, timestamps, values, positions=None, size: int = 37) -> None:
+    for start in range(0, len(values), size):
+        segmenter.process(
+            timestamps[start : start + size],
+            values[start : start + size],
+            None if positions is None else positions[start : start + size],
+        )
+
+
+def test_hysteresis_rejects_noise_at_level() -> None:
+    noisy = cycles.CycleSegmenter(level=0)
+    noisy.process(_TIMESTAMPS, _VALUES)
+    segmenter = cycles.CycleSegmenter(level=0, hysteresis=20)
+    segmenter.process(_TIMESTAMPS, _VALUES)
+    # The first crossing starts the first cycle, and the last one is not complete.
+    assert len(segmenter) == 9
+    assert len(noisy) > 9
+    table = segmenter.cycles
+    np.testing.assert_allclose(np.diff(table["start"]), 1, atol=0.02)
+    np.testing.assert_allclose(table["peak_to_peak"], 200, atol=15)
+    np.testing.assert_allclose(table["mean"], 0, atol=2)
+
+
+def test_chunks_give_same_cycles() -> None:
+    whole = cycles.CycleSegmenter(hysteresis=20)
+    whole.process(_TIMESTAMPS, _VALUES)
+    chunked = cycles.CycleSegmenter(hysteresis=20)
+    _process_in_chunks(chunked, _TIMESTAMPS, _VALUES)
+    # The level follows the range of the first cycle, so the first crossing comes late in it.
+    assert len(whole) == len(chunked) == 8
+    # The sums of the chunks are rounded differently, so only the boundaries are exact.
+    for name in whole.cycles.dtype.names:
+        if name in ("start", "end", "count"):
+            np.testing.assert_array_equal(chunked.cycles[name], whole.cycles[name])
+        else:
+            np.testing.assert_allclose(chunked.cycles[name], whole.cycles[name], rtol=1e-9, atol=1e-9)
+
+
+def test_area_of_loop() -> None:
+    segmenter = cycles.CycleSegmenter(level=0, hysteresis=0.2)
+    _process_in_chunks(segmenter, _TIMESTAMPS, np.sin(_PHASE), np.cos(_PHASE))
+    # The loop of sin against cos is a unit circle run counterclockwise.
+    np.testing.assert_allclose(segmenter.cycles["area"], -math.pi, rtol=1e-3)
+
+
+def test_raw_samples_of_every_third_cycle() -> None:
+    segmenter = cycles.CycleSegmenter(level=0, hysteresis=20, keep_every=3)
+    _process_in_chunks(segmenter, _TIMESTAMPS, _VALUES)
+    assert sorted(segmenter.raw_cycles) == [0, 3, 6]
+    timestamps, values = segmenter.raw_cycles[3]
+    assert len(values) == segmenter.cycles["count"][3]
+    assert timestamps[0] == segmenter.cycles["start"][3]
+
+
+def test_cycles_of_emulated_load() -> None:
+    pytest.importorskip("termios")
+    from pyautolab_Loadcell.buffer import RingBuffer
+    from pyautolab_Loadcell.parser import FrameParser
+    from pyautolab_Loadcell.stream import StreamReader
+    from serial import Serial
+
+    from tools.emulator import LoadcellEmulator
+
+    segmenter = cycles.CycleSegmenter(hysteresis=20)
+    # A 10 Hz load between 50 and 250 g.
+    with LoadcellEmulator(
+        load=lambda t: 150 + 100 * math.sin(2 * math.pi * 10 * t), noise=1, stream_interval=0.001, seed=0
+    ) as emulator:
+        ser = Serial(emulator.port, 9600, timeout=0.1)
+        reader = StreamReader(ser, RingBuffer(10_000), FrameParser())
+        reader.add_sink(segmenter)
+        reader.start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(segmenter) < 5:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+        finally:
+            reader.stop(timeout=1)
+            ser.close()
+    table = segmenter.cycles
+    np.testing.assert_allclose(np.diff(table["start"]), 0.1, atol=0.02)
+    np.testing.assert_allclose(table["min"], 50, atol=10)
+    np.testing.assert_allclose(table["max"], 250, atol=10)
@@ -0,0 +1,237 @@
+"""End-to-end tests of the drivers against the firmware emulators."""
+import math
+import time
+
+import pytest
+
+pytest.importorskip("termios")
+
+from diy_hv._capture import CaptureFile, replay_url  # noqa: E402
+from diy_hv._device import (  # noqa: E402
+    ACCEPTED,
+    ACTUATED,
+    FINISHED,
+    CommandRejectedError,
+    HighVoltageController,
+    Setpoint,
+)
+from diy_hv._fleet import ControllerFleet  # noqa: E402
+
+from tools.emulator import LinkProfile, LoadcellEmulator, VoltageControllerEmulator  # noqa: E402
+
+# Runs the firmware 500 times faster than the device: the 3 s setup takes 6 ms and the 1 s banner interval 2 ms.
+_TIME_SCALE = 0.002
+
+
+def _wait_until(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def controller():
+    with VoltageControllerEmulator(time_scale=_TIME_SCALE) as emulator:
+        device = HighVoltageController()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        yield emulator, device
+        device.close()
+
+
+def test_controller_static_command(controller) -> None:
+    emulator, device = controller
+    assert device.wait_ready(timeout=2)
+    device.send("c")
+    assert _wait_until(lambda: emulator.pwm == 255)
+    assert [command.command for command in emulator.executed] == [b"c"]
+
+
+def test_controller_dynamic_command_delays_next_command(controller) -> None:
+    emulator, device = controller
+    assert device.wait_ready(timeout=2)
+    device.send("d")
+    device.send("a")
+    assert _wait_until(lambda: len(emulator.executed) == 2)
+    dynamic, static = emulator.executed
+    # 31 cycles of 2 x 2000 ms must run before the queued command starts.
+    assert static.time - dynamic.time >= 31 * 4 * _TIME_SCALE
+    assert static.actuation.pwm == 44
+
+
+def test_link_throttles_to_baudrate() -> None:
+    with VoltageControllerEmulator(LinkProfile(baudrate=2400), time_scale=_TIME_SCALE) as emulator:
+        device = HighVoltageController()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        start = time.monotonic()
+        assert device.wait_ready(timeout=2)
+        device.close()
+    # The 27 bytes of the banner take 112.5 ms at 2400 baud.
+    assert time.monotonic() - start >= 0.1
+
+
+def test_loadcell_query_and_zero() -> None:
+    driver = pytest.importorskip("pyautolab_Loadcell.driver")
+    with LoadcellEmulator(load=lambda t: 120.0) as emulator:
+        device = driver.Loadcell()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            assert device.measure() == {"Tension": 120.0}
+            device.fix_zero()
+            assert _wait_until(lambda: emulator.zero == 120.0)
+            assert device.measure() == {"Tension": 0.0}
+        finally:
+            device.close()
+
+
+def test_loadcell_dropped_replies_are_reported() -> None:
+    driver = pytest.importorskip("pyautolab_Loadcell.driver")
+    with LoadcellEmulator(LinkProfile(drop_rate=0.5), seed=0) as emulator:
+        device = driver.Loadcell()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            with pytest.raises(driver.LoadcellReplyError) as excinfo:
+                device.measure_many(100)
+        finally:
+            device.close()
+    assert len(excinfo.value.readings) == 100 - emulator.writes_dropped
+
+
+def test_controller_framed_commands_are_pipelined(controller) -> None:
+    emulator, device = controller
+    assert device.wait_ready(timeout=2)
+    seqs = [device.submit(Setpoint.dynamic(1, 50, 3)), device.submit(Setpoint.static(3))]
+    for seq in seqs:
+        device.wait_reply(seq, ACCEPTED)
+    finished = device.wait_reply(seqs[0], FINISHED)
+    assert device.wait_reply(seqs[1], ACTUATED) >= finished
+    assert emulator.pwm == 255
+    with pytest.raises(CommandRejectedError):
+        device.execute(Setpoint.static(10))
+
+
+def test_controller_framed_commands_survive_lost_replies() -> None:
+    with VoltageControllerEmulator(LinkProfile(drop_rate=0.3), time_scale=_TIME_SCALE, seed=1) as emulator:
+        device = HighVoltageController()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            device.start_session(timeout=0.1, retries=10)
+            for _ in range(20):
+                device.execute(Setpoint.static(2), timeout=0.1, retries=10, wait_actuation=False)
+        finally:
+            device.close()
+        # Retransmitted commands are acknowledged again but executed once.
+        assert _wait_until(lambda: len(emulator.executed) >= 20)
+        time.sleep(0.05)
+    assert len(emulator.executed) == 20
+
+
+def test_controller_new_host_is_not_taken_for_retransmissions() -> None:
+    with VoltageControllerEmulator(time_scale=_TIME_SCALE) as emulator:
+        for voltage in (1, 2):
+            # A new process numbers its commands from 1 again while the board keeps running.
+            device = HighVoltageController()
+            device.port = emulator.port
+            device.baudrate = 9600
+            device.open()
+            try:
+                device.execute(Setpoint.static(voltage))
+            finally:
+                device.close()
+    assert [command.actuation.pwm for command in emulator.executed] == [44, 100]
+
+
+def test_controller_legacy_stop_interrupts_dynamic_run(controller) -> None:
+    emulator, device = controller
+    assert device.wait_ready(timeout=2)
+    # 12001 cycles of 2 x 5 ms, followed by a queued static command.
+    device.send("o")
+    device.send("c")
+    assert _wait_until(lambda: len(emulator.executed) == 1)
+    device.send("v")
+    assert _wait_until(lambda: len(emulator.executed) == 2, timeout=1)
+    assert emulator.executed[-1].command == b"v"
+    assert emulator.pwm == 0
+    time.sleep(0.1)
+    # The queued command was dropped.
+    assert len(emulator.executed) == 2
+
+
+def test_controller_capture_replays_faster_than_real_time(tmp_path) -> None:
+    path = tmp_path / "controller.cap"
+    with VoltageControllerEmulator(time_scale=_TIME_SCALE) as emulator:
+        device = HighVoltageController()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        device.start_capture(str(path))
+        try:
+            assert device.wait_ready(timeout=2)
+            recorded = [device.execute(Setpoint.static(voltage)).seq for voltage in (1, 2, 3)]
+        finally:
+            device.close()
+    capture = CaptureFile(path)
+    assert capture.data(0).startswith(b"please input your command")
+    capture.close()
+
+    device = HighVoltageController()
+    device.port = replay_url(path, math.inf)
+    device.baudrate = 9600
+    device.open()
+    try:
+        assert device.wait_ready(timeout=2)
+        assert [device.execute(Setpoint.static(voltage)).seq for voltage in (1, 2, 3)] == recorded
+    finally:
+        device.close()
+
+
+def test_fleet_stop_interrupts_every_controller() -> None:
+    first = VoltageControllerEmulator(time_scale=_TIME_SCALE)
+    second = VoltageControllerEmulator(time_scale=_TIME_SCALE)
+    with first, second, ControllerFleet([first.port, second.port]) as fleet:
+        for controller in fleet.controllers:
+            assert controller.wait_ready(timeout=2)
+        assert not fleet.broadcast("o").failed
+        assert _wait_until(lambda: first.pwm == second.pwm == 44)
+        start = time.monotonic()
+        assert not fleet.stop().failed
+        assert _wait_until(lambda: first.pwm == second.pwm == 0, timeout=1)
+        # The dynamic runs last 240 ms at this time scale.
+        assert time.monotonic() - start < 0.1
+    assert first.executed[-1].command == second.executed[-1].command == b"v"
+
+
+def test_loadcell_multiplexed_measure_waits_for_reading() -> None:
+    driver = pytest.importorskip("pyautolab_Loadcell.driver")
+    multiplex = pytest.importorskip("pyautolab_Loadcell.multiplex")
+    multiplexer = multiplex.LoadcellMultiplexer()
+    multiplexer.start()
+    # Nothing is streamed, so the measurement waits for the whole timeout of the device.
+    with LoadcellEmulator() as emulator:
+        device = driver.Loadcell()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            device.start_streaming(multiplexer=multiplexer)
+            assert _wait_until(lambda: emulator.port in multiplexer.channels)
+            # The multiplexer makes reads of the port non-blocking, which must not shorten the wait for a reading.
+            start = time.monotonic()
+            with pytest.raises(TimeoutError):
+                device.measure()
+            assert time.monotonic() - start >= 0.09
+        finally:
+            device.close()
+            multiplexer.stop(timeout=1)
@@ -0,0 +1,103 @@
+"""Tests of the streaming filters and the fracture detection of the load cell."""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+filters = pytest.importorskip("pyautolab_Loadcell.filters")
+
+_RNG = np.random.default_rng(0)
+_SIGNAL = np.cumsum(_RNG.normal(size=1000))
+
+
+def _in_chunks(process, values: np.ndarray, sizes=(1, 7, 100, 3, 500)) -> np.ndarray:
+    chunks = []
+    start = 0
+    for size in sizes * (len(values) // sum(sizes) + 1):
+        chunks.append(process(values[start : start + size]))
+        start += size
+    return np.concatenate(chunks)
+
+
+def _reference_window(values: np.ndarray, window: int, reduce) -> np.ndarray:
+    padded = np.concatenate((np.full(window - 1, values[0]), values))
+    return np.array([reduce(padded[i : i + window]) for i in range(len(values))])
+
+
+def test_moving_average_matches_reference_in_any_chunks() -> None:
+    result = _in_chunks(filters.MovingAverage(25).process, _SIGNAL)
+    np.testing.assert_allclose(result, _reference_window(_SIGNAL, 25, np.mean))
+
+
+def test_moving_median_matches_reference_in_any_chunks() -> None:
+    result = _in_chunks(filters.MovingMedian(9).process, _SIGNAL)
+    np.testing.assert_allclose(result, _reference_window(_SIGNAL, 9, np.median))
+
+
+@pytest.mark.parametrize("alpha", [1.0, 0.5, 0.01, 1e-5])
+def test_exponential_filter_matches_recursion(alpha) -> None:
+    expected = np.empty_like(_SIGNAL)
+    state = _SIGNAL[0]
+    for i, value in enumerate(_SIGNAL):
+        state += alpha * (value - state)
+        expected[i] = state
+    result = _in_chunks(filters.ExponentialFilter(alpha).process, _SIGNAL)
+    np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_detector_fires_at_same_sample_in_any_chunks() -> None:
+    values = np.concatenate((np.linspace(0, 100, 500), np.full(500, 10.0)))
+    timestamps = np.arange(len(values)) / 1000
+    expected = filters.FractureDetector(confirm=3).process(timestamps, values)
+    assert expected is not None
+    assert expected.index == 502
+    assert expected.peak == 100
+    for sizes in [(1,), (2, 5), (501, 1)]:
+        detector = filters.FractureDetector(confirm=3)
+        start = 0
+        for size in sizes * len(values):
+            detector.process(timestamps[start : start + size], values[start : start + size])
+            start += size
+            if start >= len(values):
+                break
+        assert detector.event == expected
+
+
+def test_detector_ignores_short_dips_and_small_peaks() -> None:
+    detector = filters.FractureDetector(confirm=3, min_peak=50)
+    # A peak of 40 is below min_peak, and the dip from 100 lasts two samples only.
+    values = np.array([40.0, 0, 0, 0, 100, 10, 10, 100, 100])
+    assert detector.process(np.arange(9.0), values) is None
+    assert detector.event is None
+
+
+def test_pipeline_stops_on_fracture_of_emulated_specimen() -> None:
+    pytest.importorskip("termios")
+    from pyautolab_Loadcell.buffer import RingBuffer
+    from pyautolab_Loadcell.parser import FrameParser
+    from pyautolab_Loadcell.stream import StreamReader
+    from serial import Serial
+
+    from tools.emulator import LoadcellEmulator
+
+    fractured = threading.Event()
+    detector = filters.FractureDetector(drop_ratio=0.5, min_peak=100)
+    detector.add_callback(lambda event: fractured.set())
+    pipeline = filters.SignalPipeline([filters.MovingMedian(5)], [detector])
+    # The specimen is loaded at 1000 g/s and breaks at 300 g.
+    with LoadcellEmulator(load=lambda t: 1000 * t if t < 0.3 else 5, stream_interval=0.002) as emulator:
+        ser = Serial(emulator.port, 9600, timeout=0.1)
+        reader = StreamReader(ser, RingBuffer(10_000), FrameParser())
+        reader.add_sink(pipeline)
+        reader.start()
+        try:
+            assert fractured.wait(5)
+            fracture_time = time.monotonic()
+        finally:
+            reader.stop(timeout=1)
+            ser.close()
+    event = detector.event
+    assert event.peak == pytest.approx(300, abs=10)
+    assert event.value < 150
+    assert event.timestamp < fracture_time
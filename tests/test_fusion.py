@@ -0,0 +1,111 @@
+"""Tests of the fusion of several streams on a common time base."""
+import time
+
+import numpy as np
+import pytest
+
+fusion = pytest.importorskip("pyautolab_Loadcell.fusion")
+
+
+class _Device:
+    def measure(self) -> dict:
+        return {"voltage": 1.5, "current": 0.25}
+
+
+def test_streams_are_interpolated_on_grid() -> None:
+    fused = fusion.StreamFusion(period=0.1)
+    timestamps = np.arange(11) / 10
+    fused.push("a", timestamps, 2 * timestamps)
+    fused.push("b", timestamps + 0.05, 3 * (timestamps + 0.05))
+    batch = fused.read()
+    # The watermark is the newest sample of "a", the slower stream.
+    np.testing.assert_allclose(batch.timestamps, timestamps)
+    np.testing.assert_allclose(batch.columns["a"], 2 * timestamps)
+    assert np.isnan(batch.columns["b"][0])
+    np.testing.assert_allclose(batch.columns["b"][1:], 3 * timestamps[1:])
+    # The merge alternates between the streams.
+    assert batch.merged.streams.tolist() == [0, 1] * 10 + [0]
+    assert np.all(np.diff(batch.merged.timestamps) >= 0)
+
+
+def test_samples_after_watermark_are_kept() -> None:
+    fused = fusion.StreamFusion(period=0.1)
+    fused.push("a", np.array([0.0, 0.1, 0.2]), np.array([0.0, 1, 2]))
+    fused.push("b", np.array([0.0, 0.1]), np.array([0.0, 1]))
+    assert len(fused.read().merged.timestamps) == 4
+    assert len(fused.read().timestamps) == 0
+    fused.push("b", np.array([0.2, 0.3]), np.array([2.0, 3]))
+    batch = fused.read()
+    np.testing.assert_allclose(batch.timestamps, [0.2])
+    # The carried sample of the previous batch interpolates the start of this one.
+    assert batch.columns["a"].tolist() == batch.columns["b"].tolist() == [2]
+    assert batch.merged.streams.tolist() == [0, 1]
+
+
+def test_stalled_stream_does_not_hold_others_back() -> None:
+    fused = fusion.StreamFusion(period=0.5, max_lag=1)
+    fused.push("fast", np.arange(5.0), np.arange(5.0))
+    fused.push("slow", 0.0, np.array([7.0]))
+    batch = fused.read()
+    assert batch.timestamps[-1] == 4
+    assert np.isnan(batch.columns["slow"][-1])
+
+
+def test_late_and_dropped_samples_are_counted() -> None:
+    fused = fusion.StreamFusion(period=1, capacity=4)
+    fused.push("a", np.arange(10.0), np.arange(10.0))
+    assert fused.read().merged.values.tolist() == [6, 7, 8, 9]
+    assert fused.dropped == {"a": 6}
+    fused.push("a", np.array([5.0, 10]), np.array([5.0, 10]))
+    assert fused.read().merged.values.tolist() == [10]
+    assert fused.late == {"a": 1}
+
+
+def test_poll_stamps_middle_of_measure() -> None:
+    fused = fusion.StreamFusion(period=0.01)
+    start = time.monotonic()
+    assert fused.poll("supply", _Device()) == _Device().measure()
+    assert fused.names == ["supply.voltage", "supply.current"]
+    batch = fused.read()
+    assert start <= batch.merged.timestamps[0] <= time.monotonic()
+    assert batch.merged.values.tolist() == [1.5, 0.25]
+
+
+def test_emulated_cells_are_aligned() -> None:
+    pytest.importorskip("termios")
+    from pyautolab_Loadcell.buffer import RingBuffer
+    from pyautolab_Loadcell.parser import FrameParser
+    from pyautolab_Loadcell.stream import StreamReader
+    from serial import Serial
+
+    from tools.emulator import LoadcellEmulator
+
+    fused = fusion.StreamFusion(period=0.005)
+    emulators = [
+        LoadcellEmulator(load=lambda t: 100, stream_interval=0.002),
+        LoadcellEmulator(load=lambda t: 200, stream_interval=0.003),
+    ]
+    sers, readers = [], []
+    for name, emulator in zip("ab", emulators):
+        emulator.start()
+        sers.append(Serial(emulator.port, 9600, timeout=0.1))
+        readers.append(StreamReader(sers[-1], RingBuffer(10_000), FrameParser()))
+        readers[-1].add_sink(fused.sink(name))
+        readers[-1].start()
+    columns = {"a": [], "b": []}
+    try:
+        deadline = time.monotonic() + 5
+        while min(len(column) for column in columns.values()) < 100:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+            batch = fused.read()
+            for name, column in batch.columns.items():
+                columns[name].extend(column[~np.isnan(column)])
+    finally:
+        for ser, reader, emulator in zip(sers, readers, emulators):
+            reader.stop(timeout=1)
+            ser.close()
+            emulator.stop()
+    np.testing.assert_allclose(columns["a"], 100)
+    np.testing.assert_allclose(columns["b"], 200)
+    assert fused.dropped == fused.late == {"a": 0, "b": 0}
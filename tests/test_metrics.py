@@ -0,0 +1,50 @@
+"""Tests of the serial instrumentation against the firmware emulators."""
+from pathlib import Path
+
+import pytest
+from diy_hv._metrics import SerialMetrics
+
+_ROOT = Path(__file__).parents[1]
+
+
+def test_loadcell_copy_matches_diyhv() -> None:
+    # The plugin keeps a copy of the module, which only differs by its header and the metric prefix.
+    diyhv = (_ROOT / "DIYHV" / "diy_hv" / "_metrics.py").read_text()
+    loadcell = _ROOT / "Electromechanical-Tensile-Tester" / "pyautolab-loadcell" / "pyautolab_Loadcell" / "metrics.py"
+    marker = "from __future__ import annotations\n"
+    copy = loadcell.read_text().split(marker, 1)[1].replace('"loadcell_serial"', '"diyhv_serial"')
+    assert copy == diyhv.split(marker, 1)[1]
+
+
+def test_prometheus_format_has_labels() -> None:
+    metrics = SerialMetrics()
+    metrics.record_send(0.002, 5)
+    metrics.record_receive(0.2, 0, complete=False)
+    text = metrics.to_prometheus({"port": "/dev/ttyACM0"})
+    assert 'diyhv_serial_call_seconds_bucket{port="/dev/ttyACM0",call="send",le="0.0025"} 1' in text
+    assert 'diyhv_serial_bytes_total{port="/dev/ttyACM0",direction="tx"} 5' in text
+    assert 'diyhv_serial_empty_reads_total{port="/dev/ttyACM0"} 1' in text
+
+
+def test_controller_records_traffic() -> None:
+    pytest.importorskip("termios")
+    from diy_hv._device import HighVoltageController
+
+    from tools.emulator import VoltageControllerEmulator
+
+    with VoltageControllerEmulator(time_scale=0.002) as emulator:
+        device = HighVoltageController()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            metrics = device.enable_metrics()
+            assert device.wait_ready(5)
+            device.send("v")
+        finally:
+            device.close()
+    snapshot = metrics.snapshot()
+    assert snapshot["messages"]["tx"] == 1
+    assert snapshot["bytes"]["tx"] == 3
+    assert snapshot["messages"]["rx"] >= 1
+    assert snapshot["latencies"]["send"]["count"] == 1
@@ -0,0 +1,174 @@
+"""Tests of the acquisition of several load cells on one thread against the firmware emulator."""
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("termios")
+multiplex = pytest.importorskip("pyautolab_Loadcell.multiplex")
+
+from pyautolab_Loadcell.buffer import RingBuffer  # noqa: E402
+from pyautolab_Loadcell.parser import FrameParser  # noqa: E402
+from serial import Serial  # noqa: E402
+
+from tools.emulator import LoadcellEmulator  # noqa: E402
+
+
+def _wait_until(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def multiplexer():
+    multiplexer = multiplex.LoadcellMultiplexer()
+    multiplexer.start()
+    yield multiplexer
+    multiplexer.stop(timeout=1)
+    assert not multiplexer.is_alive()
+
+
+def _channel(multiplexer, emulator: LoadcellEmulator) -> multiplex.Channel:
+    ser = Serial(emulator.port, 9600, timeout=0.1)
+    return multiplexer.channel(emulator.port, ser, RingBuffer(10_000), FrameParser())
+
+
+def test_one_thread_reads_many_cells(multiplexer) -> None:
+    # The load of every cell tells the cells apart.
+    emulators = [LoadcellEmulator(load=lambda t, i=i: 100 * i, stream_interval=0.002) for i in range(8)]
+    channels = []
+    for emulator in emulators:
+        emulator.start()
+        channels.append(_channel(multiplexer, emulator))
+    chunks = []
+    channels[0].add_sink(lambda timestamps, values: chunks.append(len(values)))
+    try:
+        for channel in channels:
+            channel.start()
+        assert _wait_until(lambda: all(len(channel.buffer) >= 100 for channel in channels))
+    finally:
+        for channel in channels:
+            channel.stop(timeout=1)
+            channel._ser.close()
+        for emulator in emulators:
+            emulator.stop()
+    for i, channel in enumerate(channels):
+        timestamps, values = channel.buffer.snapshot()
+        np.testing.assert_allclose(values, 100 * i)
+        assert np.all(np.diff(timestamps) > 0)
+        assert channel.error is None
+        assert channel.parse_errors == 0
+    assert sum(chunks) >= 100
+    assert multiplexer.channels == {}
+
+
+def test_stopped_channel_is_no_longer_read(multiplexer) -> None:
+    with LoadcellEmulator(load=lambda t: 5, stream_interval=0.002) as emulator:
+        channel = _channel(multiplexer, emulator)
+        channel.start()
+        try:
+            assert _wait_until(lambda: len(channel.buffer) >= 10)
+            assert channel._ser.timeout == 0
+            channel.stop(timeout=1)
+            # Reads block again once the channel is removed, as for a port read on its own thread.
+            assert channel._ser.timeout == 0.1
+            count = len(channel.buffer)
+            time.sleep(0.05)
+            assert len(channel.buffer) == count
+            assert channel._ser.read(64)
+        finally:
+            channel._ser.close()
+
+
+def test_unplugged_cell_does_not_stop_others(multiplexer) -> None:
+    with LoadcellEmulator(load=lambda t: 1, stream_interval=0.002) as unplugged, LoadcellEmulator(
+        load=lambda t: 2, stream_interval=0.002
+    ) as plugged:
+        first = _channel(multiplexer, unplugged)
+        second = _channel(multiplexer, plugged)
+        first.start()
+        second.start()
+        try:
+            assert _wait_until(lambda: len(first.buffer) >= 10 and len(second.buffer) >= 10)
+            unplugged.disconnect()
+            assert _wait_until(lambda: first.error is not None)
+            assert unplugged.port not in multiplexer.channels
+            count = len(second.buffer)
+            assert _wait_until(lambda: len(second.buffer) >= count + 10)
+        finally:
+            first.stop(timeout=1)
+            second.stop(timeout=1)
+            first._ser.close()
+            second._ser.close()
+
+
+def test_failing_sink_does_not_stop_other_channels(multiplexer) -> None:
+    def fail(timestamps, values) -> None:
+        raise RuntimeError("consumer failed")
+
+    with LoadcellEmulator(load=lambda t: 1, stream_interval=0.002) as failing, LoadcellEmulator(
+        load=lambda t: 2, stream_interval=0.002
+    ) as healthy:
+        first = _channel(multiplexer, failing)
+        second = _channel(multiplexer, healthy)
+        first.add_sink(fail)
+        first.start()
+        second.start()
+        try:
+            assert _wait_until(lambda: first.error is not None)
+            assert isinstance(first.error, RuntimeError)
+            counts = len(first.buffer), len(second.buffer)
+            # The failing sink is removed, and both channels keep streaming.
+            assert _wait_until(lambda: len(first.buffer) >= counts[0] + 10 and len(second.buffer) >= counts[1] + 10)
+            assert multiplexer.is_alive()
+        finally:
+            first.stop(timeout=1)
+            second.stop(timeout=1)
+            first._ser.close()
+            second._ser.close()
+
+
+def test_closed_port_is_not_registered(multiplexer) -> None:
+    with LoadcellEmulator() as emulator:
+        channel = _channel(multiplexer, emulator)
+        channel._ser.close()
+        channel.start()
+        # The failed registration removes the channel, so stopping it does not wait.
+        start = time.monotonic()
+        channel.stop(timeout=1)
+        assert time.monotonic() - start < 0.5
+    assert channel.error is not None
+    assert multiplexer.channels == {}
+
+
+def test_stopping_multiplexer_releases_ports() -> None:
+    multiplexer = multiplex.LoadcellMultiplexer()
+    multiplexer.start()
+    with LoadcellEmulator(stream_interval=0.002) as emulator:
+        channel = _channel(multiplexer, emulator)
+        channel.start()
+        try:
+            assert _wait_until(lambda: emulator.port in multiplexer.channels)
+            multiplexer.stop(timeout=1)
+            assert not multiplexer.is_alive()
+            assert channel._ser.timeout == 0.1
+            # The stopped multiplexer no longer takes requests, which must not block nor fail.
+            channel.stop(timeout=0.1)
+        finally:
+            channel._ser.close()
+
+
+def test_shared_multiplexer_is_restarted_once_stopped() -> None:
+    shared = multiplex.LoadcellMultiplexer.shared()
+    assert multiplex.LoadcellMultiplexer.shared() is shared
+    shared.stop(timeout=1)
+    restarted = multiplex.LoadcellMultiplexer.shared()
+    try:
+        assert restarted is not shared
+        assert restarted.is_alive()
+    finally:
+        restarted.stop(timeout=1)
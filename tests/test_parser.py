@@ -0,0 +1,83 @@
+"""Tests of the bulk parser of the load cell readings."""
+import time
+import tracemalloc
+
+import pytest
+
+parser = pytest.importorskip("pyautolab_Loadcell.parser")
+
+
+def test_parse_keeps_incomplete_frame() -> None:
+    frames = parser.FrameParser()
+    frames.feed(b"1.5\r\n-2\r\n3.2")
+    assert frames.parse().tolist() == [1.5, -2]
+    assert frames.pending == 3
+    frames.feed(b"5\r\n")
+    assert frames.parse().tolist() == [3.25]
+    assert frames.pending == 0
+
+
+def test_parse_drops_malformed_frames() -> None:
+    frames = parser.FrameParser()
+    frames.feed(b"1\r\nHX711 not found\r\n\r\n2\r\n")
+    assert frames.parse().tolist() == [1, 2]
+    assert frames.parse_errors == 2
+
+
+def test_parse_reuses_its_array() -> None:
+    frames = parser.FrameParser()
+    frames.feed(b"1\r\n")
+    first = frames.parse()
+    frames.feed(b"2\r\n")
+    assert frames.parse().base is first.base
+
+
+def test_parse_does_not_copy_the_buffer() -> None:
+    frames = parser.FrameParser()
+    frames.feed(b"123.45\r\n" * 8000)
+    tracemalloc.start()
+    try:
+        values = frames.parse()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(values) == 8000
+    # The 64 kB of frames are neither copied into bytes nor decoded into a temporary array.
+    assert peak < 4096
+
+
+def test_full_buffer_of_shortest_frames_fits() -> None:
+    # Every frame is a digit and a one byte delimiter, the most readings a buffer can hold.
+    frames = parser.FrameParser(capacity=64, delimiter=b"\n")
+    frames.feed(b"7\n" * 32)
+    assert frames.parse().tolist() == [7] * 32
+    assert frames.parse_errors == 0
+
+
+def test_buffer_without_delimiter_is_discarded() -> None:
+    frames = parser.FrameParser(capacity=16)
+    frames.feed(b"1" * 16 + b"\r\n2\r\n")
+    assert frames.parse().tolist() == [2]
+    assert frames.parse_errors == 2
+
+
+def test_readinto_reads_streamed_readings() -> None:
+    pytest.importorskip("termios")
+    from serial import Serial
+
+    from tools.emulator import LoadcellEmulator
+
+    frames = parser.FrameParser()
+    readings = []
+    with LoadcellEmulator(load=lambda t: 120.0, stream_interval=0.001) as emulator:
+        ser = Serial(emulator.port, 9600, timeout=0.1)
+        try:
+            deadline = time.monotonic() + 5
+            while len(readings) < 100 and time.monotonic() < deadline:
+                frames.readinto(ser)
+                readings.extend(frames.parse().tolist())
+        finally:
+            ser.close()
+    assert len(readings) >= 100
+    assert set(readings) == {120.0}
+    assert frames.parse_errors == 0
@@ -0,0 +1,118 @@
+"""Tests of the port registry of diy_hv and of the combobox following it."""
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+qt_widgets = pytest.importorskip("qtpy.QtWidgets")
+
+from diy_hv import _ports  # noqa: E402
+from diy_hv._widgets import PortCombobox  # noqa: E402
+from qtpy.QtCore import Qt  # noqa: E402
+from serial.tools.list_ports_common import ListPortInfo  # noqa: E402
+
+
+def _wait_until(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _port(device: str, description: str = "USB Serial") -> ListPortInfo:
+    port = ListPortInfo(device, skip_link_detection=True)
+    port.description = description
+    return port
+
+
+@pytest.fixture
+def app():
+    return qt_widgets.QApplication.instance() or qt_widgets.QApplication([])
+
+
+@pytest.fixture
+def enumeration(monkeypatch):
+    # Ports returned by the enumeration, changed by the tests.
+    ports = {}
+    monkeypatch.setattr(_ports.list_ports, "comports", lambda: list(ports.values()))
+    return ports
+
+
+@pytest.fixture
+def registry(enumeration):
+    # The sysfs snapshot never changes, so the thread only enumerates once and the tests refresh by hand.
+    registry = _ports.PortRegistry(interval=60)
+    assert registry.ports(timeout=5) == []
+    yield registry
+    registry.stop(timeout=1)
+
+
+def _record(signal) -> list:
+    received = []
+    signal.connect(
+        lambda ports: received.append(sorted(port.device for port in ports)), Qt.ConnectionType.DirectConnection
+    )
+    return received
+
+
+def test_registry_emits_differences(enumeration, registry) -> None:
+    added = _record(registry.ports_added)
+    removed = _record(registry.ports_removed)
+    enumeration.update({"/dev/ttyUSB1": _port("/dev/ttyUSB1"), "/dev/ttyUSB0": _port("/dev/ttyUSB0")})
+    registry.refresh()
+    del enumeration["/dev/ttyUSB0"]
+    enumeration["/dev/ttyACM0"] = _port("/dev/ttyACM0")
+    registry.refresh()
+    # Nothing changed, so nothing is emitted.
+    registry.refresh()
+    assert added == [["/dev/ttyUSB0", "/dev/ttyUSB1"], ["/dev/ttyACM0"]]
+    assert removed == [["/dev/ttyUSB0"]]
+    assert [port.device for port in registry.ports()] == ["/dev/ttyACM0", "/dev/ttyUSB1"]
+
+
+def test_registry_enumerates_again_when_sysfs_changes(monkeypatch, enumeration) -> None:
+    entries = {"ttyS0"}
+    monkeypatch.setattr(_ports, "_sysfs_snapshot", lambda: frozenset(entries))
+    monkeypatch.setattr(_ports.sys, "platform", "linux")
+    registry = _ports.PortRegistry(interval=0.01)
+    try:
+        assert registry.ports(timeout=5) == []
+        added = _record(registry.ports_added)
+        # The enumeration is not polled while sysfs is unchanged.
+        enumeration["/dev/ttyUSB0"] = _port("/dev/ttyUSB0")
+        time.sleep(0.05)
+        assert added == []
+        entries.add("ttyUSB0")
+        assert _wait_until(lambda: added == [["/dev/ttyUSB0"]])
+    finally:
+        registry.stop(timeout=1)
+
+
+def test_combobox_updates_items_in_place(app, enumeration, registry) -> None:
+    enumeration.update({device: _port(device) for device in ("/dev/ttyUSB0", "/dev/ttyUSB2")})
+    enumeration["/dev/ttyS0"] = _port("/dev/ttyS0", "n/a")
+    registry.refresh()
+    combobox = PortCombobox(filter="USB", registry=registry)
+    resets = []
+    combobox.model().modelReset.connect(lambda: resets.append(True))
+    assert [combobox.itemText(row) for row in range(combobox.count())] == ["/dev/ttyUSB0", "/dev/ttyUSB2"]
+    assert combobox.currentIndex() == -1
+    assert combobox.select_port("/dev/ttyUSB2")
+
+    enumeration["/dev/ttyUSB1"] = _port("/dev/ttyUSB1")
+    del enumeration["/dev/ttyUSB0"]
+    registry.refresh()
+    assert [combobox.itemText(row) for row in range(combobox.count())] == ["/dev/ttyUSB1", "/dev/ttyUSB2"]
+    # The selection follows its item as rows are inserted and removed before it.
+    assert combobox.currentText() == "/dev/ttyUSB2"
+    assert combobox.get_select_port_info().device == "/dev/ttyUSB2"
+
+    del enumeration["/dev/ttyUSB2"]
+    registry.refresh()
+    assert combobox.count() == 1
+    assert combobox.currentIndex() == -1
+    assert combobox.get_select_port_info() is None
+    assert resets == []
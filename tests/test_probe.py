@@ -0,0 +1,63 @@
+"""Tests of the identification of the devices on serial ports against the firmware emulators."""
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("termios")
+
+from diy_hv._probe import DEFAULT_IDENTIFIERS, busy_ports, probe_ports  # noqa: E402
+
+from tools.emulator import LoadcellEmulator, VoltageControllerEmulator  # noqa: E402
+
+# Opens the port given as argument and keeps it open until stdin is closed.
+_HOLD_PORT = "import sys; port = open(sys.argv[1], 'rb', buffering=0); print('open', flush=True); sys.stdin.read()"
+
+
+def test_probe_identifies_controller() -> None:
+    with VoltageControllerEmulator(time_scale=0.01) as controller, LoadcellEmulator() as loadcell:
+        results = probe_ports([controller.port, loadcell.port], {"DIYHV": DEFAULT_IDENTIFIERS["DIYHV"]}, timeout=0.5)
+    assert results[controller.port].device == "DIYHV"
+    assert results[loadcell.port].device is None
+    assert not any(result.busy for result in results.values())
+
+
+def test_probe_identifies_every_device_in_parallel() -> None:
+    pytest.importorskip("pyautolab_Loadcell.driver")
+    controller = VoltageControllerEmulator(time_scale=0.01)
+    loadcells = [LoadcellEmulator(load=lambda t: 12.5) for _ in range(3)]
+    emulators = [controller, *loadcells]
+    for emulator in emulators:
+        emulator.start()
+    try:
+        start = time.monotonic()
+        results = probe_ports([emulator.port for emulator in emulators], timeout=0.5)
+        elapsed = time.monotonic() - start
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+    assert results[controller.port].device == "DIYHV"
+    assert all(results[loadcell.port].device == "Loadcell" for loadcell in loadcells)
+    # The controller is tried first on every port, so a load cell takes its whole timeout and then a query.
+    slowest = max(result.elapsed for result in results.values())
+    assert slowest >= 0.5
+    assert elapsed < slowest + 0.3
+    assert elapsed < sum(result.elapsed for result in results.values()) / 2
+
+
+def test_probe_skips_ports_open_in_other_process() -> None:
+    with VoltageControllerEmulator(time_scale=0.01) as controller:
+        holder = subprocess.Popen(
+            [sys.executable, "-c", _HOLD_PORT, controller.port], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        try:
+            assert holder.stdout.readline() == b"open\n"
+            if controller.port not in busy_ports([controller.port]):
+                pytest.skip("open files of other processes are not visible")
+            results = probe_ports([controller.port], timeout=0.5)
+        finally:
+            holder.stdin.close()
+            holder.wait(5)
+    assert results[controller.port].device is None
+    assert results[controller.port].busy
@@ -0,0 +1,78 @@
+"""Tests of the acquisition of the load cell in a child process against the firmware emulator."""
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("termios")
+pytest.importorskip("multiprocessing.shared_memory")
+process = pytest.importorskip("pyautolab_Loadcell.process")
+
+from tools.emulator import LoadcellEmulator  # noqa: E402
+
+
+def _wait_until(predicate, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def ring():
+    ring = process.SharedRingBuffer(10_000)
+    yield ring
+    ring.close()
+
+
+def test_ring_reads_each_sample_once(ring) -> None:
+    ring.extend(0.0, np.arange(3.0))
+    assert ring.read_available()[1].tolist() == [0, 1, 2]
+    ring.extend(1.0, np.arange(2.0))
+    assert ring.read_available()[1].tolist() == [0, 1]
+    assert ring.dropped == 0
+
+
+def test_ring_counts_overwritten_samples_as_dropped(ring) -> None:
+    readable = ring.capacity - ring.guard
+    ring.extend(0.0, np.arange(float(readable + 10)))
+    _, values = ring.read_available()
+    assert len(values) == readable
+    assert values[0] == 10
+    assert ring.dropped == 10
+
+
+def test_child_streams_into_ring(ring) -> None:
+    with LoadcellEmulator(load=lambda t: 120.0, stream_interval=0.001) as emulator:
+        reader = process.ProcessReader(emulator.port, 9600, ring)
+        reader.start()
+        try:
+            assert _wait_until(lambda: ring.total >= 100)
+        finally:
+            reader.stop(timeout=1)
+    timestamps, values = ring.snapshot()
+    assert set(values.tolist()) == {120.0}
+    assert np.all(np.diff(timestamps) > 0)
+    assert reader.restarts == 0
+    assert reader.exitcode == 0
+
+
+@pytest.mark.parametrize("stop_child", [signal.SIGKILL, signal.SIGSTOP])
+def test_dead_or_hung_child_is_restarted(ring, stop_child) -> None:
+    with LoadcellEmulator(load=lambda t: 120.0, stream_interval=0.001) as emulator:
+        reader = process.ProcessReader(emulator.port, 9600, ring, restart_interval=0.1, heartbeat_timeout=3)
+        reader.start()
+        try:
+            assert _wait_until(lambda: ring.total >= 100)
+            # A stopped child is alive but its heartbeat stops, as if it hung in a read of the port.
+            os.kill(reader._process.pid, stop_child)
+            assert _wait_until(lambda: reader.restarts == 1)
+            total = ring.total
+            assert _wait_until(lambda: ring.total >= total + 100)
+        finally:
+            reader.stop(timeout=1)
+    assert reader.restarts == 1
@@ -0,0 +1,83 @@
+"""Tests of the crash-safe recorder of the load cell."""
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+recorder = pytest.importorskip("pyautolab_Loadcell.recorder")
+
+# Records the sample number as timestamp and value, flushing after every chunk, until it is killed.
+_RECORD_FOREVER = """
+import sys
+import numpy as np
+from pyautolab_Loadcell.recorder import ColumnarRecorder
+
+rec = ColumnarRecorder(sys.argv[1], chunk_size=1000, flush_interval=0)
+start = len(rec)
+while True:
+    samples = np.arange(start, start + 300, dtype=np.float64)
+    rec.append(samples, samples)
+    rec.flush()
+    start += 300
+    if start == 3000:
+        print("recording", flush=True)
+"""
+
+
+def test_samples_span_segments(tmp_path) -> None:
+    rec = recorder.ColumnarRecorder(tmp_path, chunk_size=100, flush_interval=0)
+    rec.append(np.arange(250.0), np.arange(250.0) * 2)
+    rec.close()
+    recording = recorder.Recording(tmp_path)
+    assert len(recording) == 250
+    assert len(recording.segments()) == 3
+    timestamps, values = recording.read(90, 210)
+    assert timestamps.tolist() == list(range(90, 210))
+    assert values.tolist() == [2 * i for i in range(90, 210)]
+
+
+def test_reopen_appends_after_flushed_samples(tmp_path) -> None:
+    rec = recorder.ColumnarRecorder(tmp_path, chunk_size=100, flush_interval=0)
+    rec.append(np.arange(150.0), np.arange(150.0))
+    rec.flush()
+    # Samples appended after the last flush are lost when the process dies.
+    rec.append(np.arange(150.0, 170.0), np.arange(150.0, 170.0))
+    del rec
+    rec = recorder.ColumnarRecorder(tmp_path, flush_interval=0)
+    assert len(rec) == 150
+    rec.append(np.arange(150.0, 160.0), np.arange(150.0, 160.0))
+    rec.close()
+    assert recorder.Recording(tmp_path).read()[1].tolist() == list(range(160))
+
+
+def test_reopen_drops_truncated_segment(tmp_path) -> None:
+    rec = recorder.ColumnarRecorder(tmp_path, chunk_size=100, flush_interval=0)
+    rec.append(np.arange(150.0), np.arange(150.0))
+    rec.close()
+    with (tmp_path / "000001.npy").open("r+b") as f:
+        f.truncate(64)
+    assert len(recorder.Recording(tmp_path)) == 100
+
+
+def test_killed_process_leaves_readable_recording(tmp_path) -> None:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    child = subprocess.Popen([sys.executable, "-c", _RECORD_FOREVER, str(tmp_path)], stdout=subprocess.PIPE, env=env)
+    try:
+        assert child.stdout.readline() == b"recording\n"
+        time.sleep(0.05)
+    finally:
+        child.send_signal(signal.SIGKILL)
+        child.wait(5)
+    rec = recorder.ColumnarRecorder(tmp_path, flush_interval=0)
+    count = len(rec)
+    rec.append(np.arange(float(count), count + 10.0), np.arange(float(count), count + 10.0))
+    rec.close()
+    timestamps, values = recorder.Recording(tmp_path).read()
+    assert count >= 3000
+    # The recording is a gapless prefix of what was sent, followed by the appended samples.
+    assert values.tolist() == list(range(count + 10))
+    assert np.array_equal(timestamps, values)
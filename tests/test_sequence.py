@@ -0,0 +1,138 @@
+"""Tests of the profile engine of diy_hv."""
+import threading
+import time
+
+import pytest
+from diy_hv._command import load_command_table
+from diy_hv._sequence import ProfileError, SequenceRunner, Step, resolve_profile
+
+
+def _wait_until(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_resolve_profile_accumulates_offsets() -> None:
+    table = load_command_table()
+    profile = {
+        "steps": [
+            {"mode": "static", "voltage": 1, "duration": 2},
+            {"mode": "dynamic", "voltage": 1, "frequency": 0.25, "duration": 0.5},
+            {"mode": "stop"},
+        ]
+    }
+    steps = resolve_profile(profile, table)
+    assert [step.offset for step in steps] == [0, 2, 2.5]
+    assert [step.command for step in steps] == [table.static_command(1), table.dynamic_command(1, 0.25), table.stop]
+
+
+def test_last_duration_is_held_then_stopped() -> None:
+    table = load_command_table()
+    steps = resolve_profile({"steps": [{"mode": "static", "voltage": 1, "duration": 2}]}, table)
+    assert steps == [Step(0, table.static_command(1), "static 1 kV"), Step(2, table.stop, "stop")]
+    # A stop is not followed by another one.
+    steps = resolve_profile({"steps": [{"mode": "stop", "duration": 2}]}, table)
+    assert steps == [Step(0, table.stop, "stop")]
+
+
+@pytest.mark.parametrize(
+    ("steps", "message"),
+    [
+        ([{"mode": "ramp", "duration": 1}], "unknown mode"),
+        ([{"mode": "static", "duration": 1}], "missing or invalid setting"),
+        ([{"mode": "static", "voltage": 99}], "not in the command table"),
+        ([{"mode": "stop"}, {"mode": "stop"}], "duration is required"),
+        ([{"mode": "stop", "duration": -1}], "non-negative"),
+        (["stop"], "must be an object"),
+    ],
+)
+def test_resolve_profile_rejects_invalid_steps(steps, message) -> None:
+    with pytest.raises(ProfileError, match=message):
+        resolve_profile({"steps": steps}, load_command_table())
+
+
+def test_runner_sends_no_step_after_abort() -> None:
+    sent = []
+    runner = SequenceRunner([Step(0, "a", "first"), Step(0.05, "b", "second")], sent.append, "v")
+    thread = threading.Thread(target=runner.run)
+    thread.start()
+    assert _wait_until(lambda: sent == ["a"])
+    runner.abort()
+    assert sent == ["a", "v"]
+    thread.join(1)
+    assert sent == ["a", "v"]
+    assert len(runner.records) == 1
+
+
+def test_runner_stop_reaches_device_before_close() -> None:
+    pytest.importorskip("termios")
+    qt_core = pytest.importorskip("qtpy.QtCore")
+    from diy_hv._device import HighVoltageController
+    from diy_hv._worker import DeviceWorker
+
+    from tools.emulator import VoltageControllerEmulator
+
+    app = qt_core.QCoreApplication.instance() or qt_core.QCoreApplication([])
+    table = load_command_table()
+    errors = []
+    with VoltageControllerEmulator(time_scale=0.002) as emulator:
+        worker = DeviceWorker(HighVoltageController())
+        worker.error.connect(errors.append, qt_core.Qt.ConnectionType.DirectConnection)
+        worker.open(emulator.port, 9600)
+        assert _wait_until(lambda: emulator.is_ready)
+        runner = SequenceRunner(
+            [Step(0, table.static_command(3), "static"), Step(10, table.stop, "stop")],
+            lambda command: worker.send(command, coalesce=False),
+            table.stop,
+        )
+        threading.Thread(target=runner.run, daemon=True).start()
+        assert _wait_until(lambda: emulator.pwm == 255)
+        # Disconnecting from the main window aborts the profile, then closes the port.
+        runner.abort()
+        worker.close()
+        assert _wait_until(lambda: emulator.pwm == 0)
+        worker.shutdown(timeout=1)
+    app.processEvents()
+    assert errors == []
+    assert emulator.executed[-1].command == table.stop.encode()
+
+
+def test_records_report_write_times() -> None:
+    pytest.importorskip("termios")
+    qt_core = pytest.importorskip("qtpy.QtCore")
+    from diy_hv._device import HighVoltageController
+    from diy_hv._worker import DeviceWorker
+
+    from tools.emulator import VoltageControllerEmulator
+
+    app = qt_core.QCoreApplication.instance() or qt_core.QCoreApplication([])
+    table = load_command_table()
+    with VoltageControllerEmulator(time_scale=0.002) as emulator:
+        worker = DeviceWorker(HighVoltageController())
+        worker.open(emulator.port, 9600)
+        assert _wait_until(lambda: emulator.is_ready)
+        runner = SequenceRunner(
+            [Step(0, table.static_command(3), "static"), Step(0.05, table.stop, "stop")],
+            lambda command: worker.send(command, coalesce=False),
+            table.stop,
+        )
+        worker.sent.connect(runner.mark_written, qt_core.Qt.ConnectionType.DirectConnection)
+        # Holding the queue delays the writes of the worker past the dispatch of the first step.
+        with worker._queue._condition:
+            thread = threading.Thread(target=runner.run)
+            thread.start()
+            assert _wait_until(lambda: len(runner.records) == 1)
+            time.sleep(0.02)
+        thread.join(1)
+        assert runner.wait_written(timeout=1)
+        worker.shutdown(timeout=1)
+    app.processEvents()
+    first, stop = runner.records
+    assert first.written
+    assert stop.written
+    assert first.actual >= 0.02
+    assert stop.actual >= 0.05
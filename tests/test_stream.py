@@ -0,0 +1,79 @@
+"""Tests of the streaming acquisition of the load cell against the firmware emulator."""
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("termios")
+stream = pytest.importorskip("pyautolab_Loadcell.stream")
+
+from pyautolab_Loadcell.buffer import RingBuffer  # noqa: E402
+from pyautolab_Loadcell.parser import FrameParser  # noqa: E402
+from serial import Serial  # noqa: E402
+
+from tools.emulator import LoadcellEmulator  # noqa: E402
+
+
+def _wait_until(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_spread_timestamps_end_at_read() -> None:
+    timestamps = stream.spread_timestamps(1.0, 2.0, 4)
+    np.testing.assert_allclose(timestamps, [1.25, 1.5, 1.75, 2.0])
+
+
+def test_reader_stamps_every_sample() -> None:
+    # The load in grams is the time since the start in ms, so every reading carries the time it was sent.
+    emulator = LoadcellEmulator(load=lambda t: 1000 * t, stream_interval=0.001)
+    origin = time.monotonic()
+    with emulator:
+        ser = Serial(emulator.port, 9600, timeout=0.1)
+        buffer = RingBuffer(100_000)
+        chunks = []
+        reader = stream.StreamReader(ser, buffer, FrameParser())
+        reader.add_sink(lambda timestamps, values: chunks.append(len(values)))
+        reader.start()
+        try:
+            assert _wait_until(lambda: len(buffer) >= 500)
+        finally:
+            reader.stop(timeout=1)
+            ser.close()
+    assert reader.error is None
+    timestamps, values = buffer.snapshot()
+    # Chunks hold several samples, which must still get distinct increasing timestamps.
+    assert max(chunks) > 1
+    assert np.all(np.diff(timestamps) > 0)
+    # Samples are stamped within the span of the read which returned them.
+    error = timestamps - (origin + values / 1000)
+    assert np.median(np.abs(error)) < 0.002
+
+
+def test_failing_sink_is_removed_and_reading_continues() -> None:
+    def fail(timestamps, values) -> None:
+        raise RuntimeError("consumer failed")
+
+    chunks = []
+    with LoadcellEmulator(load=lambda t: 1, stream_interval=0.002) as emulator:
+        ser = Serial(emulator.port, 9600, timeout=0.1)
+        buffer = RingBuffer(10_000)
+        reader = stream.StreamReader(ser, buffer, FrameParser())
+        reader.add_sink(fail)
+        reader.add_sink(lambda timestamps, values: chunks.append(len(values)))
+        reader.start()
+        try:
+            assert _wait_until(lambda: reader.error is not None)
+            count = len(buffer)
+            assert _wait_until(lambda: len(buffer) >= count + 10)
+            assert reader.is_alive()
+        finally:
+            reader.stop(timeout=1)
+            ser.close()
+    assert isinstance(reader.error, RuntimeError)
+    # The sink after the failing one still receives the chunk which failed.
+    assert sum(chunks) == len(buffer)
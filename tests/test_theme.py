@@ -0,0 +1,85 @@
+"""Tests of the theme cache of diy_hv."""
+import os
+import types
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+qt_widgets = pytest.importorskip("qtpy.QtWidgets")
+pytest.importorskip("qdarktheme")
+
+from diy_hv import _theme  # noqa: E402
+from diy_hv._theme import ThemeCache  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return qt_widgets.QApplication.instance() or qt_widgets.QApplication([])
+
+
+def test_second_load_is_memory_hit(app, tmp_path) -> None:
+    cache = ThemeCache(tmp_path)
+    palette, stylesheet = cache.load("dark")
+    assert cache.last_source == "generated"
+    second_palette, second_stylesheet = cache.load("dark")
+    assert second_palette is palette
+    assert second_stylesheet is stylesheet
+    assert cache.last_source == "memory"
+
+
+def test_disk_round_trip(app, tmp_path) -> None:
+    palette, stylesheet = ThemeCache(tmp_path).load("light")
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [".palette", ".qss"]
+    cache = ThemeCache(tmp_path)
+    assert cache.load("light") == (palette, stylesheet)
+    assert cache.last_source == "disk"
+
+
+def test_update_of_qdarktheme_invalidates_disk_cache(app, tmp_path, monkeypatch) -> None:
+    module = tmp_path / "qdarktheme.py"
+    module.touch()
+    monkeypatch.setattr(_theme.importlib.util, "find_spec", lambda name: types.SimpleNamespace(origin=str(module)))
+    cache_dir = tmp_path / "cache"
+    ThemeCache(cache_dir).load("dark")
+    cache = ThemeCache(cache_dir)
+    cache.load("dark")
+    assert cache.last_source == "disk"
+    stat = module.stat()
+    os.utime(module, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    cache = ThemeCache(cache_dir)
+    cache.load("dark")
+    assert cache.last_source == "generated"
+
+
+def test_window_applies_theme_only_when_changed(app, tmp_path, monkeypatch) -> None:
+    pytest.importorskip("qtawesome")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    from diy_hv import _mainwindow
+
+    theme = "dark"
+    monkeypatch.setattr(_mainwindow, "detect_theme", lambda: theme)
+    window = _mainwindow.MainWindow()
+    try:
+        loads = []
+        load = window._theme_cache.load
+        monkeypatch.setattr(window._theme_cache, "load", lambda name: loads.append(name) or load(name))
+        # The theme of the system did not change.
+        window._sync_theme_with_system()
+        assert loads == []
+        theme = "light"
+        # The paletteChanged emitted while a theme is applied is ignored.
+        window._is_applying_theme = True
+        window._sync_theme_with_system()
+        assert loads == []
+        window._is_applying_theme = False
+        window._sync_theme_with_system()
+        app.processEvents()
+        assert loads == ["light"]
+        assert not window._is_applying_theme
+        theme = "dark"
+        window._sync_theme_with_system()
+        assert loads == ["light", "dark"]
+        assert window.theme_source == "memory"
+    finally:
+        window._worker.shutdown(timeout=1)
+        window.close()
@@ -0,0 +1,80 @@
+"""Tests of the serial worker of diy_hv against the firmware emulator."""
+import time
+
+import pytest
+
+pytest.importorskip("termios")
+qt_core = pytest.importorskip("qtpy.QtCore")
+
+from diy_hv._command import load_command_table  # noqa: E402
+from diy_hv._device import HighVoltageController  # noqa: E402
+from diy_hv._worker import DeviceWorker  # noqa: E402
+
+from tools.emulator import VoltageControllerEmulator  # noqa: E402
+
+
+def _wait_until(predicate, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def worker():
+    app = qt_core.QCoreApplication.instance() or qt_core.QCoreApplication([])
+    worker = DeviceWorker(HighVoltageController())
+    yield worker
+    worker.shutdown(timeout=1)
+    app.processEvents()
+
+
+def _record(signal) -> list:
+    received = []
+    signal.connect(lambda *args: received.append(args), qt_core.Qt.ConnectionType.DirectConnection)
+    return received
+
+
+def test_worker_keeps_serving_after_failed_open(worker) -> None:
+    failures = _record(worker.open_failed)
+    opened = _record(worker.opened)
+    with VoltageControllerEmulator(time_scale=0.002) as emulator:
+        worker.open(emulator.port, -1)
+        worker.open(emulator.port, 9600)
+        assert _wait_until(lambda: len(opened) == 1)
+        assert worker.port == emulator.port
+    assert len(failures) == 1
+
+
+def test_worker_keeps_serving_after_unexpected_error(worker) -> None:
+    errors = _record(worker.error)
+    sent = _record(worker.sent)
+    command = load_command_table().static_command(3)
+    with VoltageControllerEmulator(time_scale=0.002) as emulator:
+        worker.open(emulator.port, 9600)
+        assert _wait_until(lambda: emulator.is_ready)
+        # A lone surrogate cannot be encoded, which is not a serial error.
+        worker.send("\ud800", coalesce=False)
+        worker.send(command, coalesce=False)
+        assert _wait_until(lambda: emulator.pwm == 255)
+    assert len(errors) == 1
+    assert sent == [(command,)]
+
+
+def test_stop_survives_later_set_point(worker) -> None:
+    table = load_command_table()
+    with VoltageControllerEmulator(time_scale=0.002) as emulator:
+        worker.open(emulator.port, 9600)
+        assert _wait_until(lambda: emulator.is_ready)
+        # Holding the queue stands for a slow port: every request is queued before the first one runs.
+        with worker._queue._condition:
+            worker.send(table.static_command(3))
+            worker.stop(table.stop)
+            worker.send(table.static_command(1))
+        assert _wait_until(lambda: len(emulator.executed) == 2)
+    assert [command.command for command in emulator.executed] == [
+        table.stop.encode(),
+        table.static_command(1).encode(),
+    ]
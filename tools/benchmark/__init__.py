@@ -0,0 +1 @@
+"""Benchmarks of the serial and configuration hot paths, runnable without hardware."""
@@ -0,0 +1,81 @@
+"""Module allowing for `python -m tools.benchmark`."""
+import argparse
+import sys
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Table
+
+from tools.benchmark._cases import BENCHMARKS, SkipBenchmark
+from tools.benchmark._report import compare, load_results, save_results
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+_console = Console(force_terminal=True)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="This program benchmarks the hot paths against emulated devices.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run, from {', '.join(BENCHMARKS)}. All if omitted.")
+    parser.add_argument("-n", "--count", type=int, default=1000, help="Iterations of the sampled benchmarks.")
+    parser.add_argument("-o", "--output", type=Path, help="Path of the JSON results.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="Path of the JSON baseline.")
+    parser.add_argument("--update-baseline", action="store_true", help="Save the results as the baseline.")
+    parser.add_argument(
+        "--report-only", action="store_true", help="Report regressions without failing, for a foreign baseline."
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=1.0, help="Allowed relative regression, 1 allows twice the latency."
+    )
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    return args
+
+
+def main() -> int:
+    """Run the benchmarks and compare them with the baseline.
+
+    Returns:
+        1 if any metric regressed beyond the tolerance, unless ``--report-only`` is given, otherwise 0.
+    """
+    args = _parse_args()
+    results = {}
+    skipped = {}
+    for name in args.names or BENCHMARKS:
+        _console.print(f"Running {name}...")
+        try:
+            results[name] = BENCHMARKS[name](args.count)
+        except SkipBenchmark as e:
+            skipped[name] = str(e)
+            _console.print(f"[yellow]Skipped {name}: {e}")
+
+    table = Table("benchmark", "metric", "value", "baseline")
+    baseline = load_results(args.baseline) if args.baseline.exists() and not args.update_baseline else {}
+    for name, metrics in results.items():
+        for key, metric in metrics.items():
+            base = baseline.get(name, {}).get(key)
+            table.add_row(
+                name, key, f"{metric.value:.4g} {metric.unit}", "" if base is None else f"{base.value:.4g} {base.unit}"
+            )
+    _console.print(table)
+
+    if args.output is not None:
+        save_results(args.output, results, skipped)
+    if args.update_baseline:
+        save_results(args.baseline, results, skipped)
+        _console.print(f"Saved baseline to {args.baseline}.")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        _console.print(
+            f"[bold red]REGRESSION {regression.benchmark}.{regression.metric}: "
+            f"{regression.current.value:.4g} {regression.current.unit} "
+            f"(baseline {regression.baseline.value:.4g}, {regression.change:+.0%} worse)"
+        )
+    return 1 if regressions and not args.report_only else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
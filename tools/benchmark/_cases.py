@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+from tools.benchmark._report import Metric, Metrics, latency_metrics, percentile
+from tools.emulator import LoadcellEmulator, PtyEmulator
+
+_ROOT_PATH = Path(__file__).parents[2]
+_DIYHV_PATH = _ROOT_PATH / "DIYHV"
+_LOADCELL_PATH = _ROOT_PATH / "Electromechanical-Tensile-Tester" / "pyautolab-loadcell"
+
+
+class SkipBenchmark(Exception):
+    """Raised when a benchmark cannot run in this environment."""
+
+
+class _EchoEmulator(PtyEmulator):
+    # Stand-in which replies to every line at once, so the round trip measures the host side only.
+    def __init__(self) -> None:
+        super().__init__()
+        self._line = bytearray()
+
+    def _received(self, data: bytes) -> None:
+        self._line += data
+        end = self._line.rfind(b"\n")
+        if end != -1:
+            self._write(bytes(self._line[: end + 1]))
+            del self._line[: end + 1]
+
+
+def _import_loadcell_driver():
+    # The plugin is not a dependency of the root project, so it is imported from the tree when not installed.
+    if str(_LOADCELL_PATH) not in sys.path:
+        sys.path.append(str(_LOADCELL_PATH))
+    try:
+        from pyautolab_Loadcell import driver
+    except ImportError as e:
+        raise SkipBenchmark(f"load cell plugin is not importable ({e})") from None
+    return driver
+
+
+def _time_calls(call: Callable[[], object], count: int) -> list[float]:
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_loadcell_measure(count: int) -> Metrics:
+    """``Loadcell.measure`` against the load cell emulator."""
+    driver = _import_loadcell_driver()
+    with LoadcellEmulator(load=lambda t: 123.45) as emulator:
+        device = driver.Loadcell()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            device.measure()
+            return latency_metrics(_time_calls(device.measure, count))
+        finally:
+            device.close()
+
+
+def bench_hv_query(count: int) -> Metrics:
+    """``HighVoltageController.send_query_message`` round trip against an echoing pty."""
+    from diy_hv._device import HighVoltageController
+
+    with _EchoEmulator() as emulator:
+        device = HighVoltageController()
+        device.port = emulator.port
+        device.baudrate = 9600
+        device.open()
+        try:
+            device.send_query_message("a")
+            return latency_metrics(_time_calls(lambda: device.send_query_message("a"), count), "rtt")
+        finally:
+            device.close()
+
+
+def bench_loadcell_parse(count: int) -> Metrics:
+    """Parse cost of a reply line, by ``_LoadcellSerial.receive_message`` and by ``FrameParser``."""
+    driver = _import_loadcell_driver()
+    line = b"-1234.56\r\n"
+    lines = count * 10
+
+    with _EchoEmulator() as emulator:
+        ser = driver._LoadcellSerial()
+        ser.port = emulator.port
+        ser.timeout = 1
+        ser.open()
+        try:
+            # Lines are written in batches which fit in the pty buffer, and only the reads are timed.
+            batch = 256
+            elapsed = 0.0
+            for _ in range(lines // batch):
+                ser.write(line * batch)
+                while ser.in_waiting < len(line) * batch:
+                    time.sleep(0.001)
+                start = time.perf_counter()
+                for _ in range(batch):
+                    ser.receive_message()
+                elapsed += time.perf_counter() - start
+        finally:
+            ser.close()
+    per_line = elapsed / (lines // batch * batch)
+
+    parser = driver.FrameParser(capacity=len(line) * lines)
+    data = line * lines
+    start = time.perf_counter()
+    parser.feed(data)
+    parser.parse()
+    bulk_per_line = (time.perf_counter() - start) / lines
+    return {
+        "receive_message_per_line": Metric(per_line * 1e6, "us"),
+        "frame_parser_per_line": Metric(bulk_per_line * 1e6, "us"),
+    }
+
+
+def _large_command_config(voltages: int, frequencies: int) -> dict:
+    static = [{"command": f"s{i}", "voltage": i / 10} for i in range(voltages)]
+    dynamic = [
+        {"command": f"d{i}-{j}", "voltage": i / 10, "frequency": j / 4}
+        for i in range(voltages)
+        for j in range(frequencies)
+    ]
+    return {"stop": "v", "static": static, "dynamic": dynamic}
+
+
+def bench_update_command(count: int) -> Metrics:
+    """Loading a large user command file, and ``MainWindow._update_command`` with it."""
+    from diy_hv import _command
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / "commands.json"
+        path.write_text(json.dumps(_large_command_config(100, 50)), encoding="utf-8")
+
+        def load() -> None:
+            _command._load_command_table.cache_clear()
+            _command.load_command_table(path)
+
+        load_times = _time_calls(load, max(count // 100, 5))
+        metrics = {"load_p50": Metric(percentile(load_times, 50) * 1e3, "ms")}
+
+        try:
+            os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+            from diy_hv._mainwindow import MainWindow
+            from qtpy.QtWidgets import QApplication
+        except ImportError:
+            return metrics
+        app = QApplication.instance() or QApplication([])  # noqa: F841
+        win = MainWindow()
+
+        def update() -> None:
+            _command._load_command_table.cache_clear()
+            win._update_command(path)
+
+        update_times = _time_calls(update, max(count // 100, 5))
+        metrics["update_command_p50"] = Metric(percentile(update_times, 50) * 1e3, "ms")
+        win.close()
+        return metrics
+
+
+_GUI_START_SCRIPT = """
+from diy_hv._mainwindow import MainWindow
+from qtpy.QtWidgets import QApplication
+
+app = QApplication([])
+app.setApplicationName("DIYHV")
+win = MainWindow()
+win.show()
+app.processEvents()
+"""
+
+
+def bench_gui_start(count: int) -> Metrics:
+    """Wall time of a process showing the main window, with an empty and with a filled theme cache."""
+    try:
+        import qtpy  # noqa: F401
+    except ImportError as e:
+        raise SkipBenchmark(f"Qt is not importable ({e})") from None
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(
+            os.environ,
+            QT_QPA_PLATFORM="offscreen",
+            XDG_CACHE_HOME=cache_dir,
+            PYTHONPATH=os.pathsep.join((str(_DIYHV_PATH), os.environ.get("PYTHONPATH", ""))),
+        )
+
+        def start() -> None:
+            subprocess.run([sys.executable, "-c", _GUI_START_SCRIPT], env=env, check=True)  # nosec
+
+        cold = _time_calls(start, 1)[0]
+        warm = min(_time_calls(start, 3))
+    return {"cold_start": Metric(cold * 1e3, "ms"), "warm_start": Metric(warm * 1e3, "ms")}
+
+
+BENCHMARKS: Dict[str, Callable[[int], Metrics]] = {
+    "loadcell_measure": bench_loadcell_measure,
+    "hv_query": bench_hv_query,
+    "loadcell_parse": bench_loadcell_parse,
+    "update_command": bench_update_command,
+    "gui_start": bench_gui_start,
+}
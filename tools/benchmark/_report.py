@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import math
+import platform
+import sys
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+FORMAT_VERSION = 1
+
+
+class Metric(NamedTuple):
+    """Measured value of a benchmark.
+
+    Attributes:
+        value: Measured value.
+        unit: Unit of the value.
+        better: ``lower`` or ``higher``, the direction in which the value improves.
+    """
+
+    value: float
+    unit: str
+    better: str = "lower"
+
+
+# Metrics keyed by their name.
+Metrics = Dict[str, Metric]
+
+
+class Regression(NamedTuple):
+    """Metric which got worse than the baseline by more than the tolerance."""
+
+    benchmark: str
+    metric: str
+    baseline: Metric
+    current: Metric
+
+    @property
+    def change(self) -> float:
+        """Relative change from the baseline, positive when the metric got worse.
+
+        A change of 1 means twice the latency, or half the throughput, of the baseline.
+        """
+        worse, better = (
+            (self.current, self.baseline) if self.current.better == "lower" else (self.baseline, self.current)
+        )
+        if better.value == 0:
+            return float("inf") if worse.value > 0 else 0.0
+        return worse.value / better.value - 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the q-th percentile of the values by the nearest-rank method."""
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def latency_metrics(latencies: list[float], prefix: str = "latency") -> Metrics:
+    """Return the throughput and latency percentiles of sequential operations, given their latencies in seconds."""
+    return {
+        "throughput": Metric(len(latencies) / sum(latencies), "1/s", "higher"),
+        f"{prefix}_p50": Metric(percentile(latencies, 50) * 1e3, "ms"),
+        f"{prefix}_p95": Metric(percentile(latencies, 95) * 1e3, "ms"),
+        f"{prefix}_p99": Metric(percentile(latencies, 99) * 1e3, "ms"),
+    }
+
+
+def save_results(path: Path, results: dict[str, Metrics], skipped: dict[str, str]) -> None:
+    """Save results as JSON."""
+    data = {
+        "version": FORMAT_VERSION,
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform()},
+        "benchmarks": {
+            name: {key: metric._asdict() for key, metric in metrics.items()} for name, metrics in results.items()
+        },
+        "skipped": skipped,
+    }
+    Path(path).write_text(json.dumps(data, indent=4) + "\n", encoding="utf-8")
+
+
+def load_results(path: Path) -> dict[str, Metrics]:
+    """Load results saved by :func:`save_results`."""
+    data = json.loads(Path(path).read_bytes())
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported benchmark result version: {data.get('version')!r}.")
+    return {
+        name: {key: Metric(**metric) for key, metric in metrics.items()}
+        for name, metrics in data["benchmarks"].items()
+    }
+
+
+def compare(results: dict[str, Metrics], baseline: dict[str, Metrics], tolerance: float) -> list[Regression]:
+    """Return the metrics which got worse than the baseline by more than the tolerance.
+
+    Args:
+        results: Current results.
+        baseline: Baseline results.
+        tolerance: Allowed relative change, e.g. 0.5 allows a latency 1.5 times the baseline.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for key, metric in metrics.items():
+            base = baseline.get(name, {}).get(key)
+            if base is None:
+                continue
+            regression = Regression(name, key, base, metric)
+            if regression.change > tolerance:
+                regressions.append(regression)
+    return regressions
@@ -0,0 +1,17 @@
+"""Emulators of the firmwares on a pseudo-terminal, for driving the devices without hardware.
+
+Only available on POSIX platforms.
+"""
+from tools.emulator._diyhv import VoltageControllerEmulator
+from tools.emulator._link import IDEAL, REALISTIC, WORST_CASE, LinkProfile, PtyEmulator
+from tools.emulator._loadcell import LoadcellEmulator
+
+__all__ = [
+    "IDEAL",
+    "REALISTIC",
+    "WORST_CASE",
+    "LinkProfile",
+    "LoadcellEmulator",
+    "PtyEmulator",
+    "VoltageControllerEmulator",
+]
@@ -0,0 +1,51 @@
+"""Module allowing for `python -m tools.emulator`."""
+import argparse
+import contextlib
+import threading
+
+from tools.emulator import IDEAL, REALISTIC, WORST_CASE, LoadcellEmulator, VoltageControllerEmulator
+
+_LINKS = {"ideal": IDEAL, "realistic": REALISTIC, "worst": WORST_CASE}
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="This program emulates a firmware on a pseudo-terminal.")
+    parser.add_argument("device", choices=("diyhv", "loadcell"), help="Firmware to emulate.")
+    parser.add_argument("--link", choices=tuple(_LINKS), default="realistic", help="Preset of the link.")
+    parser.add_argument("--latency", type=float, help="Seconds before every reply.")
+    parser.add_argument("--jitter", type=float, help="Upper bound of the random delay added to the latency.")
+    parser.add_argument("--baudrate", type=int, help="Baudrate at which replies are throttled.")
+    parser.add_argument("--drop-rate", type=float, help="Probability of dropping a reply.")
+    parser.add_argument("--corrupt-rate", type=float, help="Probability of corrupting a byte of a reply.")
+    parser.add_argument("--disconnect-after", type=float, help="Seconds after which the device is unplugged.")
+    parser.add_argument("--time-scale", type=float, default=1, help="Factor applied to the delays of DIYHV.")
+    parser.add_argument("--noise", type=float, default=0, help="Noise of the load cell in grams.")
+    parser.add_argument("--stream-interval", type=float, help="Seconds between streamed load cell readings.")
+    parser.add_argument("--seed", type=int, help="Seed of the random delays and faults.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run an emulator until interrupted."""
+    args = _parse_args()
+    link = _LINKS[args.link]
+    overrides = {
+        field: getattr(args, field)
+        for field in ("latency", "jitter", "baudrate", "drop_rate", "corrupt_rate")
+        if getattr(args, field) is not None
+    }
+    link = link._replace(**overrides)
+    if args.device == "diyhv":
+        emulator = VoltageControllerEmulator(link, args.time_scale, args.seed)
+    else:
+        emulator = LoadcellEmulator(link, noise=args.noise, stream_interval=args.stream_interval, seed=args.seed)
+    with emulator:
+        print(f"Emulating {args.device} on {emulator.port} ({link}).")  # noqa: T201
+        if args.disconnect_after is not None:
+            threading.Timer(args.disconnect_after, emulator.disconnect).start()
+        with contextlib.suppress(KeyboardInterrupt):
+            threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
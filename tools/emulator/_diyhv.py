@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import binascii
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+from tools.emulator._link import IDEAL, LinkProfile, PtyEmulator
+
+READY_MESSAGE = b"please input your command\r\n"
+BANNER_INTERVAL_MS = 1000
+QUEUE_SIZE = 8
+LINE_SIZE = 48
+MAX_VOLTAGE = 3000
+_CALIBRATION = ((0, 0), (1000, 44), (2000, 100), (3000, 255))
+_NAK_CRC, _NAK_MALFORMED, _NAK_RANGE, _NAK_QUEUE_FULL = 1, 2, 3, 4
+_HIGH = 1
+_CYCLE1, _CYCLE2, _CYCLE3, _CYCLE4, _CYCLE5, _CYCLE6 = 30, 120, 600, 3000, 6000, 12000
+
+
+class Actuation(NamedTuple):
+    """Actuation of a command of the firmware.
+
+    Attributes:
+        pwm: Value written to the PWM pin.
+        cycles: Number of the cycles of a dynamic actuation. 0 for a static one.
+        half_period_ms: Milliseconds of each half of a dynamic cycle.
+    """
+
+    pwm: int
+    cycles: int = 0
+    half_period_ms: int = 0
+
+
+def _legacy_dynamic(pwm: int, cycle_num: int, delay_time: int) -> Actuation:
+    # The legacy loop ran from 0 to cycle_num inclusive.
+    return Actuation(pwm, cycle_num + 1, delay_time)
+
+
+# Mirror of handle_legacy of voltage_controller.ino.
+COMMANDS = {
+    b"a": Actuation(44),
+    b"b": Actuation(100),
+    b"c": Actuation(255),
+    b"v": Actuation(0),
+    b"d": _legacy_dynamic(44, _CYCLE1, 2000),
+    b"e": _legacy_dynamic(44, _CYCLE2, 500),
+    b"f": _legacy_dynamic(44, _CYCLE3, 100),
+    b"g": _legacy_dynamic(100, _CYCLE1, 2000),
+    b"h": _legacy_dynamic(100, _CYCLE2, 500),
+    b"i": _legacy_dynamic(100, _CYCLE3, 100),
+    b"j": _legacy_dynamic(_HIGH, _CYCLE1, 2000),
+    b"k": _legacy_dynamic(_HIGH, _CYCLE2, 500),
+    b"l": _legacy_dynamic(_HIGH, _CYCLE3, 100),
+    b"m": _legacy_dynamic(44, _CYCLE4, 20),
+    b"n": _legacy_dynamic(44, _CYCLE5, 10),
+    b"o": _legacy_dynamic(44, _CYCLE6, 5),
+    b"p": _legacy_dynamic(100, _CYCLE4, 20),
+    b"q": _legacy_dynamic(100, _CYCLE5, 10),
+    b"r": _legacy_dynamic(100, _CYCLE6, 5),
+    b"s": _legacy_dynamic(_HIGH, _CYCLE4, 20),
+    b"t": _legacy_dynamic(_HIGH, _CYCLE5, 10),
+    b"u": _legacy_dynamic(_HIGH, _CYCLE6, 5),
+}
+
+
+class ExecutedCommand(NamedTuple):
+    """Command executed by the emulated firmware.
+
+    Attributes:
+        time: Time on the monotonic clock when the actuation started.
+        command: Line of the command.
+        actuation: Actuation of the command.
+        seq: Sequence number of a framed command. None for a legacy one.
+    """
+
+    time: float
+    command: bytes
+    actuation: Actuation
+    seq: int | None = None
+
+
+def _crc(body: bytes) -> int:
+    return binascii.crc_hqx(body, 0xFFFF)
+
+
+def _voltage_to_pwm(voltage: int) -> int:
+    for (v0, p0), (v1, p1) in zip(_CALIBRATION, _CALIBRATION[1:]):
+        if voltage <= v1:
+            return p0 + (voltage - v0) * (p1 - p0) // (v1 - v0)
+    return _CALIBRATION[-1][1]
+
+
+class VoltageControllerEmulator(PtyEmulator):
+    """Emulator of ``voltage_controller.ino``.
+
+    The firmware waits 3 s in ``setup``, then reads commands as they arrive and prints its ready banner every second
+    while idle. Framed commands are acknowledged, queued and reported when their actuation starts and, for dynamic
+    ones, finishes. A stop command, framed or legacy, is applied at once. A session frame makes the firmware forget
+    the sequence numbers it accepted. Other legacy single letter commands are queued without replies.
+    Every delay of the firmware is multiplied by ``time_scale``.
+    """
+
+    def __init__(self, link: LinkProfile = IDEAL, time_scale: float = 1, seed: int | None = None) -> None:
+        """Initialize emulator.
+
+        Args:
+            link: Timing and faults of the link.
+            time_scale: Factor applied to the delays of the firmware. Values below 1 run faster than the device.
+            seed: Seed of the random delays and faults.
+        """
+        super().__init__(link, seed)
+        self.time_scale = time_scale
+        self._line = bytearray()
+        self._is_line_overflow = False
+        self._condition = threading.Condition()
+        self._queue: deque[tuple[bytes, Actuation, int | None]] = deque()
+        self._recent_seqs: deque[int] = deque(maxlen=QUEUE_SIZE)
+        self._interrupted = threading.Event()
+        self.executed: list[ExecutedCommand] = []
+        self.rejected = 0
+        self.pwm = 0
+
+    def stop(self, timeout: float | None = 5) -> None:
+        """Override PtyEmulator class."""
+        self._stop_event.set()
+        self._interrupted.set()
+        super().stop(timeout)
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the firmware has printed its banner at least once."""
+        return self.bytes_sent > 0
+
+    def _delay(self, milliseconds: float) -> bool:
+        return self._sleep(milliseconds / 1000 * self.time_scale)
+
+    def _reply(self, seq: int, kind: bytes, code: int | None = None) -> None:
+        body = b"%d,%s" % (seq, kind) if code is None else b"%d,%s,%d" % (seq, kind, code)
+        self._write(b"$%s*%04X\r\n" % (body, _crc(body)))
+
+    def _received(self, data: bytes) -> None:
+        for byte in data:
+            if byte in b"\r\n":
+                if self._line and not self._is_line_overflow:
+                    self._handle_line(bytes(self._line))
+                self._line.clear()
+                self._is_line_overflow = False
+            elif len(self._line) == LINE_SIZE:
+                self._is_line_overflow = True
+            else:
+                self._line.append(byte)
+
+    def _handle_line(self, line: bytes) -> None:
+        if line.startswith(b"$"):
+            self._handle_frame(line)
+        elif line == b"v":
+            self._stop(line, None)
+        elif line in COMMANDS:
+            self._enqueue(line, COMMANDS[line], None)
+
+    def _handle_frame(self, line: bytes) -> None:
+        frame = self._parse_frame(line)
+        if frame is None:
+            return
+        seq, kind, args = frame
+        if kind == b"H" and not args:
+            # A new host numbers its commands from scratch, and they must not be taken for retransmissions.
+            self._recent_seqs.clear()
+            self._reply(seq, b"A")
+            return
+        if seq in self._recent_seqs:
+            # Retransmission of a command which was already accepted.
+            self._reply(seq, b"A")
+            return
+        if kind == b"X" and not args:
+            self._stop(line, seq)
+            return
+        actuation = self._frame_actuation(seq, kind, args)
+        if actuation is None:
+            return
+        if not self._enqueue(line, actuation, seq):
+            self._reject(seq, _NAK_QUEUE_FULL)
+            return
+        self._recent_seqs.append(seq)
+        self._reply(seq, b"A")
+
+    def _parse_frame(self, line: bytes) -> tuple[int, bytes, list[int]] | None:
+        # Returns the sequence number, kind and arguments of a frame, or rejects it and returns None.
+        if line[-5:-4] != b"*":
+            self._reject(0, _NAK_MALFORMED)
+            return None
+        body = line[1:-5]
+        fields = body.split(b",")
+        try:
+            seq = int(fields[0])
+        except ValueError:
+            seq = 0
+        try:
+            crc = int(line[-4:], 16)
+        except ValueError:
+            crc = -1
+        if crc != _crc(body):
+            self._reject(seq, _NAK_CRC)
+            return None
+        try:
+            kind = fields[1]
+            args = [int(field) for field in fields[2:]]
+        except (IndexError, ValueError):
+            self._reject(seq, _NAK_MALFORMED)
+            return None
+        if not 0 < seq <= 0xFFFF or len(kind) != 1:
+            self._reject(seq, _NAK_MALFORMED)
+            return None
+        return seq, kind, args
+
+    def _frame_actuation(self, seq: int, kind: bytes, args: list[int]) -> Actuation | None:
+        # Returns the actuation of a static or dynamic command, or rejects it and returns None.
+        if kind == b"S" and len(args) == 1:
+            if not 0 <= args[0] <= MAX_VOLTAGE:
+                self._reject(seq, _NAK_RANGE)
+                return None
+            return Actuation(_voltage_to_pwm(args[0]))
+        if kind == b"D" and len(args) == 3:
+            voltage, frequency, cycles = args
+            if not 0 <= voltage <= MAX_VOLTAGE or not 0 < frequency <= 500000 or cycles <= 0:
+                self._reject(seq, _NAK_RANGE)
+                return None
+            return Actuation(_voltage_to_pwm(voltage), cycles, 500000 // frequency)
+        self._reject(seq, _NAK_MALFORMED)
+        return None
+
+    def _reject(self, seq: int, code: int) -> None:
+        self.rejected += 1
+        self._reply(seq, b"N", code)
+
+    def _enqueue(self, line: bytes, actuation: Actuation, seq: int | None) -> bool:
+        with self._condition:
+            if len(self._queue) == QUEUE_SIZE:
+                return False
+            self._queue.append((line, actuation, seq))
+            self._condition.notify()
+        return True
+
+    def _stop(self, line: bytes, seq: int | None) -> None:
+        with self._condition:
+            self._queue.clear()
+            self._interrupted.set()
+            self.pwm = 0
+            self.executed.append(ExecutedCommand(time.monotonic(), line, Actuation(0), seq))
+        if seq is None:
+            return
+        self._recent_seqs.append(seq)
+        self._reply(seq, b"A")
+        self._reply(seq, b"E")
+
+    def _run(self) -> None:
+        if self._delay(3000):
+            return
+        self._write(READY_MESSAGE)
+        last_banner = time.monotonic()
+        banner_interval = BANNER_INTERVAL_MS / 1000 * self.time_scale
+        while not self._stop_event.is_set():
+            with self._condition:
+                if not self._queue:
+                    remaining = last_banner + banner_interval - time.monotonic()
+                    if remaining > 0:
+                        self._condition.wait(min(remaining, 0.05))
+                        continue
+                    command = None
+                else:
+                    command = self._queue.popleft()
+                    line, actuation, seq = command
+                    self._interrupted.clear()
+                    self.pwm = actuation.pwm
+                    self.executed.append(ExecutedCommand(time.monotonic(), line, actuation, seq))
+            if command is None:
+                self._write(READY_MESSAGE)
+                last_banner = time.monotonic()
+                continue
+            if seq is not None:
+                self._reply(seq, b"E")
+            if actuation.cycles == 0:
+                continue
+            duration = actuation.cycles * 2 * actuation.half_period_ms / 1000 * self.time_scale
+            if self._interrupted.wait(duration) or self._stop_event.is_set():
+                continue
+            with self._condition:
+                self.pwm = 0
+            if seq is not None:
+                self._reply(seq, b"F")
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import errno
+import os
+import random
+import select
+import threading
+import time
+import tty
+from typing import NamedTuple
+
+
+class LinkProfile(NamedTuple):
+    """Timing and faults of the serial link of an emulator.
+
+    Delays are real seconds and are not affected by the time scale of the firmware.
+
+    Attributes:
+        latency: Seconds before every write of the firmware reaches the host.
+        jitter: Upper bound of a uniformly random delay added to the latency.
+        baudrate: Baudrate at which writes are throttled, 10 bits a byte. None does not throttle.
+        drop_rate: Probability of dropping a write entirely.
+        corrupt_rate: Probability of replacing a random byte of a write.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    baudrate: int | None = None
+    drop_rate: float = 0.0
+    corrupt_rate: float = 0.0
+
+
+IDEAL = LinkProfile()
+# An Arduino behind a USB-serial adapter at 9600 baud.
+REALISTIC = LinkProfile(latency=0.002, jitter=0.002, baudrate=9600)
+# A slow, noisy link which loses and corrupts replies.
+WORST_CASE = LinkProfile(latency=0.05, jitter=0.05, baudrate=2400, drop_rate=0.05, corrupt_rate=0.05)
+
+
+class PtyEmulator:
+    """Base class of the firmware emulators.
+
+    The emulator owns the master side of a pseudo-terminal. Drivers open :attr:`port`, the slave side, like any
+    other serial port. Received bytes are passed to :meth:`_received` on a reader thread, and subclasses reply with
+    :meth:`_write`, which applies the :class:`LinkProfile`.
+    """
+
+    def __init__(self, link: LinkProfile = IDEAL, seed: int | None = None) -> None:
+        """Initialize emulator.
+
+        Args:
+            link: Timing and faults of the link.
+            seed: Seed of the random delays and faults.
+        """
+        self.link = link
+        self._random = random.Random(seed)
+        self._master_fd: int | None = None
+        self._slave_fd: int | None = None
+        self.port = ""
+        self._stop_event = threading.Event()
+        self._write_lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.writes_dropped = 0
+        self.writes_corrupted = 0
+
+    def __enter__(self) -> PtyEmulator:
+        """Start emulator."""
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        """Stop emulator."""
+        self.stop()
+
+    def start(self) -> None:
+        """Create the pseudo-terminal and start the firmware."""
+        self._master_fd, self._slave_fd = os.openpty()
+        # The slave stays open here, so the master keeps working while drivers open and close the port.
+        tty.setraw(self._master_fd)
+        tty.setraw(self._slave_fd)
+        os.set_blocking(self._master_fd, False)
+        self.port = os.ttyname(self._slave_fd)
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._read_loop, name=f"{type(self).__name__}Reader", daemon=True),
+            threading.Thread(target=self._run, name=f"{type(self).__name__}Firmware", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float | None = 5) -> None:
+        """Stop the firmware and close the pseudo-terminal."""
+        self._stop_event.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+        self.disconnect()
+        if self._slave_fd is not None:
+            os.close(self._slave_fd)
+            self._slave_fd = None
+
+    def disconnect(self) -> None:
+        """Close the master side, as if the device was unplugged."""
+        with self._write_lock:
+            if self._master_fd is not None:
+                os.close(self._master_fd)
+                self._master_fd = None
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the emulator has been started and not stopped."""
+        return self._master_fd is not None and not self._stop_event.is_set()
+
+    def _run(self) -> None:
+        """Run the firmware. Subclasses may override it to send unsolicited data."""
+
+    def _received(self, data: bytes) -> None:
+        """Handle bytes received from the host."""
+        raise NotImplementedError
+
+    def _write(self, data: bytes) -> None:
+        """Write bytes to the host through the link."""
+        link = self.link
+        if link.drop_rate > 0 and self._random.random() < link.drop_rate:
+            self.writes_dropped += 1
+            return
+        if link.corrupt_rate > 0 and self._random.random() < link.corrupt_rate and data:
+            corrupted = bytearray(data)
+            corrupted[self._random.randrange(len(corrupted))] = self._random.randrange(256)
+            data = bytes(corrupted)
+            self.writes_corrupted += 1
+        delay = link.latency + (self._random.uniform(0, link.jitter) if link.jitter > 0 else 0)
+        if delay > 0 and self._stop_event.wait(delay):
+            return
+        with self._write_lock:
+            if link.baudrate is None:
+                self._write_fd(data)
+                return
+            # Write in small chunks, so the host sees the bytes arrive at the pace of the baudrate.
+            chunk = max(1, link.baudrate // 1000)
+            for i in range(0, len(data), chunk):
+                start = time.perf_counter()
+                self._write_fd(data[i : i + chunk])
+                remaining = len(data[i : i + chunk]) * 10 / link.baudrate - (time.perf_counter() - start)
+                if remaining > 0 and self._stop_event.wait(remaining):
+                    return
+
+    def _write_fd(self, data: bytes) -> None:
+        if self._master_fd is None:
+            return
+        try:
+            self.bytes_sent += os.write(self._master_fd, data)
+        except BlockingIOError:
+            # Nobody reads the port and the pty buffer is full. A real device would lose the bytes as well.
+            self.writes_dropped += 1
+        except OSError as e:
+            if e.errno != errno.EIO:
+                raise
+
+    def _sleep(self, seconds: float) -> bool:
+        """Sleep unless the emulator is stopped. Returns True if it was stopped."""
+        return self._stop_event.wait(seconds)
+
+    def _read_loop(self) -> None:
+        while not self._stop_event.is_set():
+            fd = self._master_fd
+            if fd is None:
+                return
+            try:
+                readable, _, _ = select.select([fd], [], [], 0.05)
+                if not readable:
+                    continue
+                data = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+            except (OSError, ValueError):
+                # EIO while no process has the slave open, or the master was closed by disconnect.
+                if self._master_fd is None:
+                    return
+                self._stop_event.wait(0.05)
+                continue
+            self.bytes_received += len(data)
+            self._received(data)
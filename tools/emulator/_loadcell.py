@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from tools.emulator._link import IDEAL, LinkProfile, PtyEmulator
+
+_DELIMITER = b"\r\n"
+
+
+class LoadcellEmulator(PtyEmulator):
+    """Emulator of the load cell firmware.
+
+    ``a`` replies with the tension in grams and ``b`` sets the zero point to the current load. Other lines are
+    ignored. With ``stream_interval``, readings are also sent continuously, as a streaming firmware would.
+    """
+
+    def __init__(
+        self,
+        link: LinkProfile = IDEAL,
+        load: Callable[[float], float] | None = None,
+        noise: float = 0.0,
+        stream_interval: float | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """Initialize emulator.
+
+        Args:
+            link: Timing and faults of the link.
+            load: Load in grams as a function of the seconds since the start. No load if None.
+            noise: Standard deviation of the Gaussian noise added to every reading, in grams.
+            stream_interval: Seconds between unsolicited readings. Nothing is streamed if None.
+            seed: Seed of the random delays, noise and faults.
+        """
+        super().__init__(link, seed)
+        self._load = (lambda t: 0.0) if load is None else load
+        self.noise = noise
+        self.stream_interval = stream_interval
+        self.zero = 0.0
+        self.queries = 0
+        self._line = bytearray()
+        self._start = 0.0
+
+    def start(self) -> None:
+        """Override PtyEmulator class."""
+        self._start = time.monotonic()
+        super().start()
+
+    def reading(self) -> float:
+        """Return the current reading in grams."""
+        value = self._load(time.monotonic() - self._start) - self.zero
+        if self.noise > 0:
+            value += self._random.gauss(0, self.noise)
+        return value
+
+    def _received(self, data: bytes) -> None:
+        self._line += data
+        while True:
+            end = self._line.find(_DELIMITER)
+            if end == -1:
+                return
+            command = bytes(self._line[:end]).strip()
+            del self._line[: end + len(_DELIMITER)]
+            if command == b"a":
+                self.queries += 1
+                self._write(b"%.2f\r\n" % self.reading())
+            elif command == b"b":
+                self.zero = self._load(time.monotonic() - self._start)
+
+    def _run(self) -> None:
+        if self.stream_interval is None:
+            return
+        next_time = time.monotonic()
+        while True:
+            next_time += self.stream_interval
+            self._write(b"%.2f\r\n" % self.reading())
+            if self._sleep(max(next_time - time.monotonic(), 0)):
+                return